@@ -0,0 +1,127 @@
+"""
+Benchmark of Builder prompt size and latency with and without schema pruning at 10, 100 and 1000 tables.
+Builder latency needs an OpenAI key and is only measured with --live
+"""
+import argparse
+import asyncio
+import json
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add src folder so modules can be found
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from ai_wayang_single.llm.prompt_loader import PromptLoader
+
+REPO_DATA = Path(__file__).resolve().parent.parent / "data"
+
+# Vocabulary for synthetic tables
+NOUNS = ["person", "adresse", "order", "invoice", "product", "customer", "shipment", "payment", "employee", "department",
+         "account", "ticket", "review", "supplier", "warehouse", "region", "campaign", "session", "device", "contract"]
+COLUMNS = ["id", "name", "email", "created_at", "amount", "status", "city", "country", "price", "quantity",
+           "category", "age", "phone", "updated_at", "description", "score", "type", "code", "owner_id", "total"]
+TYPES = ["integer", "character varying", "date", "numeric", "boolean"]
+
+QUERIES = [
+    "Show the names of all persons older than 30",
+    "Count the number of orders per customer and sort by count",
+    "Find all invoices with an amount larger than 1000 and output the invoice id",
+    "List the product names in category toys sorted by price",
+    "Count words in the text file my_textfile",
+]
+
+
+def make_data_folder(tables: int, seed: int) -> Path:
+    """
+    Creates a data folder with the real schemas and few-shot examples plus synthetic tables
+    """
+    rng = random.Random(seed)
+    folder = Path(tempfile.mkdtemp(prefix="wayang_bench_"))
+    shutil.copytree(REPO_DATA / "few_shot_examples", folder / "few_shot_examples")
+    shutil.copytree(REPO_DATA / "schemas", folder / "schemas")
+
+    real_tables = len(list((folder / "schemas" / "tables").glob("*.json")))
+
+    for i in range(max(0, tables - real_tables)):
+        name = f"{rng.choice(NOUNS)}_{rng.choice(NOUNS)}_{i}"
+        columns = {
+            column: {"type": rng.choice(TYPES), "examples": [str(rng.randint(0, 9999)), str(rng.randint(0, 9999))]}
+            for column in rng.sample(COLUMNS, rng.randint(3, 10))
+        }
+        schema = {name: {"table_description": None, "input_type": "jdbc_input", "columns": columns}}
+        (folder / "schemas" / "tables" / f"{name}.json").write_text(json.dumps(schema, indent=2))
+
+    return folder
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts tokens with tiktoken if installed, else estimates 4 characters per token
+    """
+    try:
+        import tiktoken
+        return len(tiktoken.get_encoding("o200k_base").encode(text))
+    except ImportError:
+        return len(text) // 4
+
+
+async def builder_latency(system_prompts: list, queries: list) -> float:
+    """
+    Median latency of real Builder calls with the given system prompts
+    """
+    from ai_wayang_single.llm.agent_builder import Builder
+
+    timings = []
+    for system_prompt, query in zip(system_prompts, queries):
+        builder = Builder(system_prompt=system_prompt)
+        start = time.perf_counter()
+        await builder.generate_plan(query)
+        timings.append(time.perf_counter() - start)
+
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tables", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--live", action="store_true", help="Also measure Builder latency against the OpenAI API")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'tables':>7} {'mode':>7} {'prompt tokens':>14} {'assembly ms':>12} {'builder s':>10}")
+
+    for tables in args.tables:
+        folder = make_data_folder(tables, args.seed)
+
+        try:
+            for top_k in [0, args.top_k]:
+                loader = PromptLoader(data_folder=folder)
+                loader.schema_top_k = top_k
+
+                # First call builds caches and indexes
+                loader.load_builder_system_prompt(QUERIES[0])
+
+                # Time prompt assembly per request
+                prompts = []
+                start = time.perf_counter()
+                for query in QUERIES:
+                    prompts.append(loader.load_builder_system_prompt(query))
+                assembly_ms = (time.perf_counter() - start) / len(QUERIES) * 1000
+
+                tokens = statistics.mean(count_tokens(p) for p in prompts)
+                latency = f"{asyncio.run(builder_latency(prompts, QUERIES)):>10.2f}" if args.live else f"{'-':>10}"
+                mode = "full" if top_k == 0 else f"top-{top_k}"
+
+                print(f"{tables:>7} {mode:>7} {tokens:>14.0f} {assembly_ms:>12.3f} {latency}")
+        finally:
+            shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark of lookup latency in the semantic plan index at 10k and 100k cached plans
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Add src folder so modules can be found
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.utils.semantic_cache import HashingEmbedder, SemanticPlanIndex
+
+# Vocabulary for synthetic queries
+COLUMNS = ["navn", "alder", "email", "created_at", "person_id", "by", "postnummer", "vej"]
+TABLES = ["person_test", "adresse_test", "my_textfile", "names", "postal_codes"]
+ACTIONS = ["show", "count", "list", "find", "group", "sort", "sum", "select"]
+FILTERS = ["older than", "younger than", "equal to", "starting with", "containing", "longer than"]
+
+PLAN = WayangPlan(
+    operations=[{"cat": "input", "id": 1, "operatorName": "jdbcRemoteInput", "table": "person_test", "columnNames": ["navn"]}],
+    thoughts="Synthetic plan",
+).model_dump_json()
+
+
+def synthetic_query(rng: random.Random) -> str:
+    """
+    Creates a random analytics query
+    """
+    return (
+        f"{rng.choice(ACTIONS)} {rng.choice(COLUMNS)} and {rng.choice(COLUMNS)} from {rng.choice(TABLES)} "
+        f"where {rng.choice(COLUMNS)} is {rng.choice(FILTERS)} {rng.randint(0, 1000)}"
+    )
+
+
+def bench(size: int, lookups: int, dim: int, seed: int) -> dict:
+    """
+    Fills an index with size plans and times lookups
+    """
+    rng = random.Random(seed)
+    index = SemanticPlanIndex(HashingEmbedder(dim=dim), max_entries=size)
+
+    # Fill index
+    start = time.perf_counter()
+    index.add_many((synthetic_query(rng), PLAN) for _ in range(size))
+    fill_time = time.perf_counter() - start
+
+    # Time lookups including embedding of the query
+    timings = []
+    for _ in range(lookups):
+        query = synthetic_query(rng)
+        start = time.perf_counter()
+        index.search(query, threshold=0.5)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+
+    return {
+        "size": size,
+        "fill_s": fill_time,
+        "index_mb": index.vectors.nbytes / 1e6,
+        "p50_ms": statistics.median(timings),
+        "p95_ms": timings[int(len(timings) * 0.95) - 1],
+        "p99_ms": timings[int(len(timings) * 0.99) - 1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--lookups", type=int, default=200)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'plans':>8} {'fill s':>8} {'index MB':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for size in args.sizes:
+        r = bench(size, args.lookups, args.dim, args.seed)
+        print(f"{r['size']:>8} {r['fill_s']:>8.2f} {r['index_mb']:>9.1f} {r['p50_ms']:>8.3f} {r['p95_ms']:>8.3f} {r['p99_ms']:>8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+"""
+Replays a corpus of queries through the full query_wayang pipeline without network access.
+A local stand-in for the OpenAI Responses API returns recorded plans with configurable latency,
+and a local stub Wayang server answers plans. Reports end-to-end latency percentiles, throughput
+and time per pipeline stage
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import math
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Add src folder so modules can be found
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+
+from ai_wayang_single.config.settings import DEBUGGER_MODEL_CONFIG, INPUT_CONFIG, OUTPUT_CONFIG
+from ai_wayang_single.llm.agent_builder import Builder
+from ai_wayang_single.llm.agent_debugger import Debugger
+from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.server.pipeline import QueryPipeline
+from ai_wayang_single.server.session import Session
+from ai_wayang_single.utils.plan_cache import PlanCache
+from ai_wayang_single.utils.semantic_cache import SemanticPlanIndex
+from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+from ai_wayang_single.wayang.wayang_executor import WayangExecutor
+
+BENCH_FOLDER = Path(__file__).resolve().parent
+REPO_DATA = BENCH_FOLDER.parent / "data"
+
+
+### --- Stand-in for the OpenAI Responses API --- ###
+
+class FakeUsage:
+    """
+    Token usage shaped like the Responses API's, estimated at 4 characters per token
+    """
+
+    def __init__(self, input_tokens: int, cached_tokens: int, output_tokens: int):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.total_tokens = input_tokens + output_tokens
+        self.input_tokens_details = type("InputTokensDetails", (), {"cached_tokens": cached_tokens})()
+
+    def model_dump(self) -> dict:
+        return {
+            "input_tokens": self.input_tokens,
+            "input_tokens_details": {"cached_tokens": self.input_tokens_details.cached_tokens},
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+        }
+
+
+class FakeResponse:
+    def __init__(self, model: str, plan: WayangPlan, usage: FakeUsage):
+        self.model = model
+        self.output_parsed = plan
+        self.output_text = plan.model_dump_json()
+        self.usage = usage
+
+
+class FakeEvent:
+    def __init__(self, delta: str):
+        self.type = "response.output_text.delta"
+        self.delta = delta
+
+
+class FakeStream:
+    """
+    Streams a recorded plan in chunks, spreading the latency over the chunks
+    """
+
+    def __init__(self, responses: "FakeResponses", params: dict):
+        self.responses = responses
+        self.params = params
+        self.response = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __aiter__(self):
+        return self._events()
+
+    async def _events(self):
+        self.response, latency = self.responses.respond(self.params)
+        text = self.response.output_text
+        chunks = [text[i:i + 64] for i in range(0, len(text), 64)]
+
+        for chunk in chunks:
+            await asyncio.sleep(latency / len(chunks))
+            yield FakeEvent(chunk)
+
+    async def get_final_response(self) -> FakeResponse:
+        return self.response
+
+
+class FakeResponses:
+    """
+    Deterministic stand-in for client.responses. Answers with the recorded plan of the query found in the input
+    """
+
+    def __init__(self, corpus: list, latency: float, jitter: float, seed: int):
+        self.corpus = corpus
+        self.latency = latency
+        self.jitter = jitter
+        self.seed = seed
+        self.seen_prefixes = set() # System prompts sent before, counted as cached tokens
+        self.calls = 0
+
+    async def parse(self, **params) -> FakeResponse:
+        response, latency = self.respond(params)
+        await asyncio.sleep(latency)
+        return response
+
+    def stream(self, **params) -> FakeStream:
+        return FakeStream(self, params)
+
+    def respond(self, params: dict):
+        """
+        Picks the recorded plan and latency for a request
+        """
+        self.calls += 1
+        messages = params["input"]
+        user = [m["content"] for m in messages if m["role"] == "user"]
+
+        # Builder sends the query as is, the Debugger sends it with the failed plan
+        entry = next((e for e in self.corpus if e["query"] in user), None)
+        debugging = entry is None
+        if debugging:
+            entry = next((e for e in self.corpus if any(e["query"] in content for content in user)), self.corpus[0])
+
+        plan = entry.get("debug_plan", entry["plan"]) if debugging else entry["plan"]
+        plan = WayangPlan.model_validate(plan)
+
+        # Same latency for the same query and call type on every run
+        rng = random.Random(f"{self.seed}:{entry['query']}:{debugging}:{len(messages)}")
+        latency = max(self.latency + rng.uniform(-self.jitter, self.jitter), 0.0)
+
+        # Count the system prefix as cached if it was sent before
+        prefix = "".join(m["content"] for m in messages if m["role"] == "system")
+        input_chars = sum(len(m["content"]) for m in messages)
+        cached_chars = len(prefix) if prefix in self.seen_prefixes else 0
+        self.seen_prefixes.add(prefix)
+
+        usage = FakeUsage(input_chars // 4, cached_chars // 4, len(plan.model_dump_json()) // 4)
+
+        return FakeResponse(params["model"], plan, usage), latency
+
+
+class FakeClient:
+    def __init__(self, responses: FakeResponses):
+        self.responses = responses
+
+
+### --- Stub Wayang server --- ###
+
+def start_wayang_stub(latency: float, output_lines: int) -> ThreadingHTTPServer:
+    """
+    Starts a local server that answers every plan with output_lines lines after latency seconds
+    """
+    body = "".join(f"row {i},value {i * 7 % 101}\n" for i in range(output_lines)).encode("utf-8")
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            self._reply(body)
+
+        def do_GET(self):
+            self._reply(b"ok")
+
+        def _reply(self, data: bytes):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+### --- Replay --- ###
+
+def percentile(values: list, q: float) -> float:
+    """
+    Nearest-rank percentile
+    """
+    values = sorted(values)
+    return values[max(math.ceil(q * len(values)) - 1, 0)] if values else 0.0
+
+
+def load_corpus(path: Path) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def replay(args, corpus: list, work_folder: Path) -> dict:
+    """
+    Runs every query in the corpus args.repeat times with args.concurrency queries in flight
+    """
+    wayang = start_wayang_stub(args.wayang_latency, args.output_lines)
+    wayang_url = f"http://127.0.0.1:{wayang.server_address[1]}/wayang-api-json/submit-plan/json"
+
+    # Inputs and outputs in the work folder, nothing outside it is touched
+    (work_folder / "input").mkdir()
+    (work_folder / "output").mkdir()
+    config = {
+        "input_config": {**INPUT_CONFIG, "input_folder": str(work_folder / "input")},
+        "output_config": {**OUTPUT_CONFIG, "output_folder": str(work_folder / "output")},
+    }
+
+    plan_mapper = PlanMapper(config=config)
+    plan_validator = PlanValidator()
+    wayang_executor = WayangExecutor(urls=[wayang_url])
+    plan_cache = PlanCache(cache_path=str(work_folder / "plan_cache.db"), schema_folder=REPO_DATA / "schemas") if args.plan_cache else None
+    semantic_index = SemanticPlanIndex() if args.semantic_cache else None
+    pipeline = QueryPipeline(plan_mapper, plan_validator, wayang_executor, plan_cache, semantic_index)
+
+    llm = FakeClient(FakeResponses(corpus, args.llm_latency, args.llm_jitter, args.seed))
+    slots = asyncio.Semaphore(args.concurrency)
+    runs = []
+
+    async def run_query(i: int, entry: dict):
+        # One session per query so queries don't wait for each other's session
+        session = Session(f"bench-{i}", Builder(client=llm), Debugger(client=llm))
+
+        async with slots:
+            start = time.perf_counter()
+            result = await pipeline.run(session, entry["query"])
+            elapsed = time.perf_counter() - start
+
+        runs.append({
+            "query": entry["query"],
+            "ok": session.phase == "done",
+            "seconds": elapsed,
+            "stages": session.stage_times(),
+            "version": session.version,
+            "result": result if session.phase != "done" else None,
+        })
+
+    queries = [entry for _ in range(args.repeat) for entry in corpus]
+
+    # Pipeline prints progress for every step
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    with quiet:
+        start = time.perf_counter()
+        await asyncio.gather(*(run_query(i, entry) for i, entry in enumerate(queries)))
+        wall = time.perf_counter() - start
+
+    await wayang_executor.close()
+    wayang.shutdown()
+
+    return {"wall": wall, "runs": runs, "llm_calls": llm.responses.calls}
+
+
+def report(results: dict, concurrency: int) -> dict:
+    """
+    Summarizes latency percentiles, throughput and time per stage
+    """
+    runs = results["runs"]
+    latencies = [run["seconds"] * 1000 for run in runs]
+
+    stages = {}
+    for run in runs:
+        for stage, seconds in run["stages"].items():
+            stages.setdefault(stage, []).append(seconds * 1000)
+
+    return {
+        "queries": len(runs),
+        "concurrency": concurrency,
+        "succeeded": sum(run["ok"] for run in runs),
+        "llm_calls": results["llm_calls"],
+        "wall_s": results["wall"],
+        "throughput_qps": len(runs) / results["wall"] if results["wall"] else 0.0,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "stages": {
+            stage: {
+                "count": len(times),
+                "mean_ms": statistics.fmean(times),
+                "p50_ms": percentile(times, 0.50),
+                "p95_ms": percentile(times, 0.95),
+                "total_share": sum(times) / sum(latencies) if latencies else 0.0,
+            }
+            for stage, times in stages.items()
+        },
+        "failures": [{"query": run["query"], "result": run["result"]} for run in runs if not run["ok"]],
+    }
+
+
+def print_report(summary: dict) -> None:
+    print(
+        f"{summary['queries']} queries, concurrency {summary['concurrency']}: "
+        f"{summary['succeeded']} succeeded, {summary['llm_calls']} LLM calls, "
+        f"{summary['throughput_qps']:.2f} queries/s over {summary['wall_s']:.2f}s"
+    )
+    print(f"end-to-end  p50 {summary['p50_ms']:.1f} ms  p95 {summary['p95_ms']:.1f} ms  p99 {summary['p99_ms']:.1f} ms")
+    print()
+    print(f"{'stage':<14} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'share':>7}")
+    for stage, s in sorted(summary["stages"].items(), key=lambda item: -item[1]["total_share"]):
+        print(f"{stage:<14} {s['count']:>6} {s['mean_ms']:>9.2f} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} {s['total_share']:>7.1%}")
+
+    for failure in summary["failures"][:5]:
+        print(f"[ERROR] {failure['query']}: {failure['result']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--corpus", type=Path, default=BENCH_FOLDER / "corpus.jsonl", help="JSON Lines with query, plan and optional debug_plan")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--repeat", type=int, default=5, help="Passes over the corpus")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per LLM call")
+    parser.add_argument("--llm-jitter", type=float, default=0.1, help="Uniform jitter in seconds around the LLM latency")
+    parser.add_argument("--wayang-latency", type=float, default=0.2, help="Seconds per plan in the stub Wayang server")
+    parser.add_argument("--output-lines", type=int, default=1000, help="Lines of output per plan")
+    parser.add_argument("--debugger", action="store_true", help="Use the Debugger Agent on failed plans")
+    parser.add_argument("--plan-cache", action="store_true", help="Use a fresh plan cache")
+    parser.add_argument("--semantic-cache", action="store_true", help="Use a fresh semantic plan index")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, default=None, help="Also write the results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline's output")
+    args = parser.parse_args()
+
+    DEBUGGER_MODEL_CONFIG["use_debugger"] = "True" if args.debugger else "False"
+    corpus = load_corpus(args.corpus)
+    summaries = []
+
+    for concurrency in args.concurrency:
+        args.concurrency = concurrency
+
+        with tempfile.TemporaryDirectory(prefix="wayang_replay_") as folder:
+            results = asyncio.run(replay(args, corpus, Path(folder)))
+
+        summary = report(results, concurrency)
+        summaries.append(summary)
+        print_report(summary)
+        print()
+
+    if args.json:
+        args.json.write_text(json.dumps(summaries, indent=2))
+
+
+if __name__ == "__main__":
+    main()
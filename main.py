@@ -8,11 +8,15 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent / "src"))
 
 from src.ai_wayang_single.server.mcp_server import mcp
+from ai_wayang_single.utils.metrics import start_metrics_server # Same module as used by the server
 
 def main():
     """
     Starts the MCP-server
     """
+    # Prometheus metrics on their own port, next to the MCP-server
+    start_metrics_server()
+
     #mcp.run(transport="streamable-http")
     mcp.run(transport="sse")
     print(f"Starts MCP-server")
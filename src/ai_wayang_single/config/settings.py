@@ -7,13 +7,34 @@ load_dotenv()
 
 # Server port for MCP server
 MCP_CONFIG = {
-    "port": int(os.getenv("MCP_PORT", 9500))
+    "port": int(os.getenv("MCP_PORT", 9500)),
+    "max_concurrent_queries": int(os.getenv("MAX_CONCURRENT_QUERIES", 16))
+}
+
+# Background job settings
+JOB_CONFIG = {
+    "workers": int(os.getenv("JOB_WORKERS", 8)), # Jobs running at the same time
+    "ttl_seconds": int(os.getenv("JOB_TTL_SECONDS", 3600)), # Seconds finished jobs and their results are kept
+    "max_jobs": int(os.getenv("MAX_JOBS", 1000)), # Maximum jobs kept, oldest finished jobs are evicted first
+    "max_jobs_per_session": int(os.getenv("MAX_JOBS_PER_SESSION", 20)) # Queued and running jobs a client can have at once
+}
+
+# Client session settings
+SESSION_CONFIG = {
+    "ttl_seconds": int(os.getenv("SESSION_TTL_SECONDS", 3600)),
+    "max_sessions": int(os.getenv("MAX_SESSIONS", 1000))
 }
 
 # LLM client model settings
 BUILDER_MODEL_CONFIG = {
     "model": os.getenv("BUILDER_LLM", "gpt-5-nano"),
-    "reason_effort": os.getenv("BUILDER_REASON_EFFORT", None)
+    "reason_effort": os.getenv("BUILDER_REASON_EFFORT", None),
+    "use_streaming": os.getenv("BUILDER_STREAMING", "False") # Stream the plan and abort on the first invalid operator
+}
+
+# Rule-based plan repair settings
+REPAIR_CONFIG = {
+    "use_plan_repair": os.getenv("USE_PLAN_REPAIR", "True") # Fix mechanical plan errors locally before the Debugger is used
 }
 
 # Debugger LLM model settings
@@ -24,6 +45,40 @@ DEBUGGER_MODEL_CONFIG = {
     "max_itr": os.getenv("MAX_ITERATIONS", 5)
 }
 
+# Prompt settings
+PROMPT_CONFIG = {
+    "reload_interval": float(os.getenv("PROMPT_RELOAD_INTERVAL", 2.0)), # Seconds between checks for changed prompt and schema files
+    "schema_top_k": int(os.getenv("SCHEMA_TOP_K", 0)), # Only include the k most relevant schemas in the Builder prompt, 0 includes all
+    "few_shot_top_k": int(os.getenv("FEW_SHOT_TOP_K", 0)), # Only include the k most similar few-shot examples, 0 includes all
+    "few_shot_token_budget": int(os.getenv("FEW_SHOT_TOKEN_BUDGET", 6000)), # Maximum estimated tokens for selected few-shot examples
+    "layout": os.getenv("PROMPT_LAYOUT", "template"), # "template" fills one system prompt, "cache" orders static to dynamic for prompt caching
+    "prompt_cache_key": os.getenv("PROMPT_CACHE_KEY", None) # Optional key sent to the provider to group requests sharing a prefix
+}
+
+# Plan cache settings
+CACHE_CONFIG = {
+    "use_plan_cache": os.getenv("USE_PLAN_CACHE", "False"),
+    "cache_path": os.getenv("PLAN_CACHE_PATH", None),
+    "max_entries": int(os.getenv("PLAN_CACHE_MAX_ENTRIES", 10000))
+}
+
+# Semantic plan cache settings
+SEMANTIC_CACHE_CONFIG = {
+    "use_semantic_cache": os.getenv("USE_SEMANTIC_CACHE", "False"),
+    "mode": os.getenv("SEMANTIC_CACHE_MODE", "few_shot"), # "few_shot" or "reuse"
+    "threshold": float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.5)), # Minimum similarity to use a plan as example
+    "reuse_threshold": float(os.getenv("SEMANTIC_CACHE_REUSE_THRESHOLD", 0.9)), # Minimum similarity to reuse a plan
+    "dim": int(os.getenv("SEMANTIC_CACHE_DIM", 512)),
+    "max_entries": int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 10000))
+}
+
+# Speculative plan generation settings
+SPECULATIVE_CONFIG = {
+    "use_speculative": os.getenv("USE_SPECULATIVE", "False"), # Generate several plans concurrently and use the first valid one
+    "n": int(os.getenv("SPECULATIVE_N", 3)), # Number of concurrent Builder calls
+    "variants": os.getenv("SPECULATIVE_VARIANTS", "") # Comma separated model:effort[:temperature], empty uses the Builder's own model
+}
+
 # Input settings
 INPUT_CONFIG = {
     "jdbc_uri": os.getenv("JDBC_URI", "jdbc:postgresql://localhost:5432/master_thesis_db"),
@@ -34,15 +89,69 @@ INPUT_CONFIG = {
 
 # Output settings
 OUTPUT_CONFIG = {
-    "output_folder": os.getenv("OUTPUT_FOLDER", None)
+    "output_folder": os.getenv("OUTPUT_FOLDER", None),
+    "partition_by_run": os.getenv("OUTPUT_PARTITION_BY_RUN", "False"), # Write each run's output files in its own folder
+    "retention_max_age": float(os.getenv("OUTPUT_RETENTION_MAX_AGE", 0)), # Seconds before output files are deleted, 0 keeps them
+    "retention_max_bytes": int(os.getenv("OUTPUT_RETENTION_MAX_BYTES", 0)), # Oldest output files are deleted above this total size, 0 for no limit
+    "retention_interval": float(os.getenv("OUTPUT_RETENTION_INTERVAL", 300)) # Seconds between cleanups
+}
+
+# Result settings
+RESULT_CONFIG = {
+    "spool_max_memory": int(os.getenv("RESULT_SPOOL_MAX_MEMORY", 1024 * 1024)), # Bytes of output kept in memory before spilling to a temporary file
+    "inline_max_chars": int(os.getenv("RESULT_INLINE_MAX_CHARS", 20000)), # Larger outputs are cut when returned and read with the paging tools
+    "max_page_lines": int(os.getenv("RESULT_MAX_PAGE_LINES", 1000)) # Maximum lines returned per page
 }
 
 # Log settings
 LOG_CONFIG = {
-    "log_folder": os.getenv("LOG_FOLDER", None)
+    "log_folder": os.getenv("LOG_FOLDER", None),
+    "max_bytes": int(os.getenv("LOG_MAX_BYTES", 50 * 1024 * 1024)), # Rotate the log file at this size
+    "rotate_seconds": int(os.getenv("LOG_ROTATE_SECONDS", 86400)), # Rotate the log file after this many seconds, 0 disables
+    "fsync_interval": float(os.getenv("LOG_FSYNC_INTERVAL", 1.0)) # Seconds between syncs of the log file to disk
+}
+
+# Tracing settings
+TRACE_CONFIG = {
+    "trace_file": os.getenv("TRACE_FILE", None), # JSON Lines file for finished spans, None disables it
+    "use_otel": os.getenv("TRACE_OTEL", "False") # Also send spans to OpenTelemetry, needs opentelemetry-api
+}
+
+# Metrics endpoint settings
+METRICS_CONFIG = {
+    "port": int(os.getenv("METRICS_PORT", 9501)), # Port for Prometheus metrics on /metrics, 0 disables it
+    "host": os.getenv("METRICS_HOST", "127.0.0.1")
+}
+
+# Scala UDF compile check settings
+UDF_CONFIG = {
+    "use_udf_check": os.getenv("USE_UDF_CHECK", "False"), # Compile UDFs locally before a plan is sent to Wayang
+    "compiler": os.getenv("UDF_COMPILER", "fsc"), # Scala compiler, fsc keeps a compile daemon running between plans
+    "classpath": os.getenv("WAYANG_CLASSPATH", ""), # Wayang jars with org.apache.wayang.basic.data.Record
+    "timeout": int(os.getenv("UDF_COMPILE_TIMEOUT", 60)), # Seconds before a compile is given up and the check skipped
+    "cache_size": int(os.getenv("UDF_CACHE_SIZE", 10000)) # Compile results kept by UDF text
+}
+
+# Plan optimizer settings, rewrites run on validated plans right before execution
+OPTIMIZER_CONFIG = {
+    "use_predicate_pushdown": os.getenv("USE_PREDICATE_PUSHDOWN", "False"), # Move simple filters after a jdbcRemoteInput into its SQL WHERE
+    "use_projection_pruning": os.getenv("USE_PROJECTION_PRUNING", "False") # Select only the columns of a jdbcRemoteInput its readers use
 }
 
 # Wayang server settings
 WAYANG_CONFIG = {
-    "server_url": os.getenv("WAYANG_URL")
+    "server_url": os.getenv("WAYANG_URL"),
+    "server_urls": os.getenv("WAYANG_URLS", ""), # Comma separated Wayang servers, used instead of WAYANG_URL if set
+    "weights": os.getenv("WAYANG_WEIGHTS", ""), # Comma separated weight per server in WAYANG_URLS
+    "balancing": os.getenv("WAYANG_BALANCING", "least_outstanding"), # "least_outstanding" or "weighted_round_robin"
+    "health_interval": float(os.getenv("WAYANG_HEALTH_INTERVAL", 10.0)), # Seconds between health probes, 0 disables them
+    "failure_threshold": int(os.getenv("WAYANG_FAILURE_THRESHOLD", 3)), # Failures in a row before a server is ejected
+    "reset_timeout": float(os.getenv("WAYANG_RESET_TIMEOUT", 30.0)), # Seconds before an ejected server gets a trial request
+    "connect_timeout": float(os.getenv("WAYANG_CONNECT_TIMEOUT", 5.0)), # Seconds to connect to the Wayang server
+    "read_timeout": float(os.getenv("WAYANG_READ_TIMEOUT", 600.0)), # Seconds to wait for the plan to execute
+    "max_connections": int(os.getenv("WAYANG_MAX_CONNECTIONS", 32)), # Connection pool size
+    "max_keepalive_connections": int(os.getenv("WAYANG_MAX_KEEPALIVE_CONNECTIONS", 16)), # Idle connections kept open
+    "keepalive_expiry": float(os.getenv("WAYANG_KEEPALIVE_EXPIRY", 30.0)), # Seconds before an idle connection is closed
+    "max_retries": int(os.getenv("WAYANG_MAX_RETRIES", 3)), # Retries when a plan never reached the server or a gateway failed
+    "retry_backoff": float(os.getenv("WAYANG_RETRY_BACKOFF", 0.5)) # Base seconds for exponential backoff with jitter
 }
\ No newline at end of file
@@ -1,7 +1,11 @@
-from openai import OpenAI
-from ai_wayang_single.config.settings import BUILDER_MODEL_CONFIG
-from ai_wayang_single.llm.models import WayangPlan
+from openai import AsyncOpenAI
+from typing import Callable, Dict, List
+from ai_wayang_single.config.settings import BUILDER_MODEL_CONFIG, PROMPT_CONFIG
+from ai_wayang_single.llm.models import WayangOperation, WayangPlan
+from ai_wayang_single.llm.plan_stream import OperationStreamParser
 from ai_wayang_single.llm.prompt_loader import PromptLoader
+from ai_wayang_single.utils.metrics import metrics
+import time
 
 
 class Builder:
@@ -15,13 +19,45 @@ class Builder:
         model: str | None = None,
         reasoning: str | None = None,
         system_prompt: str | None = None,
+        client: AsyncOpenAI | None = None,
     ):
-        self.client = OpenAI()
+        self.client = client or AsyncOpenAI()
         self.model = model or BUILDER_MODEL_CONFIG.get("model")
         self.reasoning = reasoning or BUILDER_MODEL_CONFIG.get("reason_effort")
-        self.system_prompt = (
-            system_prompt or PromptLoader().load_builder_system_prompt()
-        )
+        self.prompt_loader = PromptLoader()
+        self.system_prompt = system_prompt # Fixed system prompt, else loaded from the prompt cache
+        self.prompt_cache_key = PROMPT_CONFIG.get("prompt_cache_key")
+
+    def get_system_prompt(self, query: str | None = None) -> str:
+        """
+        Get the system prompt. Uses the process-wide prompt cache unless a fixed prompt is given
+
+        Args:
+            query (str | None): The query, used to select relevant schemas if schema pruning is enabled
+
+        Returns:
+            str: Builder's system prompt
+
+        """
+
+        return "\n\n".join(message["content"] for message in self.get_system_messages(query))
+
+    def get_system_messages(self, query: str | None = None) -> List[Dict]:
+        """
+        Get the system messages put before the query
+
+        Args:
+            query (str | None): The query, used to select relevant schemas and examples if enabled
+
+        Returns:
+            List[Dict]: System messages
+
+        """
+
+        if self.system_prompt:
+            return [{"role": "system", "content": self.system_prompt}]
+
+        return self.prompt_loader.load_builder_messages(query)
 
     def set_model_and_reasoning(self, model: str, reasoning: str) -> None:
         """
@@ -36,36 +72,130 @@ class Builder:
         self.model = model
         self.reasoning = reasoning
 
-    def generate_plan(self, prompt: str):
+    async def generate_plan(
+        self,
+        prompt: str,
+        example: str | None = None,
+        model: str | None = None,
+        reasoning: str | None = None,
+        temperature: float | None = None,
+    ):
         """
         Generates a logical, abstract Wayang plan from a natural language query.
 
         Args:
             prompt (str): A query in natural language
+            example (str | None): Optional prompt with a highly relevant example plan
+            model (str | None): Model for this call only, defaults to the agent's model
+            reasoning (str | None): Reasoning effort for this call only, defaults to the agent's effort. "" for no reasoning
+            temperature (float | None): Optional sampling temperature for this call
 
         Returns:
             WayangPlan: A logical Wayang plan
 
         """
 
+        # Generate response
+        start = time.perf_counter()
+        response = await self.client.responses.parse(**self._params(prompt, example, model, reasoning, temperature))
+        metrics.record_llm("builder", response, time.perf_counter() - start)
+
+        # Return response
+        return {"raw": response, "wayang_plan": response.output_parsed}
+
+    async def stream_plan(
+        self,
+        prompt: str,
+        check: Callable[[WayangOperation], List[str]],
+        example: str | None = None,
+    ) -> Dict:
+        """
+        Generates a plan like generate_plan, but streams the response and checks each operator as soon as it is complete.
+        The stream is aborted on the first operator with errors, so a retry can start without waiting for the full plan
+
+        Args:
+            prompt (str): A query in natural language
+            check (Callable[[WayangOperation], List[str]]): Checks a single operator, returns fatal errors
+            example (str | None): Optional prompt with a highly relevant example plan
+
+        Returns:
+            Dict: "raw" response (None if aborted), "wayang_plan" (partial if aborted), "aborted" and "errors"
+
+        """
+
+        parser = OperationStreamParser()
+        start = time.perf_counter()
+
+        async with self.client.responses.stream(**self._params(prompt, example)) as stream:
+            async for event in stream:
+                if event.type != "response.output_text.delta":
+                    continue
+
+                # Check operators as they complete
+                for operation in parser.feed(event.delta):
+                    errors = check(operation)
+
+                    # Leaving the context closes the connection and stops generation
+                    if errors:
+                        metrics.record_llm("builder", None, time.perf_counter() - start)
+                        partial = WayangPlan(operations=parser.operations, thoughts="Generation aborted at an invalid operator")
+                        return {"raw": None, "wayang_plan": partial, "aborted": True, "errors": errors}
+
+            response = await stream.get_final_response()
+
+        metrics.record_llm("builder", response, time.perf_counter() - start)
+
+        return {"raw": response, "wayang_plan": response.output_parsed, "aborted": False, "errors": []}
+
+    def _params(
+        self,
+        prompt: str,
+        example: str | None = None,
+        model: str | None = None,
+        reasoning: str | None = None,
+        temperature: float | None = None,
+    ) -> Dict:
+        """
+        Helper function to build the request parameters
+
+        Args:
+            prompt (str): A query in natural language
+            example (str | None): Optional prompt with a highly relevant example plan
+            model (str | None): Model override
+            reasoning (str | None): Reasoning effort override, "" for no reasoning
+            temperature (float | None): Optional sampling temperature
+
+        Returns:
+            Dict: Parameters for the Responses API
+
+        """
+
         # Defines params and structured format for the model
         params = {
-            "model": self.model,
+            "model": model or self.model,
             "input": [
-                {"role": "system", "content": self.system_prompt},
+                *self.get_system_messages(prompt),
                 {"role": "user", "content": prompt},
             ],
             "text_format": WayangPlan,
         }
 
+        # Add relevant example right before the query
+        if example:
+            params["input"].insert(-1, {"role": "system", "content": example})
+
+        # Group requests sharing a prompt prefix for provider-side caching
+        if self.prompt_cache_key:
+            params["prompt_cache_key"] = f"{self.prompt_cache_key}-builder"
+
         # Set effort if reasoning model
-        effort = self.reasoning
+        effort = self.reasoning if reasoning is None else reasoning
 
         if effort:
             params["reasoning"] = {"effort": effort}
 
-        # Generate response
-        response = self.client.responses.parse(**params)
+        # Set temperature if given, only supported by non-reasoning models
+        if temperature is not None:
+            params["temperature"] = temperature
 
-        # Return response
-        return {"raw": response, "wayang_plan": response.output_parsed}
+        return params
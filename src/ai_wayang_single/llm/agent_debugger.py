@@ -1,10 +1,12 @@
-from openai import OpenAI
+from openai import AsyncOpenAI
 import re
 import json
 from typing import List
-from ai_wayang_single.config.settings import DEBUGGER_MODEL_CONFIG
+from ai_wayang_single.config.settings import DEBUGGER_MODEL_CONFIG, PROMPT_CONFIG
 from ai_wayang_single.llm.prompt_loader import PromptLoader
 from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.utils.metrics import metrics
+import time
 
 
 class Debugger:
@@ -20,13 +22,14 @@ class Debugger:
         reasoning: str | None = None,
         system_prompt: str | None = None,
         version: int | None = None,
+        client: AsyncOpenAI | None = None,
     ):
-        self.client = OpenAI()
+        self.client = client or AsyncOpenAI()
         self.model = model or DEBUGGER_MODEL_CONFIG.get("model")
         self.reasoning = reasoning or DEBUGGER_MODEL_CONFIG.get("reason_effort")
-        self.system_prompt = (
-            system_prompt or PromptLoader().load_debugger_system_prompt()
-        )
+        self.prompt_loader = PromptLoader()
+        self.system_prompt = system_prompt # Fixed system prompt, else loaded from the prompt cache
+        self.prompt_cache_key = PROMPT_CONFIG.get("prompt_cache_key")
         self.version = version or 0
         self.chat = []
 
@@ -43,6 +46,17 @@ class Debugger:
         self.model = model
         self.reasoning = reasoning
 
+    def get_system_prompt(self) -> str:
+        """
+        Get the system prompt. Uses the process-wide prompt cache unless a fixed prompt is given
+
+        Returns:
+            str: Debugger's system prompt
+
+        """
+
+        return self.system_prompt or self.prompt_loader.load_debugger_system_prompt()
+
     def get_version(self) -> int:
         """
         Get the iteration of the plan
@@ -71,7 +85,7 @@ class Debugger:
 
         return self.get_version()
 
-    def debug_plan(
+    async def debug_plan(
         self, query: str, plan: WayangPlan, wayang_errors: str, val_errors: List
     ):
         """
@@ -92,8 +106,8 @@ class Debugger:
         self.version += 1
 
         # Create new user prompt
-        prompt = PromptLoader().load_debugger_prompt(
-            plan, query, wayang_errors, val_errors
+        prompt = self.prompt_loader.load_debugger_prompt(
+            query=query, failed_plan=plan, wayang_errors=wayang_errors, val_errors=val_errors
         )
 
         # Add user prompt to chat
@@ -107,12 +121,18 @@ class Debugger:
         if effort:
             params["reasoning"] = {"effort": effort}
 
+        # Chat is append-only, so each iteration extends the previous prefix. Group them for provider-side caching
+        if self.prompt_cache_key:
+            params["prompt_cache_key"] = f"{self.prompt_cache_key}-debugger"
+
         # Generate response
-        response = self.client.responses.parse(**params)
+        start = time.perf_counter()
+        response = await self.client.responses.parse(**params)
+        metrics.record_llm("debugger", response, time.perf_counter() - start)
 
         # Format text answer from agent
         wayang_plan = response.output_parsed
-        answer = PromptLoader().load_debugger_answer(wayang_plan)
+        answer = self.prompt_loader.load_debugger_answer(wayang_plan)
 
         # Add agent answer to chat - necessary if another debug iteration is needed
         self.chat.append({"role": "assistant", "content": answer})
@@ -126,4 +146,4 @@ class Debugger:
 
         """
 
-        self.chat = [{"role": "system", "content": self.system_prompt}]
+        self.chat = [{"role": "system", "content": self.get_system_prompt()}]
@@ -0,0 +1,95 @@
+from ai_wayang_single.llm.models import WayangOperation
+from typing import List
+import json
+import re
+
+
+class OperationStreamParser:
+    """
+    Incremental parser for a streamed WayangPlan in JSON.
+    Text is fed as it arrives and each operation is returned as soon as its JSON object is complete.
+    Every character is scanned once, so parsing adds no noticeable time to the stream
+
+    """
+
+    OPERATIONS_KEY = re.compile(r'"operations"\s*:\s*\[')
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0 # Next character to scan
+        self.in_array = False # Inside the operations array
+        self.done = False # Operations array is closed
+        self.depth = 0 # Nesting depth inside the array
+        self.in_string = False
+        self.escape = False
+        self.start = None # Start of the current operation object
+        self.operations: List[WayangOperation] = []
+
+    def feed(self, text: str) -> List[WayangOperation]:
+        """
+        Feed the next part of the streamed JSON
+
+        Args:
+            text (str): New text from the stream
+
+        Returns:
+            List[WayangOperation]: Operations completed by this text
+
+        """
+
+        self.buffer += text
+        completed = []
+
+        if self.done:
+            return completed
+
+        # Find the start of the operations array. Structured output emits fields in schema order
+        if not self.in_array:
+            match = self.OPERATIONS_KEY.search(self.buffer)
+            if not match:
+                return completed
+            self.in_array = True
+            self.pos = match.end()
+
+        buffer = self.buffer
+
+        for i in range(self.pos, len(buffer)):
+            char = buffer[i]
+
+            # Skip content of strings, which may contain braces
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                continue
+
+            if char == '"':
+                self.in_string = True
+
+            elif char in "{[":
+                if self.depth == 0:
+                    self.start = i
+                self.depth += 1
+
+            elif char in "}]":
+                # End of the operations array
+                if self.depth == 0:
+                    self.done = True
+                    self.pos = i + 1
+                    return completed
+
+                self.depth -= 1
+
+                # An operation object is complete
+                if self.depth == 0:
+                    operation = WayangOperation.model_validate(json.loads(buffer[self.start:i + 1]))
+                    self.operations.append(operation)
+                    completed.append(operation)
+                    self.start = None
+
+        self.pos = len(buffer)
+
+        return completed
@@ -1,43 +1,202 @@
 from pathlib import Path
 import os
+import re
 import json
-from typing import List, Dict
+import threading
+import time
+from typing import Callable, List, Dict
+from ai_wayang_single.config.settings import PROMPT_CONFIG
 from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.llm.retrieval import FewShotIndex, SchemaRetriever
+
+
+class PromptTemplate:
+    """
+    Prompt template compiled once into literal and placeholder segments.
+    Placeholders are written as {name}. Unknown placeholders are kept as they are
+
+    """
+
+    PLACEHOLDER = re.compile(r"\{([a-z_]+)\}")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.segments = self.PLACEHOLDER.split(template) # Literals at even, names at odd positions
+
+    def render(self, **values: str) -> str:
+        """
+        Fill the template
+
+        Args:
+            **values (str): Value for each placeholder
+
+        Returns:
+            (str): The filled template
+
+        """
+
+        parts = []
+
+        for i, segment in enumerate(self.segments):
+            if i % 2 == 0:
+                parts.append(segment)
+            else:
+                value = values.get(segment)
+                parts.append("{" + segment + "}" if value is None else value)
+
+        return "".join(parts)
+
+
+class _CacheEntry:
+    """
+    Entry in the process-wide prompt cache
+
+    """
+
+    def __init__(self, version, value):
+        self.version = version # File mtime and size, folder fingerprint or parts the value was built from
+        self.value = value
+        self.checked_at = time.monotonic()
+
+
+def _read_text(text: str) -> str:
+    return text
+
+
+def _read_schema(text: str) -> str:
+    return json.dumps(json.loads(text), indent=3, ensure_ascii=False)
+
+
+def _read_json(text: str) -> Dict:
+    return json.loads(text)
+
+
+# Process-wide cache of files, folders and assembled prompts shared by all PromptLoaders
+_cache: Dict[tuple, _CacheEntry] = {}
+_assembled: Dict[str, _CacheEntry] = {}
+_cache_lock = threading.Lock()
+
+# Default folders, resolved once
+_PROMPT_FOLDER = Path(__file__).resolve().parent / "prompts"
+_DATA_FOLDER = Path(__file__).resolve().parent.parent.parent.parent / "data"
 
 
 class PromptLoader:
     """
-    Loads and prepares prompts for agents
+    Loads and prepares prompts for agents.
+    Files, schemas and assembled prompts are cached for the whole process and reloaded when files change on disk
 
     """
     def __init__(self, prompt_folder: str | None = None, data_folder: str | None = None):
-        self.prompt_folder = Path(__file__).resolve().parent / "prompts"
-        self.data_folder = Path(__file__).resolve().parent.parent.parent.parent / "data"
-    
-    def load_builder_system_prompt(self) -> str:
+        self.prompt_folder = Path(prompt_folder) if prompt_folder else _PROMPT_FOLDER
+        self.data_folder = Path(data_folder) if data_folder else _DATA_FOLDER
+        self.reload_interval = PROMPT_CONFIG.get("reload_interval")
+        self.schema_top_k = PROMPT_CONFIG.get("schema_top_k")
+        self.few_shot_top_k = PROMPT_CONFIG.get("few_shot_top_k")
+        self.few_shot_token_budget = PROMPT_CONFIG.get("few_shot_token_budget")
+        self.layout = PROMPT_CONFIG.get("layout")
+
+    def load_builder_system_prompt(self, query: str | None = None) -> str:
         """
-        Load and prepare system prompt for Builder Agent
+        Load and prepare system prompt for Builder Agent.
+        If schema pruning or few-shot selection is enabled and a query is given, only the most relevant schemas and examples are included
+
+        Args:
+            query (str | None): The natural language query the prompt is for
 
         Returns:
             (str): Builder's system prompt
 
         """
 
+        # Prompt with only the schemas and examples relevant to the query
+        if query and (self.schema_top_k or self.few_shot_top_k):
+            system_prompt = self._read_template(self.prompt_folder, "builder_prompts/system_prompt.txt")
+
+            return system_prompt.render(
+                data=self.load_data_prompt(query),
+                operators=self.load_operators(),
+                examples=self.load_few_shot_prompt(query),
+            )
+
+        # Return directly if assembled recently
+        recent = self._recent(self._key("builder_system_prompt"))
+        if recent:
+            return recent
+
         # Get system prompt template
-        system_prompt = self._read_file(self.prompt_folder, "builder_prompts/system_prompt.txt")
-        
+        system_prompt = self._read_template(self.prompt_folder, "builder_prompts/system_prompt.txt")
+
         # Get general prompt templates
         data_prompt = self.load_data_prompt()
         operator_prompt = self.load_operators()
         few_shot_prompt = self.load_few_shot_prompt()
 
-        # Fill system prompt template
-        system_prompt = system_prompt.replace("{data}", data_prompt)
-        system_prompt = system_prompt.replace("{operators}", operator_prompt)
-        system_prompt = system_prompt.replace("{examples}", few_shot_prompt)
+        # Fill system prompt template, only if any part has changed
+        return self._assemble(
+            self._key("builder_system_prompt"),
+            (system_prompt, data_prompt, operator_prompt, few_shot_prompt),
+            lambda: system_prompt.render(data=data_prompt, operators=operator_prompt, examples=few_shot_prompt),
+        )
+
+
+    def load_builder_messages(self, query: str | None = None) -> List[Dict]:
+        """
+        Load the system messages for the Builder Agent.
+        With the "cache" layout, content is ordered from most static to most dynamic (operators, few-shot examples, schemas),
+        so requests share a byte-identical prefix and provider-side prompt caching applies
+
+        Args:
+            query (str | None): The natural language query the messages are for
+
+        Returns:
+            (List[Dict]): System messages to put before the user query
+
+        """
+
+        # One system prompt with everything filled in
+        if self.layout != "cache":
+            return [{"role": "system", "content": self.load_builder_system_prompt(query)}]
+
+        # Static instructions and operators
+        template = self._read_template(self.prompt_folder, "builder_prompts/system_prompt_cached.txt")
+        operators = self.load_operators()
+        instructions = self._assemble(
+            self._key("builder_cached_prompt"),
+            (template, operators),
+            lambda: template.render(operators=operators),
+        )
+
+        return [
+            {"role": "system", "content": instructions},
+            {"role": "system", "content": self.load_few_shot_prompt(query)},
+            {"role": "system", "content": self.load_data_prompt(query)},
+        ]
+
+
+    def load_similar_example_prompt(self, query: str, plan: WayangPlan) -> str:
+        """
+        Load and prepare a prompt with the most similar previously successful plan.
+        Used as a single, highly relevant few-shot example for the Builder Agent
+
+        Args:
+            query (str): The query of the similar plan
+            plan (WayangPlan): The similar plan
+
+        Returns:
+            (str): Example prompt for the Builder Agent
+
+        """
+
+        # Get example template
+        example_prompt = self._read_template(self.prompt_folder, "builder_prompts/similar_example.txt")
+
+        # Format plan as the Builder outputs it
+        plan_str = json.dumps(plan.model_dump(exclude={"thoughts"}), indent=2, ensure_ascii=False)
+
+        # Fill template
+        return example_prompt.render(query=query, plan=plan_str)
 
-        return system_prompt
-    
 
     def load_debugger_system_prompt(self) -> str:
         """
@@ -48,18 +207,24 @@ class PromptLoader:
 
         """
 
+        # Return directly if assembled recently
+        recent = self._recent(self._key("debugger_system_prompt"))
+        if recent:
+            return recent
+
         # Load system prompt template
-        system_prompt = self._read_file(self.prompt_folder, "debugger_prompts/system_prompt.txt")
+        system_prompt = self._read_template(self.prompt_folder, "debugger_prompts/system_prompt.txt")
 
         # Load general prompt templates
         operators_prompt = self.load_operators()
 
-        # Fill system prompt
-        system_prompt = system_prompt.replace("{operators}", operators_prompt)
+        # Fill system prompt, only if any part has changed
+        return self._assemble(
+            self._key("debugger_system_prompt"),
+            (system_prompt, operators_prompt),
+            lambda: system_prompt.render(operators=operators_prompt),
+        )
 
-        # Get and return system prompt
-        return system_prompt
-    
 
     def load_debugger_prompt(self, query: str, failed_plan: WayangPlan, wayang_errors: str, val_errors: List) -> str:
         """
@@ -78,7 +243,7 @@ class PromptLoader:
         """
 
         # Get prompt template
-        prompt_template = self._read_file(self.prompt_folder, "debugger_prompts/prompt.txt")
+        prompt_template = self._read_template(self.prompt_folder, "debugger_prompts/prompt.txt")
 
         # Convert to correct JSON from WayangPlan model
         if hasattr(failed_plan, "model_dump"):
@@ -96,14 +261,14 @@ class PromptLoader:
         val_errors = "\n".join([f"- {str(e)}" for e in val_errors])
 
         # Fill template
-        prompt_template = prompt_template.replace("{query}", query)
-        prompt_template = prompt_template.replace("{failed_plan}", failed_plan)
-        prompt_template = prompt_template.replace("{wayang_error}", wayang_errors)
-        prompt_template = prompt_template.replace("{val_error}", val_errors)
-
-        return prompt_template
-    
-    
+        return prompt_template.render(
+            query=query,
+            failed_plan=failed_plan,
+            wayang_error=wayang_errors,
+            val_error=val_errors,
+        )
+
+
     def load_debugger_answer(self, wayang_plan: WayangPlan) -> str:
         """
         Load and prepare Debugger Agents answer. It is for it to keep track of its own answers when debugging in multiple iterations
@@ -117,52 +282,63 @@ class PromptLoader:
         """
 
         # Load answer template
-        answer_prompt = self._read_file(self.prompt_folder, "debugger_prompts/answer.txt")
+        answer_prompt = self._read_template(self.prompt_folder, "debugger_prompts/answer.txt")
 
         # Load debuggers fixed plan and thoughts
         fixed_plan = json.dumps([op.model_dump() for op in wayang_plan.operations], indent=2, ensure_ascii=False)
         thoughts = wayang_plan.thoughts
-        
+
         # Fill template
-        answer_prompt = answer_prompt.replace("{fixed_plan}", fixed_plan)
-        answer_prompt = answer_prompt.replace("{thoughts}", thoughts)
+        return answer_prompt.render(fixed_plan=fixed_plan, thoughts=thoughts)
+
 
-        # Return prompt
-        return answer_prompt
-    
 
-    
-    def load_data_prompt(self) -> str:
+    def load_data_prompt(self, query: str | None = None) -> str:
         """
         Loads data prompt with schemas in it
 
+        Args:
+            query (str | None): If given with schema pruning enabled, only the top-k schemas for the query are included
+
         Returns:
             (str): Data prompt
-        
+
         """
 
         # Load data prompt template
-        data_prompt = self._read_file(self.prompt_folder, "data.txt")
+        data_prompt = self._read_template(self.prompt_folder, "data.txt")
+
+        # Only the most relevant schemas in compact JSON
+        if query and self.schema_top_k:
+            schemas = self.load_schema_retriever().select(query, self.schema_top_k)
+
+            return data_prompt.render(
+                jdbc_tables="\n\n".join(schemas["tables"]),
+                text_files="\n\n".join(schemas["text_files"]),
+            )
 
         # Load schemas
         schemas = self._load_schemas()
 
-        # Format to string for prompt
-        tables_str = "\n\n".join(schemas.get("tables", []))
-        textfiles_str = "\n\n".join(schemas.get("text_files", []))
+        def build():
+            # Format to string for prompt
+            tables_str = "\n\n".join(schemas.get("tables", []))
+            textfiles_str = "\n\n".join(schemas.get("text_files", []))
 
-        # Add schemas to prompt template
-        data_prompt = data_prompt.replace("{jdbc_tables}", tables_str)
-        data_prompt = data_prompt.replace("{text_files}", textfiles_str)
+            # Add schemas to prompt template
+            return data_prompt.render(jdbc_tables=tables_str, text_files=textfiles_str)
 
         # Return prompt
-        return data_prompt
-    
-    
-    def load_few_shot_prompt(self) -> str:
+        return self._assemble(self._key("data_prompt"), (data_prompt, schemas), build)
+
+
+    def load_few_shot_prompt(self, query: str | None = None) -> str:
         """
         Load few shot prompt template
 
+        Args:
+            query (str | None): If given with few-shot selection enabled, only the most similar examples within the token budget are included
+
         Returns:
             (str): Few shot prompt template
 
@@ -173,22 +349,25 @@ class PromptLoader:
         # Check if folder exists
         if not os.path.exists(few_shot_folder):
             raise FileNotFoundError(f"Schema folder does not exists at {few_shot_folder}")
-        
+
         # Load few shot examples
         few_shot_examples = self._read_txt_files(few_shot_folder)
 
         # Load few shot prompt
-        few_shot_prompt = self._read_file(self.prompt_folder, "few_shot.txt")
+        few_shot_prompt = self._read_template(self.prompt_folder, "few_shot.txt")
+
+        # Only the most similar examples
+        if query and self.few_shot_top_k:
+            examples = self.load_few_shot_index().select(query, self.few_shot_top_k, self.few_shot_token_budget)
+            return few_shot_prompt.render(examples="\n\n".join(examples))
 
-        # Convert examples to list
-        few_shot_str = "\n\n".join(few_shot_examples)
-    
         # Add examples to prompt template
-        few_shot_prompt = few_shot_prompt.replace("{examples}", few_shot_str)
+        return self._assemble(
+            self._key("few_shot_prompt"),
+            (few_shot_prompt, few_shot_examples),
+            lambda: few_shot_prompt.render(examples="\n\n".join(few_shot_examples)),
+        )
 
-        # Return prompt
-        return few_shot_prompt
-    
 
     def load_operators(self) -> str:
         """
@@ -202,7 +381,7 @@ class PromptLoader:
         # Return operators prompt template
         return self._read_file(self.prompt_folder, "operators.txt")
 
-    
+
     def _load_schemas(self) -> Dict:
         """
         Helper function to load data schemas
@@ -220,39 +399,65 @@ class PromptLoader:
         # Check if folder exists
         if not os.path.exists(schema_folder):
             raise FileNotFoundError(f"Schema folder does not exists at {schema_folder}")
-        
+
         # Create table and textfile schemas
         table_folder = os.path.join(schema_folder, "tables")
         textfile_folder = os.path.join(schema_folder, "text_files")
-        
-        # List to store json schemas
-        table_schemas = self._read_json_files(table_folder)
-        textfile_schemas = self._read_json_files(textfile_folder)
 
-        # To store json
-        tables = []
-        textfiles = []
+        # Schemas formatted for the prompt, cached until a schema file changes
+        tables = self._read_json_files(table_folder)
+        textfiles = self._read_json_files(textfile_folder)
 
-        # Format tables
-        for schema in table_schemas:
-            formatted = json.dumps(schema, indent=3, ensure_ascii=False)
-            tables.append(formatted)
+        # Return schemas
+        return self._assemble(self._key("schemas"), (tables, textfiles), lambda: {"tables": tables, "text_files": textfiles})
+
+
+    def load_few_shot_index(self) -> FewShotIndex:
+        """
+        Load the few-shot index. It is built once and rebuilt only if an example file is added or changed
+
+        Returns:
+            (FewShotIndex): Index over all few-shot examples
+
+        """
+
+        examples = self._read_txt_files(os.path.join(self.data_folder, "few_shot_examples"))
+
+        return self._assemble(self._key("few_shot_index"), (examples,), lambda: FewShotIndex(examples))
+
+
+    def warm_up(self) -> None:
+        """
+        Builds the cached system prompts and the enabled indexes up front, so no request pays for it
+
+        """
+
+        self.load_builder_system_prompt()
+        self.load_debugger_system_prompt()
+
+        if self.schema_top_k:
+            self.load_schema_retriever()
+        if self.few_shot_top_k:
+            self.load_few_shot_index()
+
+
+    def load_schema_retriever(self) -> SchemaRetriever:
+        """
+        Load the schema retriever. It is indexed once and rebuilt only if a schema file changes
+
+        Returns:
+            (SchemaRetriever): Retriever over all table and text file schemas
+
+        """
+
+        # Create schema folder paths
+        schema_folder = os.path.join(self.data_folder, "schemas")
+        tables = self._read_folder(os.path.join(schema_folder, "tables"), ".json", _read_json)
+        textfiles = self._read_folder(os.path.join(schema_folder, "text_files"), ".json", _read_json)
+
+        return self._assemble(self._key("schema_retriever"), (tables, textfiles), lambda: SchemaRetriever(tables, textfiles))
 
-        # Format textfiles
-        for schema in textfile_schemas:
-            formatted = json.dumps(schema, indent=3, ensure_ascii=False)
-            textfiles.append(formatted)
 
-        # Return schemas
-        schemas = {
-            "tables": tables,
-            "text_files": textfiles
-        
-        }
-        
-        return schemas
-    
-    
     def _read_txt_files(self, folder: str | Path) -> List:
         """
         Helper function to take a folder and read all textfiles
@@ -265,25 +470,13 @@ class PromptLoader:
 
         """
 
-        # List to store json
-        output = []
+        return self._read_folder(folder, ".txt", _read_text)
+
 
-        # Go over each .txt file
-        for root, _, files in os.walk(folder):
-            for file in files:
-                # IF json file
-                if file.endswith(".txt"):
-                    # Read file and append to schemas
-                    f = self._read_file(root, file)
-                    output.append(f)
-
-        return output
-    
-     
     def _read_json_files(self, folder: str | Path) -> List:
         """
-        Helper function that take and folder and returns all json in folder and lower level folders
-        
+        Helper function that take and folder and returns all json in folder and lower level folders, formatted for prompts
+
         Args:
             folder (str | Path): Path of folder
 
@@ -292,21 +485,9 @@ class PromptLoader:
 
         """
 
-        # List to store json
-        output = []
-
-        # Go over each json file
-        for root, _, files in os.walk(folder):
-            for file in files:
-                # IF json file
-                if file.endswith(".json"):
-                    # Read file and append to schemas
-                    json_data = self._read_file(root, file)
-                    output.append(json.loads(json_data))
+        return self._read_folder(folder, ".json", _read_schema)
 
-        return output
 
-    
     def _read_file(self, folder: str | Path, file: str) -> str:
         """
         Helper function to open prompt template files
@@ -319,19 +500,172 @@ class PromptLoader:
             (str): The file
 
         """
-        # Convert to path if str
-        if isinstance(folder, str):
-            folder = Path(folder)
 
-        # Build file path
-        file_path = folder / file
+        return self._cached_file(Path(folder) / file, _read_text)
+
+
+    def _read_template(self, folder: str | Path, file: str) -> PromptTemplate:
+        """
+        Helper function to open and compile prompt template files
+
+        Args:
+            folder (str | Path): Path to folder
+            file (str): Name of prompt file including extension (.txt)
+
+        Returns:
+            (PromptTemplate): The compiled template
+
+        """
+
+        return self._cached_file(Path(folder) / file, PromptTemplate)
+
+
+    def _cached_file(self, file_path: Path, parse: Callable):
+        """
+        Helper function to read and parse a file once. The file is read again if its mtime changes
+
+        Args:
+            file_path (Path): Path of file
+            parse (Callable): Function that parses the file content
+
+        Returns:
+            The parsed file
+
+        """
+
+        key = ("file", str(file_path), parse)
+
+        # Skip the stat call if checked recently
+        entry = _cache.get(key)
+        if entry and time.monotonic() - entry.checked_at < self.reload_interval:
+            return entry.value
 
         # Open file if exists
         if not file_path.exists():
             raise FileNotFoundError(f"Couldn't find file {file_path}")
-        else:
-            with open(file_path, "r", encoding="utf-8") as f:
-                return f.read()
 
-        
+        stat = os.stat(file_path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        # Unchanged on disk
+        if entry and entry.version == version:
+            entry.checked_at = time.monotonic()
+            return entry.value
+
+        with open(file_path, "r", encoding="utf-8") as f:
+            value = parse(f.read())
+
+        with _cache_lock:
+            _cache[key] = _CacheEntry(version, value)
+
+        return value
+
+
+    def _read_folder(self, folder: str | Path, extension: str, parse: Callable) -> List:
+        """
+        Helper function to read and parse all files with an extension in a folder and lower level folders.
+        The list is rebuilt only if a file is added, removed or changed
+
+        Args:
+            folder (str | Path): Path of folder
+            extension (str): File extension to read, e.g. .txt
+            parse (Callable): Function that parses each file content
+
+        Returns:
+            (List): Parsed content of all found files
+
+        """
+
+        key = ("folder", str(folder), extension, parse)
+
+        # Skip the folder walk if checked recently
+        entry = _cache.get(key)
+        if entry and time.monotonic() - entry.checked_at < self.reload_interval:
+            return entry.value
+
+        # Find files with their mtimes and sizes
+        paths = []
+        for root, _, files in os.walk(folder):
+            for file in files:
+                if file.endswith(extension):
+                    path = Path(root) / file
+                    stat = os.stat(path)
+                    paths.append((path, stat.st_mtime_ns, stat.st_size))
+        version = tuple(paths)
+
+        # Unchanged on disk
+        if entry and entry.version == version:
+            entry.checked_at = time.monotonic()
+            return entry.value
+
+        value = [self._cached_file(path, parse) for path, _, _ in paths]
+
+        with _cache_lock:
+            _cache[key] = _CacheEntry(version, value)
+
+        return value
+
+
+    def _assemble(self, name: str, parts: tuple, build: Callable):
+        """
+        Helper function to memoize a prompt built from cached parts.
+        Parts are cached objects, so the prompt is only rebuilt if one of them is a new object
+
+        Args:
+            name (str): Name of the assembled prompt
+            parts (tuple): The cached parts the prompt is built from
+            build (Callable): Function that builds the prompt
+
+        Returns:
+            The assembled prompt
+
+        """
+
+        entry = _assembled.get(name)
+
+        # Unchanged parts
+        if entry and len(entry.version) == len(parts) and all(a is b for a, b in zip(entry.version, parts)):
+            entry.checked_at = time.monotonic()
+            return entry.value
+
+        value = build()
+
+        with _cache_lock:
+            _assembled[name] = _CacheEntry(parts, value)
+
+        return value
+
+
+    def _key(self, name: str) -> str:
+        """
+        Helper function to make the cache key of an assembled prompt, unique per prompt and data folder
+
+        Args:
+            name (str): Name of the assembled prompt
+
+        Returns:
+            (str): Cache key
+
+        """
+
+        return f"{name}:{self.prompt_folder}:{self.data_folder}"
+
+
+    def _recent(self, name: str):
+        """
+        Helper function to get an assembled prompt if its parts were checked within the reload interval
+
+        Args:
+            name (str): Name of the assembled prompt
+
+        Returns:
+            The assembled prompt or None
+
+        """
+
+        entry = _assembled.get(name)
+
+        if entry and time.monotonic() - entry.checked_at < self.reload_interval:
+            return entry.value
 
+        return None
@@ -0,0 +1,241 @@
+from collections import Counter
+from typing import Dict, List, Tuple
+import json
+import math
+import re
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Splits text into lowercase word tokens. Snake case and camel case names are also split into their parts
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        List[str]: Tokens
+
+    """
+
+    tokens = []
+
+    for word in re.findall(r"[A-Za-z0-9_]+", text):
+        lower = word.lower()
+        tokens.append(lower)
+
+        # Add parts of names like person_id or createdAt
+        parts = [p.lower() for p in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", word)]
+        if len(parts) > 1:
+            tokens.extend(parts)
+
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 index over a fixed set of documents.
+    Built once, then each search is a lookup in the inverted index for the query terms only
+
+    """
+
+    def __init__(self, documents: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+
+        # Term frequencies and lengths per document
+        doc_terms = [Counter(tokenize(doc)) for doc in documents]
+        self.doc_lengths = [sum(terms.values()) for terms in doc_terms]
+        self.avg_length = sum(self.doc_lengths) / self.size if self.size else 0.0
+
+        # Inverted index from term to (document, frequency)
+        self.postings: Dict[str, List[Tuple[int, int]]] = {}
+        for i, terms in enumerate(doc_terms):
+            for term, freq in terms.items():
+                self.postings.setdefault(term, []).append((i, freq))
+
+        # Inverse document frequency per term
+        self.idf = {
+            term: math.log(1 + (self.size - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """
+        Find the k best matching documents
+
+        Args:
+            query (str): Query text
+            k (int): Number of documents to return
+
+        Returns:
+            List[Tuple[int, float]]: Document index and score, best first. Only documents matching a query term
+
+        """
+
+        scores: Dict[int, float] = {}
+
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+
+            for i, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[i] / self.avg_length)
+                scores[i] = scores.get(i, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+
+        # Best first, ties in document order
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+        return ranked[:k]
+
+
+class SchemaRetriever:
+    """
+    Selects the data schemas most relevant to a query, so only those are put in the Builder's prompt.
+    Schemas are indexed on table and file names, column names, descriptions and example values
+
+    """
+
+    def __init__(self, tables: List[Dict], text_files: List[Dict]):
+        # Keep kind of each schema to place it in the right prompt section
+        self.schemas = [("tables", schema) for schema in tables] + [("text_files", schema) for schema in text_files]
+        self.index = BM25Index([self._document(schema) for _, schema in self.schemas])
+
+    def select(self, query: str, k: int) -> Dict[str, List[str]]:
+        """
+        Select the top-k schemas for a query, formatted as compact JSON
+
+        Args:
+            query (str): Natural language query
+            k (int): Maximum number of schemas
+
+        Returns:
+            Dict[str, List[str]]: Compact JSON schemas for "tables" and "text_files"
+
+        """
+
+        selected = {"tables": [], "text_files": []}
+
+        # Best matches, or the first schemas if no schema matches the query at all
+        matches = [i for i, _ in self.index.search(query, k)] or list(range(min(k, len(self.schemas))))
+
+        # Keep schema order stable so prompts for similar queries share a prefix
+        for i in sorted(matches):
+            kind, schema = self.schemas[i]
+            selected[kind].append(json.dumps(schema, separators=(",", ":"), ensure_ascii=False))
+
+        return selected
+
+    def _document(self, schema: Dict) -> str:
+        """
+        Helper function to turn a schema into searchable text. Names are repeated to weigh them over examples
+
+        Args:
+            schema (Dict): A table or text file schema
+
+        Returns:
+            str: Text to index
+
+        """
+
+        parts = []
+
+        for name, info in schema.items():
+            parts += [name, name]
+
+            if not isinstance(info, dict):
+                continue
+
+            for key in ["table_description", "file_description"]:
+                if info.get(key):
+                    parts.append(str(info[key]))
+
+            for column, column_info in info.get("columns", {}).items():
+                parts += [column, column]
+                if isinstance(column_info, dict):
+                    parts += [str(e) for e in column_info.get("examples", []) if e is not None]
+
+            parts += [str(line) for line in info.get("examples_lines_from_file", [])]
+
+        return " ".join(parts)
+
+
+class FewShotIndex:
+    """
+    Index over few-shot examples, searched on each example's user query.
+    Selects the most similar examples for a query within a token budget, so the example library can grow freely
+
+    """
+
+    QUERY_SECTION = re.compile(r"\*\*\s*User query:\s*\*\*(.*?)\*\*\s*Wayang Plan:\s*\*\*", re.DOTALL | re.IGNORECASE)
+
+    def __init__(self, examples: List[str]):
+        self.examples = examples
+        self.tokens = [self.estimate_tokens(example) for example in examples]
+        self.index = BM25Index([self._user_query(example) for example in examples])
+
+    def select(self, query: str, k: int, token_budget: int) -> List[str]:
+        """
+        Select up to k examples most similar to the query without exceeding the token budget
+
+        Args:
+            query (str): Natural language query
+            k (int): Maximum number of examples
+            token_budget (int): Maximum estimated tokens for all selected examples
+
+        Returns:
+            List[str]: Selected examples in library order
+
+        """
+
+        selected = []
+        used = 0
+
+        # Take best matches while they fit in the budget
+        for i, _ in self.index.search(query, len(self.examples)):
+            if len(selected) >= k:
+                break
+            if used + self.tokens[i] > token_budget:
+                continue
+            selected.append(i)
+            used += self.tokens[i]
+
+        # Always give at least the smallest example to show the plan format
+        if not selected and self.examples:
+            smallest = min(range(len(self.examples)), key=lambda i: self.tokens[i])
+            if self.tokens[smallest] <= token_budget:
+                selected.append(smallest)
+
+        # Keep library order so prompts for similar queries share a prefix
+        return [self.examples[i] for i in sorted(selected)]
+
+    def estimate_tokens(self, text: str) -> int:
+        """
+        Estimates the number of tokens in a text, around four characters per token
+
+        Args:
+            text (str): Text to estimate
+
+        Returns:
+            int: Estimated tokens
+
+        """
+
+        return len(text) // 4 + 1
+
+    def _user_query(self, example: str) -> str:
+        """
+        Helper function to get the user query section of an example
+
+        Args:
+            example (str): Few-shot example
+
+        Returns:
+            str: The user query, or the whole example if it has no user query section
+
+        """
+
+        match = self.QUERY_SECTION.search(example)
+
+        return match.group(1).strip() if match else example
@@ -0,0 +1,80 @@
+from typing import Any, Dict
+import threading
+
+
+def usage_summary(response: Any) -> Dict:
+    """
+    Summarizes token usage of a response, including how much of the input was served from the provider's prompt cache
+
+    Args:
+        response (Any): Response from the OpenAI Responses API
+
+    Returns:
+        Dict: Model, input, cached and output tokens and the cache hit rate
+
+    """
+
+    usage = getattr(response, "usage", None)
+    details = getattr(usage, "input_tokens_details", None)
+
+    input_tokens = getattr(usage, "input_tokens", 0) or 0
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+
+    return {
+        "model": str(getattr(response, "model", None)),
+        "input_tokens": input_tokens,
+        "cached_tokens": cached_tokens,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_hit_rate": cached_tokens / input_tokens if input_tokens else 0.0,
+    }
+
+
+class UsageTracker:
+    """
+    Aggregates token usage and prompt cache hits per agent and model since startup
+
+    """
+
+    def __init__(self):
+        self.totals: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+
+    def record(self, agent: str, response: Any) -> Dict:
+        """
+        Record usage of a single agent call
+
+        Args:
+            agent (str): Name of the agent, e.g. "builder" or "debugger"
+            response (Any): Response from the OpenAI Responses API
+
+        Returns:
+            Dict: Usage summary of the call
+
+        """
+
+        summary = usage_summary(response)
+        key = f"{agent}:{summary['model']}"
+
+        with self.lock:
+            total = self.totals.setdefault(key, {"calls": 0, "input_tokens": 0, "cached_tokens": 0, "output_tokens": 0})
+            total["calls"] += 1
+            total["input_tokens"] += summary["input_tokens"]
+            total["cached_tokens"] += summary["cached_tokens"]
+            total["output_tokens"] += summary["output_tokens"]
+
+        return summary
+
+    def stats(self) -> Dict:
+        """
+        Get usage totals
+
+        Returns:
+            Dict: Totals and cache hit rate per agent and model
+
+        """
+
+        with self.lock:
+            return {
+                key: {**total, "cache_hit_rate": total["cached_tokens"] / total["input_tokens"] if total["input_tokens"] else 0.0}
+                for key, total in self.totals.items()
+            }
@@ -0,0 +1,324 @@
+from ai_wayang_single.config.settings import JOB_CONFIG
+from ai_wayang_single.server.pipeline import QueryPipeline
+from ai_wayang_single.server.session import Session, SessionRegistry
+from ai_wayang_single.utils.spooled_output import SpooledOutput
+from collections import OrderedDict, deque
+from typing import Dict
+import asyncio
+import time
+import uuid
+
+
+class Job:
+    """
+    A query submitted to run in the background
+
+    """
+
+    def __init__(self, session_id: str, query: str, model: str | None = None, reasoning: str | None = None):
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.query = query
+        self.model = model
+        self.reasoning = reasoning
+        self.status = "queued" # "queued", "running", "done" or "failed"
+        self.session = None # Session running the job
+        self.version = None
+        self.stages = {}
+        self.result = None
+        self.output = None # Full output for paging
+        self.output_files = []
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self, session: Session) -> None:
+        """
+        Marks the job as running in a session
+
+        Args:
+            session (Session): The session running the job
+
+        """
+
+        self.status = "running"
+        self.session = session
+        self.started_at = time.time()
+
+    def finish(self, result: str) -> None:
+        """
+        Stores the result and a snapshot of the session's progress, so the session can run the next query
+
+        Args:
+            result (str): Output or error message from the pipeline
+
+        """
+
+        session = self.session
+        self.status = "done" if session and session.phase == "done" else "failed"
+        self.version = session.version if session else None
+        self.stages = session.stage_times() if session else {}
+        self.result = result
+        self.output = session.result if session and isinstance(session.result, SpooledOutput) else None
+        self.output_files = session.output_files if session else []
+        self.session = None
+        self.finished_at = time.time()
+
+    def is_finished(self) -> bool:
+        return self.finished_at is not None
+
+    def status_info(self) -> Dict:
+        """
+        Get progress of the job
+
+        Returns:
+            Dict: Status, current phase, plan version and seconds per stage
+
+        """
+
+        session = self.session
+
+        # Live progress while running, snapshot when finished
+        if session is not None:
+            phase, version, stages = session.phase, session.version, session.stage_times()
+        else:
+            phase, version, stages = self.status, self.version, self.stages
+
+        end = self.finished_at or time.time()
+
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "phase": phase,
+            "version": version,
+            "stages": {stage: round(seconds, 3) for stage, seconds in stages.items()},
+            "queued_seconds": round((self.started_at or end) - self.created_at, 3),
+            "elapsed_seconds": round(end - self.created_at, 3),
+        }
+
+
+class JobStore:
+    """
+    Bounded store of jobs. Finished jobs are evicted after a TTL, and the oldest finished jobs first when full
+
+    """
+
+    def __init__(self, ttl: float | None = None, max_jobs: int | None = None):
+        self.ttl = ttl or JOB_CONFIG.get("ttl_seconds")
+        self.max_jobs = max_jobs or JOB_CONFIG.get("max_jobs")
+        self.jobs = OrderedDict() # Ordered by submission
+
+    def add(self, job: Job) -> None:
+        """
+        Add a job, making room first if needed
+
+        Args:
+            job (Job): The new job
+
+        """
+
+        self.evict()
+        self.jobs[job.job_id] = job
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        Get a job by id
+
+        Args:
+            job_id (str): The job id
+
+        Returns:
+            Job | None: The job or None if unknown or evicted
+
+        """
+
+        self.evict()
+
+        return self.jobs.get(job_id)
+
+    def evict(self) -> int:
+        """
+        Evicts expired finished jobs, and the oldest finished jobs if the store is full. Queued and running jobs are kept
+
+        Returns:
+            int: Number of evicted jobs
+
+        """
+
+        now = time.time()
+        evicted = 0
+
+        for job_id, job in list(self.jobs.items()):
+            expired = job.is_finished() and now - job.finished_at > self.ttl
+            full = len(self.jobs) >= self.max_jobs
+
+            if job.is_finished() and (expired or full):
+                del self.jobs[job_id]
+                evicted += 1
+
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self.jobs)
+
+
+class JobRunner:
+    """
+    Runs submitted queries on a pool of background workers, so MCP calls return right away.
+    Jobs run in the session of the client that submitted them, one at a time per session.
+    Each session has its own queue and workers take turns between sessions, so one client can't hold up the others
+
+    """
+
+    def __init__(
+        self,
+        pipeline: QueryPipeline,
+        sessions: SessionRegistry,
+        workers: int | None = None,
+        store: JobStore | None = None,
+        slots: asyncio.Semaphore | None = None,
+        max_jobs_per_session: int | None = None,
+    ):
+        self.pipeline = pipeline
+        self.sessions = sessions
+        self.workers = workers or JOB_CONFIG.get("workers")
+        self.store = store or JobStore()
+        self.slots = slots or asyncio.Semaphore(self.workers) # Shared cap with queries run directly
+        self.max_jobs_per_session = max_jobs_per_session or JOB_CONFIG.get("max_jobs_per_session")
+        self.queue = asyncio.Queue() # Sessions with a job to run, each at most once
+        self.pending = {} # Queued jobs per session, the entry stays while a job of the session runs
+        self.unfinished = {} # Queued and running jobs per session
+        self.tasks = []
+
+    def submit(self, session_id: str, query: str, model: str | None = None, reasoning: str | None = None) -> Job:
+        """
+        Queue a query to run in the background
+
+        Args:
+            session_id (str): Id of the submitting client
+            query (str): Description of the plan in natural language
+            model (str | None): GPT-model to use for the agents
+            reasoning (str | None): Reasoning effort to use for the agents
+
+        Returns:
+            Job: The queued job
+
+        Raises:
+            ValueError: If the client already has the maximum number of unfinished jobs
+
+        """
+
+        if self.unfinished.get(session_id, 0) >= self.max_jobs_per_session:
+            raise ValueError(f"Too many unfinished jobs, wait for one of the {self.max_jobs_per_session} jobs to finish")
+
+        # Start workers once the event loop runs
+        self._start_workers()
+
+        job = Job(session_id, query, model, reasoning)
+        self.store.add(job)
+        self.unfinished[session_id] = self.unfinished.get(session_id, 0) + 1
+
+        # Queue the session unless it is already queued or running
+        if session_id not in self.pending:
+            self.pending[session_id] = deque()
+            self.queue.put_nowait(session_id)
+        self.pending[session_id].append(job)
+
+        return job
+
+    def get(self, job_id: str, session_id: str) -> Job | None:
+        """
+        Get a job submitted by a client
+
+        Args:
+            job_id (str): The job id
+            session_id (str): Id of the calling client
+
+        Returns:
+            Job | None: The job, or None if unknown or submitted by another client
+
+        """
+
+        job = self.store.get(job_id)
+
+        if job is None or job.session_id != session_id:
+            return None
+
+        return job
+
+    async def close(self) -> None:
+        """
+        Stops the workers
+
+        """
+
+        for task in self.tasks:
+            task.cancel()
+
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def _start_workers(self) -> None:
+        """
+        Helper function to start the worker tasks if not running
+
+        """
+
+        if self.tasks:
+            return
+
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def _worker(self) -> None:
+        """
+        Helper function that runs queued jobs until cancelled
+
+        """
+
+        while True:
+            session_id = await self.queue.get()
+
+            try:
+                await self._run(self.pending[session_id].popleft())
+
+            finally:
+                # Back of the queue if the session has more jobs, so other sessions get their turn
+                if self.pending[session_id]:
+                    self.queue.put_nowait(session_id)
+                else:
+                    del self.pending[session_id]
+                self.queue.task_done()
+
+    async def _run(self, job: Job) -> None:
+        """
+        Helper function to run a job in its session. The session keeps the result of its last query_wayang
+
+        Args:
+            job (Job): The job to run
+
+        """
+
+        try:
+            session = self.sessions.get(job.session_id)
+
+            async with session.lock, self.slots:
+                last_result, last_files = session.result, session.output_files
+                job.start(session)
+
+                try:
+                    result = await self.pipeline.run(session, job.query, job.model, job.reasoning, run_id=f"job_{job.job_id[:12]}")
+                except Exception as e:
+                    print(f"[ERROR] Job {job.job_id} failed: {e}")
+                    result = f"An error occured, explain for the user: {e}"
+
+                job.finish(result)
+                session.result, session.output_files = last_result, last_files
+
+        except Exception as e:
+            print(f"[ERROR] Job {job.job_id} failed: {e}")
+            job.finish(f"An error occured, explain for the user: {e}")
+
+        finally:
+            self.unfinished[job.session_id] -= 1
+            if not self.unfinished[job.session_id]:
+                del self.unfinished[job.session_id]
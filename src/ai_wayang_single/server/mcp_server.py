@@ -1,15 +1,31 @@
 # Import libraries
-from mcp.server.fastmcp import FastMCP
-from ai_wayang_single.config.settings import MCP_CONFIG, INPUT_CONFIG, OUTPUT_CONFIG, DEBUGGER_MODEL_CONFIG
+from mcp.server.fastmcp import FastMCP, Context
+from openai import AsyncOpenAI
+from ai_wayang_single.config.settings import MCP_CONFIG, INPUT_CONFIG, OUTPUT_CONFIG, CACHE_CONFIG, SEMANTIC_CACHE_CONFIG, SPECULATIVE_CONFIG, RESULT_CONFIG, UDF_CONFIG
 from ai_wayang_single.llm.agent_builder import Builder
 from ai_wayang_single.llm.agent_debugger import Debugger
+from ai_wayang_single.llm.prompt_loader import PromptLoader
+from ai_wayang_single.server.jobs import JobRunner
+from ai_wayang_single.server.pipeline import QueryPipeline
+from ai_wayang_single.server.session import Session, SessionRegistry
+from ai_wayang_single.server.speculative import SpeculativeBuilder
 from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_optimizer import PlanOptimizer
 from ai_wayang_single.wayang.plan_validator import PlanValidator
+from ai_wayang_single.wayang.udf_compiler import UdfCompiler
 from ai_wayang_single.wayang.wayang_executor import WayangExecutor
-from ai_wayang_single.utils.logger import Logger
+from ai_wayang_single.utils.metrics import count_tool_calls
+from ai_wayang_single.utils.output_reader import OutputFileReader, OutputReaderCache
+from ai_wayang_single.utils.output_retention import OutputRetention
+from ai_wayang_single.utils.plan_cache import PlanCache
 from ai_wayang_single.utils.schema_loader import SchemaLoader
-from datetime import datetime
+from ai_wayang_single.utils.semantic_cache import SemanticPlanIndex
+from ai_wayang_single.utils.spooled_output import SpooledOutput
+import asyncio
+import json
 import os
+import uuid
+import weakref
 
 # Initialize MCP-server
 mcp = FastMCP(name="AI-Wayang-Simple", 
@@ -21,18 +37,115 @@ config = {
     "output_config": OUTPUT_CONFIG
 }
 
-# Initialize agents and objects
-builder_agent = Builder() # Initialize builder agent
-debugger_agent = Debugger() # Initialize debugger agent
+# Data folder with schemas and cache
+data_folder = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "data"))
+
+# Plan cache if enabled
+plan_cache = None
+if CACHE_CONFIG.get("use_plan_cache") == "True":
+    plan_cache = PlanCache(
+        cache_path=CACHE_CONFIG.get("cache_path") or os.path.join(data_folder, "cache", "plan_cache.db"),
+        schema_folder=os.path.join(data_folder, "schemas"),
+    )
+
+# Semantic index of successful plans if enabled, warmed up from the plan cache
+semantic_index = None
+if SEMANTIC_CACHE_CONFIG.get("use_semantic_cache") == "True":
+    semantic_index = SemanticPlanIndex()
+    if plan_cache:
+        semantic_index.add_many(plan_cache.items())
+
+# Shared, stateless objects used by all sessions
+llm_client = AsyncOpenAI() # One connection pool for all agents
+PromptLoader().warm_up() # Warm up the process-wide prompt cache and indexes
 plan_mapper = PlanMapper(config=config) # Initialize mapper
-plan_validator = PlanValidator() # Initialize validator
+# Local UDF compile check if enabled and a Scala compiler is installed
+udf_compiler = None
+if UDF_CONFIG.get("use_udf_check") == "True":
+    udf_compiler = UdfCompiler()
+    if not udf_compiler.available():
+        print(f"[INFO] Scala compiler {UDF_CONFIG.get('compiler')} not found, UDFs are not compiled before execution")
+        udf_compiler = None
+
+plan_validator = PlanValidator(udf_compiler) # Initialize validator
 wayang_executor = WayangExecutor() # Wayang executor
 
-# To store the last sessions output
-last_session_result = "Nothing to output"
+# Concurrent plan generation with several variants if enabled
+speculative = None
+if SPECULATIVE_CONFIG.get("use_speculative") == "True":
+    speculative = SpeculativeBuilder(plan_mapper, plan_validator)
+
+# Cleanup of old output files if enabled
+output_retention = OutputRetention()
+if not output_retention.enabled():
+    output_retention = None
+
+# Rewrites of validated plans, using the column types of the table schemas
+plan_optimizer = PlanOptimizer(schema_folder=os.path.join(data_folder, "schemas"))
+
+pipeline = QueryPipeline(plan_mapper, plan_validator, wayang_executor, plan_cache, semantic_index, speculative, output_retention, plan_optimizer=plan_optimizer) # Query pipeline
+
+
+def _new_session(session_id: str) -> Session:
+    """
+    Creates a new session with its own agents
+
+    Args:
+        session_id (str): Id of the MCP client or session
+
+    Returns:
+        Session: New session
+
+    """
+
+    builder = Builder(client=llm_client)
+    debugger = Debugger(client=llm_client)
+
+    return Session(session_id, builder, debugger)
+
+
+# Random ids of MCP sessions. Not id(), it is reused once a session is garbage collected
+_mcp_session_ids = weakref.WeakKeyDictionary()
+
+
+def _session_id(ctx: Context) -> str:
+    """
+    Get an id for the calling client. Uses the client id if given, else a random id given to the MCP session on first use
+
+    Args:
+        ctx (Context): MCP request context
+
+    Returns:
+        str: Session id
+
+    """
+
+    if ctx.client_id:
+        return ctx.client_id
+
+    session_id = _mcp_session_ids.get(ctx.session)
+    if session_id is None:
+        session_id = f"session-{uuid.uuid4().hex}"
+        _mcp_session_ids[ctx.session] = session_id
+
+    return session_id
+
+
+# Sessions per MCP client
+sessions = SessionRegistry(_new_session)
+
+# Caps the number of query_wayang pipelines in flight at the same time
+query_slots = asyncio.Semaphore(MCP_CONFIG.get("max_concurrent_queries"))
+
+# Background jobs, sharing the cap with query_wayang
+jobs = JobRunner(pipeline, sessions, slots=query_slots)
+
+# Memory-mapped readers for output files
+output_readers = OutputReaderCache()
 
 @mcp.tool()
-def query_wayang(describe_wayang_plan: str, model: str | None = None, reasoning: str | None = None) -> str:
+@count_tool_calls
+async def query_wayang(describe_wayang_plan: str, ctx: Context, model: str | None = None, reasoning: str | None = None) -> str:
     """
     Generates and execute a Wayang plan based on given query in national language.
     The query provided must be in Englis
@@ -46,191 +159,93 @@ def query_wayang(describe_wayang_plan: str, model: str | None = None, reasoning:
     
     Notes:
     - This tool builds and execute a query based on a description 
-    - Runetime is typically a few minutes
+    - Runetime is typically a few minutes, use submit_wayang_query to not wait for it
     - Be as detailed in the description as possible
     """
 
-    # Declaring variable as global
-    global last_session_result
+    # Get the callers own session
+    session = sessions.get(_session_id(ctx))
 
-    # Sets parametre (mainly for evaluation)
-    builder_agent.set_model_and_reasoning(model, reasoning)
-    debugger_agent.set_model_and_reasoning(model, reasoning)
+    # Queries within a session run one at a time, sessions run in parallel up to the cap
+    async with session.lock, query_slots:
+        return await pipeline.run(session, describe_wayang_plan, model, reasoning)
 
-    try:
-        # Set up logger 
-        logger = Logger()
-        logger.add_message("User query: Plan description from client LLM", describe_wayang_plan)
-        
-        # Initialize variables
-        status_code = None # Status code from validator or Wayang server
-        result = None # Variable to store output
-        version = 1 # Keeping track of plan version for this session
 
+@mcp.tool()
+@count_tool_calls
+async def submit_wayang_query(describe_wayang_plan: str, ctx: Context, model: str | None = None, reasoning: str | None = None) -> str:
+    """
+    Submits a query to generate and execute a Wayang plan in the background and returns a job id right away.
+    The query provided must be in English
 
-        ### --- Generate Wayang Plan Draft --- ###
+    Args:
+        describe_wayang_plan (str):
+            A detailed description in English of what query or task should be executed
 
-        # Generate plan
-        print("[INFO] Generates raw plan")
-        response = builder_agent.generate_plan(describe_wayang_plan)
-        raw_plan = response.get("wayang_plan")
+    Returns:
+        str: JSON with the job id. Poll get_job_status and fetch the output with get_job_result
 
-        # Logging
-        print("[INFO] Draft generated")
-        logger.add_message("Agent Usage: BuilderAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
-        logger.add_message("Agent: BuilderAgent Raw Plan", raw_plan.model_dump())
+    Notes:
+    - Use this instead of query_wayang for queries that take minutes
+    - Be as detailed in the description as possible
+    """
 
+    try:
+        job = jobs.submit(_session_id(ctx), describe_wayang_plan, model, reasoning)
+    except ValueError as e:
+        return str(e)
 
-        ### --- Map Raw Plan to Executable Plan --- ###
+    return json.dumps({"job_id": job.job_id, "status": job.status})
 
-        # Map plan
-        print("[INFO] Mapping plan")
-        wayang_plan = plan_mapper.plan_to_json(raw_plan)
 
-        # Logging
-        print("[INFO] Plan mapped")
-        logger.add_message("Class: PlanMapper Mapped plan finalized for execution", {"version": 1, "plan": wayang_plan})
+@mcp.tool()
+@count_tool_calls
+async def get_job_status(job_id: str, ctx: Context) -> str:
+    """
+    Get the progress of a submitted query.
 
+    Args:
+        job_id (str): Id from submit_wayang_query
 
-        ### --- Validate Plan --- ###
+    Returns:
+        str: JSON with status, current phase, plan version and seconds spent per stage
+    """
 
-        # Logging
-        print("[INFO] Validating plan")
-        logger.add_message(f"Class: PlanValidator Validates Plan", "")
+    job = jobs.get(job_id, _session_id(ctx))
 
+    if job is None:
+        return f"No job with id {job_id}, it may have expired"
 
-        # Validate plan before execution
-        val_success, val_errors = plan_validator.validate_plan(wayang_plan)
+    return json.dumps(job.status_info())
 
-        # Tell and log validation result
-        if val_success:
-            print("[INFO] Plan validated sucessfully")
 
-        else:
-            # Logging if validation fails
-            print(f"[INFO] Plan {version} failed validation: {val_errors}")
-            logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
-            status_code = 400
+@mcp.tool()
+@count_tool_calls
+async def get_job_result(job_id: str, ctx: Context) -> str:
+    """
+    Get the output of a submitted query once it has finished.
 
+    Args:
+        job_id (str): Id from submit_wayang_query
 
-        ### --- Execute Plan If Validated Successfully --- ###
+    Returns:
+        str: The output or error from Wayang, or the status if the job is still running
+    """
 
-        if val_success:
-            # Execute plan in Wayang
-            print("[INFO] Plan sent to Wayang for execution")
-            status_code, result = wayang_executor.execute_plan(wayang_plan)
-            logger.add_message("Wayang: Wayang plan sent to Wayang", "")
-            
-            # Log if plan couldn't execute
-            if status_code != 200:
-                print(f"[INFO] Couldn't execute plan succesfully, status {status_code}")
-                logger.add_message("Err: Wayang error. Plan executed unsucessful", {"status_code": status_code, "output": result})
-        
+    job = jobs.get(job_id, _session_id(ctx))
 
-        ### --- Debug Plan --- ###
-        
-        # Check if debugger should be used
-        use_debugger = DEBUGGER_MODEL_CONFIG.get("use_debugger")
-
-        # Use debugger if true
-        if use_debugger == "True" and status_code != 200:
-
-            # Start logging
-            print("[INFO] Using Debugger Agent to fix plan")
-
-            # Set debugging parameters
-            max_itr = int(DEBUGGER_MODEL_CONFIG.get("max_itr")) # Get max iterations for debugging
-            debugger_agent.set_vesion(version) # Set version to number of plans already created this session
-            debugger_agent.start_debugger() # Load debugger session 
-
-            # Debug and execute plan up to max iterations
-            for _ in range(max_itr):
-
-                # Map and anonymize plan from executable json to raw format
-                failed_plan = plan_mapper.plan_from_json(wayang_plan)
-                logger.add_message("Class: PlanMapper Simplifies JSON", "")
-                print(f"[INFO] PlanMapper Simplifies JSON")
-
-                # Debug plan
-                response = debugger_agent.debug_plan(failed_plan, wayang_errors=result, val_errors=val_errors) # Debug plan
-                version = debugger_agent.get_version() # Current plan version
-                raw_plan = response.get("wayang_plan") # Get only the debugged plan
-                print("[INFO] Plan debugged by debugger")
-
-                # Get current plan version
-                version = debugger_agent.get_version()
-
-                # Logging
-                logger.add_message(f"Agent Usage: DebuggerAgent. Debug version {version} information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump()})
-                logger.add_message(f"Agent: DebuggerAgent's thoughts, plan {version}", {"version": version, "thoughts": raw_plan.thoughts})
-                logger.add_message(f"Agent: DebuggerAgent's plan: {version}", {"version": version, "plan": raw_plan.model_dump()})
-
-
-                # Map the debugged plan to JSON-format
-                wayang_plan = plan_mapper.plan_to_json(raw_plan)
-                print("[INFO] Plan mapped by PlanMapper")
-                logger.add_message("Class: PlanMapper Mapped Debug Plan", "")
-                
-                # Validate debugged plan
-                val_success, val_errors = plan_validator.validate_plan(wayang_plan)
-
-                print(f"[INFO] PlanValidator validates debugger's plan")
-                logger.add_message("Class: PlanValidator Validated Debugger Plan", "")
-
-                # If plan failed validation, continue debugging
-                if not val_success:
-                    # Logging failure
-                    print(f"[INFO] Plan {version} failed validation: {val_errors}")
-                    logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
-                    status_code = 400
-                    result = None
-                    continue
-
-                print(f"[INFO] Succesfully validated and debugged plan, version {version}") # If plan validation succesfully
-                
-                # Execute Wayang plan
-                print(f"[INFO] Plan {version} sent to Wayang for execution")
-                status_code, result = wayang_executor.execute_plan(wayang_plan)
-                logger.add_message("Wayang: Wayang plan sent to Wayang", "")
-
-                # Break debugging loop if sucessfully executed
-                if status_code == 200:
-                    break
-
-                # Continue debugging if execution failed
-                if status_code != 200:
-                    print(f"[ERROR] Couldn't execute plan version {version}, status {status_code}")
-                    logger.add_message(f"Err: Wayang error. Plan version {version} executed unsucessful", {"status_code": status_code, "output": result})
-                    continue
-            
-        # Return output when success
-        if status_code == 200:
-            print("[INFO] Plan succesfully executed")
-            logger.add_message("Final: Sucessful. Plan executed", "Success")
-
-            # Return result to client
-            return result
-
-        # If failed to execute plan after debugging
-        if status_code != 200:
-            print(f"[ERROR] Couldn't execute plan succesfully, status {status_code}")
-            logger.add_message("Final: Unsucessful. Plan executed unsucessful", {"status_code": status_code, "output": result})
-            
-            # Return failure to client
-            return "Couldn't execute wayang plan succesfully"
+    if job is None:
+        return f"No job with id {job_id}, it may have expired"
 
-    except Exception as e:
-        # Prints if an exception happened
-        print(f"[ERROR] {e}")
+    if not job.is_finished():
+        return f"Job {job_id} is {job.status}, check again later"
 
-        # Return error to client LLM to explain to user
-        msg = f"An error occured, explain for the user: {e}"
-        # Return error message to client
-        return msg
+    return job.result
 
 
 @mcp.tool()
-def get_wayang_result() -> str:
+@count_tool_calls
+async def get_wayang_result(ctx: Context) -> str:
     """
     Get the current result from query_wayang or from the Wayang execution.
 
@@ -239,10 +254,137 @@ def get_wayang_result() -> str:
     
     """
 
-    return last_session_result
+    return str(sessions.get(_session_id(ctx)).result)
+
+
+async def _output(ctx: Context, job_id: str | None, source: str = "response") -> SpooledOutput | OutputFileReader | str:
+    """
+    Get the full output of the last query, or of a job
+
+    Args:
+        ctx (Context): MCP request context
+        job_id (str | None): Id from submit_wayang_query, None for the last query_wayang
+        source (str): "response" for the Wayang response, "file" for the file written by textFileOutput
+
+    Returns:
+        SpooledOutput | OutputFileReader | str: The output, or a message if there is none
+
+    """
+
+    if job_id is None:
+        session = sessions.get(_session_id(ctx))
+        output, files = session.result, session.output_files
+    else:
+        job = jobs.get(job_id, _session_id(ctx))
+
+        if job is None:
+            return f"No job with id {job_id}, it may have expired"
+
+        output, files = job.output, job.output_files
+
+    if source == "file":
+        files = [path for path in files if os.path.isfile(path)]
+
+        if not files:
+            return "No output file found for the plan"
+
+        # Index is built in a thread, large files take a moment the first time
+        return await asyncio.to_thread(output_readers.get, files[0])
+
+    return output if isinstance(output, SpooledOutput) else "Nothing to output"
+
+
+@mcp.tool()
+@count_tool_calls
+async def get_result_lines(
+    ctx: Context,
+    offset: int = 0,
+    limit: int = 100,
+    from_end: bool = False,
+    job_id: str | None = None,
+    source: str = "response",
+) -> str:
+    """
+    Read a page of lines from the output of the last query, or of a job. Use it for outputs too large to return at once.
+
+    Args:
+        offset (int): First line to read, starting at 0
+        limit (int): Number of lines to read
+        from_end (bool): Count offset from the last line, e.g. offset 0 and limit 10 gives the last 10 lines
+        job_id (str | None): Id from submit_wayang_query, leave empty for the last query_wayang
+        source (str): "response" reads the Wayang response, "file" reads the file written by the plan's textFileOutput
+
+    Returns:
+        str: The lines
+    """
+
+    output = await _output(ctx, job_id, source)
+
+    if isinstance(output, str):
+        return output
+
+    limit = min(limit, RESULT_CONFIG.get("max_page_lines"))
+
+    # Count from the end for the tail
+    if from_end:
+        offset = max(output.line_count - offset - limit, 0)
+
+    # Reads may page in a large file, keep them off the event loop
+    lines = await asyncio.to_thread(output.lines, offset, limit)
+
+    return "\n".join(lines)
+
 
 @mcp.tool()
-def load_schemas() -> str:
+@count_tool_calls
+async def get_result_info(ctx: Context, job_id: str | None = None, source: str = "response") -> str:
+    """
+    Get the size and number of lines of the output of the last query, or of a job.
+
+    Args:
+        job_id (str | None): Id from submit_wayang_query, leave empty for the last query_wayang
+        source (str): "response" for the Wayang response, "file" for the file written by the plan's textFileOutput
+
+    Returns:
+        str: JSON with bytes and lines
+    """
+
+    output = await _output(ctx, job_id, source)
+
+    if isinstance(output, str):
+        return output
+
+    return json.dumps({"bytes": output.size, "lines": output.line_count})
+
+
+@mcp.tool()
+@count_tool_calls
+async def sample_result_file(ctx: Context, n: int = 10, job_id: str | None = None, seed: int | None = None) -> str:
+    """
+    Read a random sample of lines from the file written by the plan's textFileOutput, in file order.
+
+    Args:
+        n (int): Number of lines
+        job_id (str | None): Id from submit_wayang_query, leave empty for the last query_wayang
+        seed (int | None): Seed to get the same sample again
+
+    Returns:
+        str: The sampled lines
+    """
+
+    output = await _output(ctx, job_id, "file")
+
+    if isinstance(output, str):
+        return output
+
+    # Reads may page in a large file, keep them off the event loop
+    lines = await asyncio.to_thread(output.sample, min(n, RESULT_CONFIG.get("max_page_lines")), seed)
+
+    return "\n".join(lines)
+
+@mcp.tool()
+@count_tool_calls
+async def load_schemas() -> str:
     """
     Loads schemas with examples from database and textfiles for agents.
 
@@ -262,11 +404,23 @@ def load_schemas() -> str:
         # For output messages
         msg = []
 
-        # Load jdbc tables
-        msg.append(schema_loader.get_and_save_table_schemas())
+        # Load jdbc tables (blocking database calls run in a worker thread)
+        msg.append(await asyncio.to_thread(schema_loader.get_and_save_table_schemas))
 
         # Load textfiles
-        msg.append(schema_loader.get_and_save_textfile_schemas())
+        msg.append(await asyncio.to_thread(schema_loader.get_and_save_textfile_schemas))
+
+        # Column types for the plan optimizer
+        await asyncio.to_thread(plan_optimizer.load_column_types)
+
+        # Drop cached plans built against the old schemas
+        changed = await asyncio.to_thread(plan_cache.refresh_schemas) if plan_cache else True
+
+        # Rebuild the semantic index from the plans left in the plan cache
+        if semantic_index is not None and changed:
+            semantic_index.clear()
+            if plan_cache:
+                semantic_index.add_many(plan_cache.items())
 
         # Returns msg as str to client
         return "\n".join(msg)
@@ -274,4 +428,39 @@ def load_schemas() -> str:
     except Exception as e:
         # Print and returns error
         print(f"[ERROR] {e}")
-        return f"An error occured, error: {e}"
\ No newline at end of file
+        return f"An error occured, error: {e}"
+
+
+@mcp.tool()
+@count_tool_calls
+async def get_cache_stats() -> str:
+    """
+    Get statistics on the plan cache, the LLM provider's prompt cache, speculative plan generation, the UDF compile cache, plan repair and the plan optimizer.
+
+    Returns:
+        str: Number of cached plans, hits, misses and hit rate, cached input tokens per agent, wins per speculative variant, compiled UDFs, Debugger calls saved by repair and rewrites per optimizer rule
+    """
+
+    stats = {
+        "plan_cache": plan_cache.stats() if plan_cache else "Plan cache is disabled",
+        "prompt_cache": pipeline.usage.stats(),
+        "speculative": speculative.stats() if speculative else "Speculative generation is disabled",
+        "udf_compiler": udf_compiler.stats() if udf_compiler else "UDF compile check is disabled",
+        "plan_repair": pipeline.plan_repairer.stats() if pipeline.plan_repairer else "Plan repair is disabled",
+        "plan_optimizer": pipeline.plan_optimizer.stats(),
+    }
+
+    return json.dumps(stats)
+
+
+@mcp.tool()
+@count_tool_calls
+async def get_wayang_backends() -> str:
+    """
+    Get state, load, latency and error metrics for each Wayang server.
+
+    Returns:
+        str: Metrics per Wayang server as JSON
+    """
+
+    return json.dumps(wayang_executor.stats())
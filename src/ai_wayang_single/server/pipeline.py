@@ -0,0 +1,594 @@
+from ai_wayang_single.config.settings import BUILDER_MODEL_CONFIG, DEBUGGER_MODEL_CONFIG, REPAIR_CONFIG, SEMANTIC_CACHE_CONFIG
+from ai_wayang_single.llm.models import WayangOperation, WayangPlan
+from ai_wayang_single.llm.prompt_loader import PromptLoader
+from ai_wayang_single.llm.usage import UsageTracker
+from ai_wayang_single.server.session import Session
+from ai_wayang_single.server.speculative import SpeculativeBuilder
+from ai_wayang_single.utils.metrics import metrics
+from ai_wayang_single.utils.output_reader import plan_output_files
+from ai_wayang_single.utils.output_retention import OutputRetention
+from ai_wayang_single.utils.plan_cache import PlanCache
+from ai_wayang_single.utils.semantic_cache import SemanticPlanIndex
+from ai_wayang_single.utils.tracing import Span, Tracer, get_tracer
+from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_optimizer import PlanOptimizer
+from ai_wayang_single.wayang.plan_repairer import PlanRepairer
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+from ai_wayang_single.wayang.wayang_executor import WayangExecutor
+from typing import Callable, List
+import asyncio
+
+
+class QueryPipeline:
+    """
+    Runs the build, validate, execute and debug pipeline for a query.
+    The pipeline holds only stateless, shared components. All per-query state lives in the Session
+
+    """
+
+    def __init__(
+        self,
+        plan_mapper: PlanMapper,
+        plan_validator: PlanValidator,
+        wayang_executor: WayangExecutor,
+        plan_cache: PlanCache | None = None,
+        semantic_index: SemanticPlanIndex | None = None,
+        speculative: SpeculativeBuilder | None = None,
+        output_retention: OutputRetention | None = None,
+        tracer: Tracer | None = None,
+        plan_optimizer: PlanOptimizer | None = None,
+    ):
+        self.plan_mapper = plan_mapper
+        self.plan_validator = plan_validator
+        self.wayang_executor = wayang_executor
+        self.plan_cache = plan_cache
+        self.semantic_index = semantic_index
+        self.speculative = speculative
+        self.output_retention = output_retention
+        self.tracer = tracer or get_tracer() # Spans per stage with durations and token usage
+        self.use_streaming = BUILDER_MODEL_CONFIG.get("use_streaming") == "True"
+        self.plan_repairer = PlanRepairer() if REPAIR_CONFIG.get("use_plan_repair") == "True" else None
+        self.plan_optimizer = plan_optimizer or PlanOptimizer() # Rewrites validated plans before execution
+        self.semantic_mode = SEMANTIC_CACHE_CONFIG.get("mode")
+        self.semantic_threshold = SEMANTIC_CACHE_CONFIG.get("threshold")
+        self.semantic_reuse_threshold = SEMANTIC_CACHE_CONFIG.get("reuse_threshold")
+        self.prompt_loader = PromptLoader()
+        self.usage = UsageTracker() # Token usage and provider prompt cache hits
+
+    async def run(
+        self,
+        session: Session,
+        describe_wayang_plan: str,
+        model: str | None = None,
+        reasoning: str | None = None,
+        run_id: str | None = None,
+    ) -> str:
+        """
+        Generates, validates, executes and debugs a Wayang plan within a session
+
+        Args:
+            session (Session): The clients session that owns agents, logger and result
+            describe_wayang_plan (str): Description of the plan in natural language
+            model (str | None): GPT-model to use for the agents
+            reasoning (str | None): Reasoning effort to use for the agents
+            run_id (str | None): Id of the query, e.g. a job id, used to name output files
+
+        Returns:
+            str: Execution output or an error message for the client
+
+        """
+
+        with self.tracer.span("query_wayang", session_id=session.session_id) as span:
+            result = await self._run(session, describe_wayang_plan, model, reasoning, run_id)
+            span.set(run_id=session.run_id, phase=session.phase, version=session.version)
+
+        return result
+
+    async def _run(
+        self,
+        session: Session,
+        describe_wayang_plan: str,
+        model: str | None,
+        reasoning: str | None,
+        run_id: str | None,
+    ) -> str:
+        """
+        Helper function with the steps of run, traced as one query
+
+        """
+
+        # Reset session state for this query
+        session.start_query(model, reasoning, run_id)
+
+        try:
+            # Logger for this query
+            logger = session.logger
+            logger.add_message("User query: Plan description from client LLM", describe_wayang_plan)
+        
+            # Initialize variables
+            status_code = None # Status code from validator or Wayang server
+            result = None # Variable to store output, cut to a preview for large outputs
+            output = None # Full output from Wayang, for paging
+            version = 1 # Keeping track of plan version for this session
+            debug_iterations = 0
+
+
+            ### --- Look Up Plan In Cache --- ###
+
+            session.set_phase("cache_lookup")
+
+            cache_key = None
+            raw_plan = None
+            stream_errors = [] # Fatal errors found while streaming the plan
+
+            if self.plan_cache:
+                builder = session.builder
+                cache_key = self.plan_cache.make_key(describe_wayang_plan, builder.model, builder.reasoning, builder.get_system_prompt(describe_wayang_plan))
+                raw_plan = self.plan_cache.get(cache_key)
+                metrics.cache_lookups.labels("plan_cache", "hit" if raw_plan else "miss").inc()
+
+                if raw_plan:
+                    print("[INFO] Plan found in cache, skipping Builder Agent")
+                    logger.add_message("Cache: PlanCache hit", {"key": cache_key, "plan": raw_plan.model_dump()})
+            
+            # Remember if plan is from cache so a stale entry can be dropped
+            cached = raw_plan is not None
+
+
+            ### --- Look Up Similar Plan --- ###
+
+            example = None
+            reused_query = None # Indexed query whose plan is reused, dropped from the index if it fails
+
+            if not cached and self.semantic_index is not None:
+                match = self.semantic_index.search(describe_wayang_plan, self.semantic_threshold)
+                metrics.cache_lookups.labels("semantic", "hit" if match else "miss").inc()
+
+                if match:
+                    score, similar_query, similar_plan = match
+                    logger.add_message("Cache: SemanticPlanIndex match", {"score": score, "query": similar_query, "mode": self.semantic_mode})
+
+                    # Reuse the plan directly only if near-identical, else give it to the Builder as example
+                    reuse = (
+                        self.semantic_mode == "reuse"
+                        and score >= self.semantic_reuse_threshold
+                        and self.semantic_index.same_constraints(describe_wayang_plan, similar_query)
+                        and self.semantic_index.same_content(describe_wayang_plan, similar_query)
+                    )
+
+                    if reuse:
+                        print(f"[INFO] Reusing plan of similar query (similarity {score:.2f}), skipping Builder Agent")
+                        raw_plan = similar_plan
+                        reused_query = similar_query
+                    else:
+                        print(f"[INFO] Using plan of similar query as example (similarity {score:.2f})")
+                        example = self.prompt_loader.load_similar_example_prompt(similar_query, similar_plan)
+
+
+            ### --- Generate Wayang Plan Draft --- ###
+
+            session.set_phase("building")
+
+            if raw_plan is None and self.speculative is not None:
+                # Generate several plans concurrently, first valid plan wins
+                print(f"[INFO] Generates {len(self.speculative.variants)} raw plans concurrently")
+                with self.tracer.span("builder.generate_plan", version=version, speculative=True) as span:
+                    response = await self.speculative.generate_plan(session.builder, describe_wayang_plan, example=example)
+                    span.set(variant=response["variant"], valid=response["valid"])
+                    usages = [self._record_usage(span, "builder", variant_response["raw"]) for variant_response in response["responses"]]
+                raw_plan = response.get("wayang_plan")
+
+                # Logging
+                print(f"[INFO] Draft generated by variant {response['variant']} in {response['latency']:.2f}s (valid: {response['valid']})")
+                for variant_response, usage in zip(response["responses"], usages):
+                    logger.add_message("Agent Usage: BuilderAgent Information", {"model": str(variant_response["raw"].model), "usage": variant_response["raw"].usage.model_dump(), "prompt_cache": usage})
+                logger.add_message("Speculative: Winning variant", {"variant": response["variant"], "valid": response["valid"], "latency": response["latency"], "received": len(response["responses"])})
+                logger.add_message("Agent: BuilderAgent Raw Plan", raw_plan.model_dump())
+
+            elif raw_plan is None and self.use_streaming:
+                # Stream plan and check each operator as it completes
+                print("[INFO] Streams raw plan")
+                with self.tracer.span("builder.generate_plan", version=version, streaming=True) as span:
+                    response = await session.builder.stream_plan(describe_wayang_plan, self._operator_checker(), example=example)
+                    span.set(aborted=response["aborted"])
+                    usage = None if response["aborted"] else self._record_usage(span, "builder", response["raw"])
+                raw_plan = response.get("wayang_plan")
+                stream_errors = response.get("errors")
+
+                # Logging
+                if response["aborted"]:
+                    print(f"[INFO] Plan generation aborted after {len(raw_plan.operations)} operators: {stream_errors}")
+                    logger.add_message("Err: BuilderAgent stream aborted at invalid operator", {"operators": len(raw_plan.operations), "errors": stream_errors})
+                else:
+                    print("[INFO] Draft generated")
+                    logger.add_message("Agent Usage: BuilderAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump(), "prompt_cache": usage})
+                logger.add_message("Agent: BuilderAgent Raw Plan", raw_plan.model_dump())
+
+            elif raw_plan is None:
+                # Generate plan
+                print("[INFO] Generates raw plan")
+                with self.tracer.span("builder.generate_plan", version=version) as span:
+                    response = await session.builder.generate_plan(describe_wayang_plan, example=example)
+                    usage = self._record_usage(span, "builder", response["raw"])
+                raw_plan = response.get("wayang_plan")
+
+                # Logging
+                print("[INFO] Draft generated")
+                print(f"[INFO] BuilderAgent cached tokens: {usage['cached_tokens']} of {usage['input_tokens']} input tokens")
+                logger.add_message("Agent Usage: BuilderAgent Information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump(), "prompt_cache": usage})
+                logger.add_message("Agent: BuilderAgent Raw Plan", raw_plan.model_dump())
+
+
+            ### --- Map Raw Plan to Executable Plan --- ###
+
+            # Map plan
+            session.set_phase("mapping")
+            print("[INFO] Mapping plan")
+            with self.tracer.span("plan_mapper.plan_to_json", version=version):
+                wayang_plan = self.plan_mapper.plan_to_json(raw_plan, session.run_id)
+
+            # Logging
+            print("[INFO] Plan mapped")
+            logger.add_message("Class: PlanMapper Mapped plan finalized for execution", {"version": 1, "plan": wayang_plan})
+
+
+            ### --- Validate Plan --- ###
+
+            # Logging
+            session.set_phase("validating")
+            print("[INFO] Validating plan")
+            logger.add_message(f"Class: PlanValidator Validates Plan", "")
+
+
+            # Validate plan before execution
+            with self.tracer.span("plan_validator.validate_plan", version=version) as span:
+                val_success, val_errors = await asyncio.to_thread(self.plan_validator.validate_plan, wayang_plan)
+                span.set(valid=val_success, errors=len(val_errors))
+
+            # A plan aborted while streaming is incomplete, keep the errors that stopped it first
+            if stream_errors:
+                val_success = False
+                val_errors = stream_errors + [e for e in val_errors if e not in stream_errors]
+
+            # Fix mechanical errors locally before the Debugger is needed
+            if not val_success and not stream_errors:
+                saves_call = DEBUGGER_MODEL_CONFIG.get("use_debugger") == "True"
+                raw_plan, wayang_plan, val_success, val_errors = await self._repair_plan(session, raw_plan, wayang_plan, val_errors, version, saves_call)
+
+            # Tell and log validation result
+            if val_success:
+                print("[INFO] Plan validated sucessfully")
+
+            else:
+                # Logging if validation fails
+                print(f"[INFO] Plan {version} failed validation: {val_errors}")
+                logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
+                status_code = 400
+
+
+            ### --- Execute Plan If Validated Successfully --- ###
+
+            if val_success:
+                # Execute plan in Wayang
+                session.set_phase("executing")
+                print("[INFO] Plan sent to Wayang for execution")
+                status_code, output = await self._execute_plan(session, wayang_plan, version)
+                result = output.preview()
+                logger.add_message("Wayang: Wayang plan sent to Wayang", "")
+            
+                # Log if plan couldn't execute
+                if status_code != 200:
+                    print(f"[INFO] Couldn't execute plan succesfully, status {status_code}")
+                    logger.add_message("Err: Wayang error. Plan executed unsucessful", {"status_code": status_code, "output": result})
+        
+
+            ### --- Debug Plan --- ###
+        
+            # Check if debugger should be used
+            use_debugger = DEBUGGER_MODEL_CONFIG.get("use_debugger")
+
+            # Use debugger if true
+            if use_debugger == "True" and status_code != 200:
+
+                # Start logging
+                print("[INFO] Using Debugger Agent to fix plan")
+
+                # Set debugging parameters
+                max_itr = int(DEBUGGER_MODEL_CONFIG.get("max_itr")) # Get max iterations for debugging
+                session.debugger.set_vesion(version) # Set version to number of plans already created this session
+                session.debugger.start_debugger() # Load debugger session 
+
+                # Debug and execute plan up to max iterations
+                for itr in range(max_itr):
+                    debug_iterations += 1
+
+                    # Map and anonymize plan from executable json to raw format
+                    session.set_phase("debugging")
+                    failed_plan = self.plan_mapper.plan_from_json(wayang_plan)
+                    logger.add_message("Class: PlanMapper Simplifies JSON", "")
+                    print(f"[INFO] PlanMapper Simplifies JSON")
+
+                    # Debug plan
+                    with self.tracer.span("debugger.debug_plan") as debug_span:
+                        response = await session.debugger.debug_plan(describe_wayang_plan, failed_plan, wayang_errors=result, val_errors=val_errors) # Debug plan
+                        usage = self._record_usage(debug_span, "debugger", response["raw"])
+                        debug_span.set(version=session.debugger.get_version())
+                    version = session.debugger.get_version() # Current plan version
+                    raw_plan = response.get("wayang_plan") # Get only the debugged plan
+                    print("[INFO] Plan debugged by debugger")
+
+                    # Get current plan version
+                    version = session.debugger.get_version()
+                    session.version = version
+
+                    # Logging
+                    print(f"[INFO] DebuggerAgent cached tokens: {usage['cached_tokens']} of {usage['input_tokens']} input tokens")
+                    logger.add_message(f"Agent Usage: DebuggerAgent. Debug version {version} information", {"model": str(response["raw"].model), "usage": response["raw"].usage.model_dump(), "prompt_cache": usage})
+                    logger.add_message(f"Agent: DebuggerAgent's thoughts, plan {version}", {"version": version, "thoughts": raw_plan.thoughts})
+                    logger.add_message(f"Agent: DebuggerAgent's plan: {version}", {"version": version, "plan": raw_plan.model_dump()})
+
+
+                    # Map the debugged plan to JSON-format
+                    session.set_phase("mapping")
+                    with self.tracer.span("plan_mapper.plan_to_json", version=version):
+                        wayang_plan = self.plan_mapper.plan_to_json(raw_plan, session.run_id)
+                    print("[INFO] Plan mapped by PlanMapper")
+                    logger.add_message("Class: PlanMapper Mapped Debug Plan", "")
+                
+                    # Validate debugged plan
+                    session.set_phase("validating")
+                    with self.tracer.span("plan_validator.validate_plan", version=version) as span:
+                        val_success, val_errors = await asyncio.to_thread(self.plan_validator.validate_plan, wayang_plan)
+                        span.set(valid=val_success, errors=len(val_errors))
+
+                    print(f"[INFO] PlanValidator validates debugger's plan")
+                    logger.add_message("Class: PlanValidator Validated Debugger Plan", "")
+
+                    # Fix mechanical errors locally before another Debugger iteration
+                    if not val_success:
+                        saves_call = itr < max_itr - 1 # The last iteration has no next Debugger call
+                        raw_plan, wayang_plan, val_success, val_errors = await self._repair_plan(session, raw_plan, wayang_plan, val_errors, version, saves_call)
+
+                    # If plan failed validation, continue debugging
+                    if not val_success:
+                        # Logging failure
+                        print(f"[INFO] Plan {version} failed validation: {val_errors}")
+                        logger.add_message(f"Err: PlanValidator Val error. Failed validation", {"version": version, "errors": val_errors})
+                        status_code = 400
+                        result = None
+                        output = None
+                        continue
+
+                    print(f"[INFO] Succesfully validated and debugged plan, version {version}") # If plan validation succesfully
+                
+                    # Execute Wayang plan
+                    session.set_phase("executing")
+                    print(f"[INFO] Plan {version} sent to Wayang for execution")
+                    status_code, output = await self._execute_plan(session, wayang_plan, version)
+                    result = output.preview()
+                    logger.add_message("Wayang: Wayang plan sent to Wayang", "")
+
+                    # Break debugging loop if sucessfully executed
+                    if status_code == 200:
+                        break
+
+                    # Continue debugging if execution failed
+                    if status_code != 200:
+                        print(f"[ERROR] Couldn't execute plan version {version}, status {status_code}")
+                        logger.add_message(f"Err: Wayang error. Plan version {version} executed unsucessful", {"status_code": status_code, "output": result})
+                        continue
+            
+            # Store the output in the session so the client can fetch it again
+            session.result = output if output is not None else "Nothing to output"
+            session.version = version
+
+            # Remember output files of a successful plan so they can be read back
+            if status_code == 200:
+                session.output_files = plan_output_files(wayang_plan)
+
+            # Metrics of the finished query
+            metrics.queries.labels(status_code).inc()
+            metrics.debug_iterations.observe(debug_iterations)
+
+            # Delete old output files now and then
+            if self.output_retention is not None:
+                await asyncio.to_thread(self.output_retention.maybe_cleanup)
+
+            # Update plan cache with the final plan
+            if self.plan_cache:
+                if status_code == 200:
+                    builder = session.builder
+                    self.plan_cache.put(cache_key, describe_wayang_plan, raw_plan, builder.model, builder.reasoning)
+                elif cached:
+                    self.plan_cache.invalidate(cache_key)
+
+            # Index successful plan for similar queries, drop a reused plan that failed
+            if self.semantic_index is not None:
+                if status_code == 200:
+                    self.semantic_index.add(describe_wayang_plan, raw_plan)
+                elif reused_query is not None:
+                    self.semantic_index.remove(reused_query)
+
+            # Return output when success
+            if status_code == 200:
+                session.set_phase("done")
+                print("[INFO] Plan succesfully executed")
+                logger.add_message("Final: Sucessful. Plan executed", "Success")
+
+                # Return result to client
+                return result
+
+            # If failed to execute plan after debugging
+            if status_code != 200:
+                session.set_phase("failed")
+                print(f"[ERROR] Couldn't execute plan succesfully, status {status_code}")
+                logger.add_message("Final: Unsucessful. Plan executed unsucessful", {"status_code": status_code, "output": result})
+            
+                # Return failure to client
+                return "Couldn't execute wayang plan succesfully"
+
+        except Exception as e:
+            # Prints if an exception happened
+            print(f"[ERROR] {e}")
+
+            # Return error to client LLM to explain to user
+            msg = f"An error occured, explain for the user: {e}"
+            metrics.queries.labels("error").inc()
+            session.result = msg
+            session.set_phase("failed")
+            # Return error message to client
+            return msg
+
+    async def _execute_plan(self, session: Session, wayang_plan: dict, version: int):
+        """
+        Helper function to optimize a validated plan and execute it in Wayang.
+        If the optimized plan fails with an error a rewrite can cause, the plan is executed as validated,
+        so the Debugger never sees errors from a rewrite
+
+        Args:
+            session (Session): Session of the query
+            wayang_plan (dict): Validated JSON Wayang plan
+            version (int): Plan version
+
+        Returns:
+            Tuple: Status code and output of Wayang
+
+        """
+
+        optimized_plan, rewrites = self.plan_optimizer.optimize(wayang_plan)
+
+        if rewrites:
+            print(f"[INFO] PlanOptimizer made {len(rewrites)} rewrites")
+            session.logger.add_message("Class: PlanOptimizer Optimized plan", {"version": version, "rewrites": rewrites})
+
+        with self.tracer.span("wayang.execute_plan", version=version, rewrites=len(rewrites)) as span:
+            status_code, output = await self.wayang_executor.execute_plan(optimized_plan)
+            span.set(status_code=status_code, output_bytes=output.size)
+
+        if status_code == 200 or not rewrites:
+            return status_code, output
+
+        # Errors of the plan itself go straight to the Debugger
+        error = output.preview()
+        if not self.plan_optimizer.may_have_failed(error):
+            return status_code, output
+
+        print(f"[INFO] Optimized plan failed with status {status_code}, executing plan as validated")
+        session.logger.add_message("Class: PlanOptimizer Optimized plan failed", {"version": version, "status_code": status_code, "output": error})
+        output.close()
+
+        with self.tracer.span("wayang.execute_plan", version=version, rewrites=0) as span:
+            status_code, output = await self.wayang_executor.execute_plan(wayang_plan)
+            span.set(status_code=status_code, output_bytes=output.size)
+
+        return status_code, output
+
+    async def _repair_plan(self, session: Session, raw_plan: WayangPlan, wayang_plan: dict, val_errors: List[str], version: int, saves_call: bool):
+        """
+        Helper function to repair a plan that failed validation, then map and validate it again.
+        The repaired plan is kept if it is valid or has fewer errors
+
+        Args:
+            session (Session): Session of the query
+            raw_plan (WayangPlan): Raw plan that failed validation
+            wayang_plan (dict): Its mapped plan
+            val_errors (List[str]): Its validation errors
+            version (int): Plan version
+            saves_call (bool): True if the Debugger would be called for the plan otherwise
+
+        Returns:
+            Tuple: Raw plan, mapped plan, validation success and errors to continue with
+
+        """
+
+        if self.plan_repairer is None:
+            return raw_plan, wayang_plan, False, val_errors
+
+        repaired_plan, fixes = self.plan_repairer.repair(raw_plan)
+        if not fixes:
+            return raw_plan, wayang_plan, False, val_errors
+
+        with self.tracer.span("plan_repairer.repair", version=version, fixes=len(fixes)) as span:
+            try:
+                repaired_json = self.plan_mapper.plan_to_json(repaired_plan, session.run_id)
+            except Exception as e:
+                print(f"[ERROR] Couldn't map repaired plan: {e}")
+                return raw_plan, wayang_plan, False, val_errors
+
+            success, errors = await asyncio.to_thread(self.plan_validator.validate_plan, repaired_json)
+            span.set(valid=success, errors=len(errors))
+
+        self.plan_repairer.record(success, saves_call)
+        metrics.plan_repairs.labels("repaired" if success else "partial").inc()
+
+        # Logging
+        print(f"[INFO] PlanRepairer applied {len(fixes)} fixes, plan {'validated' if success else f'still has {len(errors)} errors'}")
+        session.logger.add_message("Class: PlanRepairer Repaired plan", {
+            "version": version,
+            "fixes": fixes,
+            "valid": success,
+            "errors": errors,
+            "llm_calls_saved": self.plan_repairer.stats()["llm_calls_saved"],
+        })
+
+        if success or len(errors) < len(val_errors):
+            return repaired_plan, repaired_json, success, errors
+
+        return raw_plan, wayang_plan, False, val_errors
+
+    def _record_usage(self, span: Span, agent: str, response) -> dict:
+        """
+        Helper function to record token usage of an agent call, and add it to the call's span summed over calls
+
+        Args:
+            span (Span): Span of the agent call
+            agent (str): Name of the agent, "builder" or "debugger"
+            response: Raw response from the agent
+
+        Returns:
+            dict: Usage summary of the call
+
+        """
+
+        usage = self.usage.record(agent, response)
+
+        for key in ("input_tokens", "cached_tokens", "output_tokens"):
+            span.set(**{key: span.attributes.get(key, 0) + usage[key]})
+
+        span.set(model=usage["model"])
+
+        return usage
+
+    def _operator_checker(self) -> Callable[[WayangOperation], List[str]]:
+        """
+        Helper function that creates a check for operators of a streamed plan.
+        Each operator is mapped and validated on its own and against the operators before it
+
+        Returns:
+            Callable[[WayangOperation], List[str]]: Returns fatal errors for an operator
+
+        """
+
+        seen_ids = set()
+
+        def check(operation: WayangOperation) -> List[str]:
+            try:
+                mapped = self.plan_mapper.operator_to_json(operation)
+            except ValueError as e:
+                # Unknown operator
+                return [f"Operation id {operation.id}: {e}"]
+            except Exception:
+                # Other mapping problems are reported when the full plan is mapped
+                mapped = operation.model_dump()
+
+            # Operators the mapper drops on purpose, e.g. the output without an output folder, aren't executed
+            if mapped is None:
+                seen_ids.add(operation.id)
+                return []
+
+            errors = self.plan_validator.validate_operator(mapped, seen_ids)
+            seen_ids.add(operation.id)
+
+            return errors
+
+        return check
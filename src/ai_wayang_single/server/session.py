@@ -0,0 +1,203 @@
+from ai_wayang_single.config.settings import BUILDER_MODEL_CONFIG, DEBUGGER_MODEL_CONFIG, SESSION_CONFIG
+from ai_wayang_single.llm.agent_builder import Builder
+from ai_wayang_single.llm.agent_debugger import Debugger
+from ai_wayang_single.utils.logger import Logger
+from collections import OrderedDict
+from typing import Callable
+import asyncio
+import re
+import time
+
+
+class Session:
+    """
+    State for a single MCP client session.
+    Owns its own agents, debug chat, plan version, logger and result so overlapping queries can't corrupt each other
+
+    """
+
+    def __init__(self, session_id: str, builder: Builder, debugger: Debugger):
+        self.session_id = session_id
+        self.builder = builder
+        self.debugger = debugger
+        self.logger = None
+        self.version = 1
+        self.result = "Nothing to output" # Message or SpooledOutput of the last query
+        self.output_files = [] # Files written by textFileOutput in the last successful plan
+        self.lock = asyncio.Lock()
+        self.last_active = time.monotonic()
+        self.phase = None # Current pipeline stage of the query
+        self.phase_started = None
+        self.stages = {} # Seconds spent per stage
+        self.runs = 0 # Queries started in this session
+        self.run_id = None # Id of the current query, used to name output files
+
+    def start_query(self, model: str | None = None, reasoning: str | None = None, run_id: str | None = None) -> None:
+        """
+        Resets the per-query state before a new query is run in the session
+
+        Args:
+            model (str | None): GPT-model to use for the agents, defaults to settings
+            reasoning (str | None): Reasoning effort to use for the agents, defaults to settings
+            run_id (str | None): Id of the query, e.g. a job id. Defaults to the session id and a run counter
+
+        """
+
+        # Sets parametre (mainly for evaluation)
+        self.builder.set_model_and_reasoning(
+            model or BUILDER_MODEL_CONFIG.get("model"),
+            reasoning or BUILDER_MODEL_CONFIG.get("reason_effort"),
+        )
+        self.debugger.set_model_and_reasoning(
+            model or DEBUGGER_MODEL_CONFIG.get("model"),
+            reasoning or DEBUGGER_MODEL_CONFIG.get("reason_effort"),
+        )
+
+        # Unique id for this query in the session
+        safe_session_id = re.sub(r"[^A-Za-z0-9_-]", "_", self.session_id)
+        self.runs += 1
+        self.run_id = run_id or f"{safe_session_id}_{self.runs}"
+
+        # New log file and clean debugger chat for every query
+        self.logger = Logger(session_id=safe_session_id)
+        self.debugger.start_debugger()
+        self.debugger.set_vesion(0)
+        self.version = 1
+        self.phase = None
+        self.stages = {}
+        self.output_files = []
+        self.touch()
+
+    def set_phase(self, phase: str) -> None:
+        """
+        Marks the start of a pipeline stage and adds the time spent in the previous stage
+
+        Args:
+            phase (str): Name of the stage, e.g. "building" or "executing"
+
+        """
+
+        now = time.perf_counter()
+
+        if self.phase is not None:
+            self.stages[self.phase] = self.stages.get(self.phase, 0.0) + now - self.phase_started
+
+        self.phase = phase
+        self.phase_started = now
+
+    def stage_times(self) -> dict:
+        """
+        Get seconds spent per stage, including the stage running now
+
+        Returns:
+            dict: Seconds per stage
+
+        """
+
+        stages = dict(self.stages)
+
+        if self.phase is not None and self.phase not in ["done", "failed"]:
+            stages[self.phase] = stages.get(self.phase, 0.0) + time.perf_counter() - self.phase_started
+
+        return stages
+
+    def touch(self) -> None:
+        """
+        Marks the session as active now
+
+        """
+
+        self.last_active = time.monotonic()
+
+    def is_expired(self, ttl: float) -> bool:
+        """
+        Checks if the session has been idle for longer than the ttl
+
+        Args:
+            ttl (float): Time to live in seconds
+
+        Returns:
+            bool: True if the session is expired and not running a query
+
+        """
+
+        return not self.lock.locked() and time.monotonic() - self.last_active > ttl
+
+
+class SessionRegistry:
+    """
+    Keeps track of sessions keyed by MCP client/session id.
+    Idle sessions are evicted after a TTL and the registry is bounded in size
+
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable[[str], Session],
+        ttl: float | None = None,
+        max_sessions: int | None = None,
+    ):
+        self.session_factory = session_factory
+        self.ttl = ttl or SESSION_CONFIG.get("ttl_seconds")
+        self.max_sessions = max_sessions or SESSION_CONFIG.get("max_sessions")
+        self.sessions = OrderedDict() # Ordered from least to most recently used
+
+    def get(self, session_id: str) -> Session:
+        """
+        Get the session for a client id, creates a new one if it doesn't exist
+
+        Args:
+            session_id (str): Id of the MCP client or session
+
+        Returns:
+            Session: The clients session
+
+        """
+
+        # Remove idle sessions before handing out a session
+        self.evict_expired()
+
+        # Get existing session or create a new one
+        session = self.sessions.get(session_id)
+
+        if session is None:
+            session = self.session_factory(session_id)
+            self.sessions[session_id] = session
+
+        # Mark as most recently used
+        self.sessions.move_to_end(session_id)
+        session.touch()
+
+        return session
+
+    def evict_expired(self) -> int:
+        """
+        Evicts idle sessions older than the TTL, and the least recently used sessions if the registry is full
+
+        Returns:
+            int: Number of evicted sessions
+
+        """
+
+        evicted = 0
+
+        # Oldest sessions are first, so stop at the first one still alive
+        for session_id, session in list(self.sessions.items()):
+            if not session.is_expired(self.ttl):
+                break
+            del self.sessions[session_id]
+            evicted += 1
+
+        # Make room if registry is full, skipping sessions running a query
+        for session_id, session in list(self.sessions.items()):
+            if len(self.sessions) < self.max_sessions:
+                break
+            if session.lock.locked():
+                continue
+            del self.sessions[session_id]
+            evicted += 1
+
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self.sessions)
@@ -0,0 +1,204 @@
+from ai_wayang_single.config.settings import SPECULATIVE_CONFIG
+from ai_wayang_single.llm.agent_builder import Builder
+from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+from collections import Counter
+from typing import Dict, List
+import asyncio
+import time
+
+
+def parse_variants(spec: str | None, n: int) -> List[Dict]:
+    """
+    Parses the variant mix from settings.
+    Each variant is "model:effort[:temperature]", where an empty model uses the Builder's own model and effort.
+    A model without effort runs without reasoning, e.g. a non-reasoning model with a temperature
+
+    Args:
+        spec (str | None): Comma separated variants, e.g. "gpt-5-nano:low,gpt-5-mini:minimal,gpt-4.1-mini::0.3"
+        n (int): Number of variants to run. The mix is repeated if it has fewer variants
+
+    Returns:
+        List[Dict]: Variants with name, model, reasoning and temperature
+
+    """
+
+    variants = []
+
+    for item in (spec or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+
+        parts = (item.split(":") + ["", "", ""])[:3]
+        model, reasoning, temperature = [part.strip() for part in parts]
+
+        # Only the Builder's own model inherits its effort, "" turns reasoning off
+        if not model:
+            reasoning = reasoning or None
+
+        variants.append({
+            "name": item,
+            "model": model or None,
+            "reasoning": reasoning,
+            "temperature": float(temperature) if temperature else None,
+        })
+
+    # Without a mix, run the Builder's own model n times
+    if not variants:
+        variants = [{"name": "default", "model": None, "reasoning": None, "temperature": None}]
+
+    return [variants[i % len(variants)] for i in range(max(n, 1))]
+
+
+class SpeculativeBuilder:
+    """
+    Generates several plans concurrently with different models, efforts or temperatures.
+    Each plan is validated as it arrives and the first valid plan wins, the remaining calls are cancelled
+
+    """
+
+    def __init__(
+        self,
+        plan_mapper: PlanMapper,
+        plan_validator: PlanValidator,
+        variants: str | None = None,
+        n: int | None = None,
+    ):
+        self.plan_mapper = plan_mapper
+        self.plan_validator = plan_validator
+        self.variants = parse_variants(
+            variants if variants is not None else SPECULATIVE_CONFIG.get("variants"),
+            n or SPECULATIVE_CONFIG.get("n"),
+        )
+
+        # Wins per variant since startup, to tune the mix
+        self.wins = Counter()
+        self.runs = 0
+
+    async def generate_plan(self, builder: Builder, prompt: str, example: str | None = None) -> Dict:
+        """
+        Generates plans concurrently and returns the first one that validates
+
+        Args:
+            builder (Builder): The session's Builder Agent
+            prompt (str): A query in natural language
+            example (str | None): Optional prompt with a highly relevant example plan
+
+        Returns:
+            Dict: "raw" and "wayang_plan" like Builder.generate_plan, plus "variant", "valid",
+            "latency" and "responses" with every response received before the winner
+
+        """
+
+        start = time.perf_counter()
+
+        async def run_variant(variant: Dict):
+            response = await builder.generate_plan(
+                prompt,
+                example=example,
+                model=variant["model"],
+                reasoning=variant["reasoning"],
+                temperature=variant["temperature"],
+            )
+            return variant, response
+
+        tasks = [asyncio.create_task(run_variant(variant)) for variant in self.variants]
+
+        responses = []
+        fallback = None
+        error = None
+
+        try:
+            for task in asyncio.as_completed(tasks):
+                try:
+                    variant, response = await task
+                except Exception as e:
+                    # A failing variant shouldn't stop the others
+                    print(f"[ERROR] Speculative variant failed: {e}")
+                    error = e
+                    continue
+
+                responses.append(response)
+
+                # Validate plan as soon as it arrives
+                if self._is_valid(response.get("wayang_plan")):
+                    return self._result(response, variant, True, responses, start)
+
+                # Keep the first plan in case none validates, so the debugger can fix it
+                if fallback is None:
+                    fallback = (response, variant)
+
+        finally:
+            # Cancel calls still running and wait for them to stop
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if fallback is None:
+            raise error or RuntimeError("No speculative variant returned a plan")
+
+        return self._result(fallback[0], fallback[1], False, responses, start)
+
+    def stats(self) -> Dict:
+        """
+        Get how often each variant won
+
+        Returns:
+            Dict: Runs and wins per variant
+
+        """
+
+        return {"runs": self.runs, "wins": dict(self.wins)}
+
+    def _is_valid(self, raw_plan) -> bool:
+        """
+        Helper function to map and validate a plan
+
+        Args:
+            raw_plan (WayangPlan): Plan from the Builder
+
+        Returns:
+            bool: True if the plan maps and validates
+
+        """
+
+        if raw_plan is None:
+            return False
+
+        try:
+            # UDFs are compiled later for the winner only
+            success, _ = self.plan_validator.validate_plan(self.plan_mapper.plan_to_json(raw_plan), compile_udfs=False)
+        except Exception:
+            return False
+
+        return success
+
+    def _result(self, response: Dict, variant: Dict, valid: bool, responses: List[Dict], start: float) -> Dict:
+        """
+        Helper function to build the result and count the winner
+
+        Args:
+            response (Dict): The chosen response
+            variant (Dict): The variant that produced it
+            valid (bool): If the plan validated
+            responses (List[Dict]): All responses received
+            start (float): Start time from time.perf_counter
+
+        Returns:
+            Dict: Result for the pipeline
+
+        """
+
+        self.runs += 1
+        if valid:
+            self.wins[variant["name"]] += 1
+
+        return {
+            **response,
+            "variant": variant["name"],
+            "valid": valid,
+            "latency": time.perf_counter() - start,
+            "responses": responses,
+        }
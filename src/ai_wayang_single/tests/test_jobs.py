@@ -0,0 +1,99 @@
+from ai_wayang_single.server.jobs import Job, JobRunner, JobStore
+from ai_wayang_single.server.session import Session, SessionRegistry
+import asyncio
+
+
+class FakePipeline:
+    """Goes through the stages of a query without agents or Wayang"""
+
+    async def run(self, session, query, model=None, reasoning=None, run_id=None):
+        session.stages = {}
+        session.set_phase("building")
+        await asyncio.sleep(0.05)
+        session.set_phase("executing")
+        await asyncio.sleep(0.05)
+        session.set_phase("done" if query != "fail" else "failed")
+        session.result = f"output of {query}"
+        return f"output of {query}"
+
+
+def make_runner(max_jobs_per_session=None):
+    sessions = SessionRegistry(lambda session_id: Session(session_id, builder=None, debugger=None), ttl=60, max_sessions=10)
+    return JobRunner(FakePipeline(), sessions, workers=2, max_jobs_per_session=max_jobs_per_session)
+
+
+def test_job_returns_immediately_and_reports_progress():
+    async def run():
+        runner = make_runner()
+        job = runner.submit("client-a", "count people")
+
+        assert runner.get(job.job_id, "client-a").status == "queued"
+
+        await asyncio.sleep(0.07)
+        running = job.status_info()
+
+        await runner.queue.join()
+        await runner.close()
+        return job, running
+
+    job, running = asyncio.run(run())
+
+    assert running["status"] == "running" and running["phase"] == "executing"
+    assert job.status == "done" and job.result == "output of count people"
+    assert set(job.status_info()["stages"]) == {"building", "executing"}
+
+
+def test_jobs_are_private_to_the_client():
+    async def run():
+        runner = make_runner()
+        job = runner.submit("client-a", "fail")
+        await runner.queue.join()
+        await runner.close()
+        return runner, job
+
+    runner, job = asyncio.run(run())
+
+    assert runner.get(job.job_id, "client-b") is None
+    assert runner.get(job.job_id, "client-a").status == "failed"
+
+
+def test_busy_client_doesnt_starve_others():
+    async def run():
+        runner = make_runner(max_jobs_per_session=4)
+        runner.sessions.get("client-a").result = "interactive result"
+        busy = [runner.submit("client-a", f"query {n}") for n in range(4)]
+        other = runner.submit("client-b", "count people")
+
+        await asyncio.sleep(0.05)
+        started = other.status
+
+        try:
+            runner.submit("client-a", "one too many")
+            limited = False
+        except ValueError:
+            limited = True
+
+        await runner.queue.join()
+        await runner.close()
+        return runner, busy, other, started, limited
+
+    runner, busy, other, started, limited = asyncio.run(run())
+
+    assert started == "running" and limited
+    assert other.finished_at < busy[1].finished_at # Not behind all of client-a's jobs
+    assert all(job.result == f"output of query {n}" for n, job in enumerate(busy))
+    assert runner.sessions.get("client-a").result == "interactive result"
+    assert runner.pending == {} and runner.unfinished == {}
+
+
+def test_store_evicts_finished_jobs_only():
+    store = JobStore(ttl=60, max_jobs=2)
+    finished, running = Job("a", "q1"), Job("a", "q2")
+    finished.finish("done")
+    store.add(finished)
+    store.add(running)
+
+    store.add(Job("a", "q3"))
+
+    assert finished.job_id not in store.jobs
+    assert running.job_id in store.jobs and len(store) == 2
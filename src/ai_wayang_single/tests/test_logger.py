@@ -0,0 +1,68 @@
+from ai_wayang_single.utils import logger as logger_module
+from ai_wayang_single.utils.log_reader import export_logs, read_logs
+from ai_wayang_single.utils.logger import Logger, LogWriter
+import glob
+import json
+import os
+import threading
+
+
+def test_concurrent_loggers_rebuild_per_query(tmp_path, monkeypatch):
+    monkeypatch.setitem(logger_module.LOG_CONFIG, "log_folder", str(tmp_path))
+    loggers = [Logger(session_id=f"session_{i}") for i in range(4)]
+
+    def log(logger):
+        for i in range(50):
+            logger.add_message(f"step {i}", {"step": i})
+
+    threads = [threading.Thread(target=log, args=(logger,)) for logger in loggers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    loggers[0].flush()
+
+    logs = read_logs(str(tmp_path))
+
+    assert set(logs) == {logger.log_name for logger in loggers}
+    for entries in logs.values():
+        assert [entry["id"] for entry in entries] == list(range(1, 51))
+        assert entries[-1]["log"] == {"step": 49}
+
+    assert len(read_logs(str(tmp_path), session_id="session_2")) == 1
+
+    paths = export_logs(str(tmp_path), str(tmp_path / "json"))
+    with open(paths[0], encoding="utf-8") as f:
+        assert json.load(f)[0]["title"] == "step 0"
+
+
+def test_writer_rotates_by_size(tmp_path):
+    writer = LogWriter(str(tmp_path), max_bytes=200, rotate_seconds=0, fsync_interval=0)
+
+    for i in range(20):
+        writer.write({"log_name": "log_a", "id": i + 1, "log": "x" * 50})
+        writer.flush()
+    writer.close()
+
+    assert len(glob.glob(os.path.join(tmp_path, "log_*.jsonl"))) > 1
+    assert [entry["id"] for entry in read_logs(str(tmp_path))["log_a"]] == list(range(1, 21))
+
+
+def test_writer_survives_failed_rotation(tmp_path, monkeypatch):
+    writer = LogWriter(str(tmp_path), max_bytes=0, rotate_seconds=0, fsync_interval=0)
+    writer.write({"log_name": "log_a", "id": 1, "log": "x"})
+    assert writer.flush()
+
+    # The old file is closed before the new one fails to open
+    writer.rotate_seconds = 1e-9
+    monkeypatch.setattr(logger_module, "open", lambda *args, **kwargs: 1 / 0, raising=False)
+    writer.write({"log_name": "log_a", "id": 2, "log": "x"})
+    assert writer.flush(timeout=5) and writer.thread.is_alive()
+
+    monkeypatch.undo()
+    writer.write({"log_name": "log_a", "id": 3, "log": "x"})
+    assert writer.flush(timeout=5)
+    writer.close()
+
+    assert not writer.flush(timeout=5)
+    assert [entry["id"] for entry in read_logs(str(tmp_path))["log_a"]] == [1, 3]
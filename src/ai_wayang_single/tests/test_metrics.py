@@ -0,0 +1,51 @@
+from ai_wayang_single.utils.metrics import Metric, count_tool_calls, metrics, start_metrics_server
+import asyncio
+import socket
+import urllib.request
+
+
+def test_histogram_is_exposed_with_cumulative_buckets():
+    latency = Metric("test_latency_seconds", "Test latency", ("backend",), buckets=(0.1, 1, 10))
+
+    for value in (0.05, 0.1, 0.5, 20):
+        latency.labels("http://wayang:8080").observe(value)
+
+    lines = latency.expose()
+
+    assert 'test_latency_seconds_bucket{backend="http://wayang:8080",le="0.1"} 2' in lines
+    assert 'test_latency_seconds_bucket{backend="http://wayang:8080",le="10.0"} 3' in lines
+    assert 'test_latency_seconds_bucket{backend="http://wayang:8080",le="+Inf"} 4' in lines
+    assert 'test_latency_seconds_count{backend="http://wayang:8080"} 4' in lines
+
+
+def test_failure_messages_count_as_tool_errors():
+    @count_tool_calls
+    async def test_tool(msg):
+        return msg
+
+    asyncio.run(test_tool("Couldn't execute wayang plan succesfully"))
+    asyncio.run(test_tool("An error occured, explain for the user: boom"))
+    asyncio.run(test_tool("navn,alder"))
+
+    assert metrics.tool_calls.labels("test_tool", "error").value == 2
+    assert metrics.tool_calls.labels("test_tool", "ok").value == 1
+
+
+def test_metrics_endpoint_serves_registry():
+    metrics.queries.labels(200).inc()
+    server = start_metrics_server(port=_free_port(), host="127.0.0.1")
+
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+
+    assert "# TYPE wayang_queries_total counter" in body
+    assert 'wayang_queries_total{status_code="200"}' in body
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
@@ -0,0 +1,50 @@
+from ai_wayang_single.llm.models import WayangOperation
+from ai_wayang_single.utils.output_retention import OutputRetention
+from ai_wayang_single.wayang.operator_mapper import OperatorMapper
+import os
+import time
+
+
+def output_operation():
+    return WayangOperation(cat="output", id=3, input=[2], operatorName="textFileOutput")
+
+
+def test_concurrent_runs_get_distinct_files(tmp_path):
+    config = {"output_folder": str(tmp_path), "partition_by_run": "False"}
+
+    # Mapped within the same second
+    names = {OperatorMapper(output_operation()).textfile_output(config, "session_1")["data"]["filename"] for _ in range(100)}
+
+    assert len(names) == 100
+    assert all("_session_1_" in name for name in names)
+
+
+def test_output_partitioned_per_run(tmp_path):
+    config = {"output_folder": str(tmp_path), "partition_by_run": "True"}
+
+    filename = OperatorMapper(output_operation()).textfile_output(config, "job/42")["data"]["filename"]
+
+    assert "/run_job_42/output_" in filename
+    assert os.path.isdir(tmp_path / "run_job_42")
+
+
+def test_retention_deletes_old_and_oversized_outputs(tmp_path):
+    now = time.time()
+
+    def make(name, size, age):
+        path = tmp_path / name
+        path.write_bytes(b"x" * size)
+        os.utime(path, (now - age, now - age))
+        return path
+
+    expired = make("output_old.txt", 10, 7200)
+    oldest = make("output_a.txt", 100, 600)
+    newer = make("output_b.txt", 100, 300)
+    fresh = make("output_c.txt", 100, 1)
+    other = make("schema.json", 10, 7200)
+
+    retention = OutputRetention(str(tmp_path), max_age=3600, max_bytes=250, interval=0)
+
+    assert retention.cleanup() == 2
+    assert not expired.exists() and not oldest.exists()
+    assert newer.exists() and fresh.exists() and other.exists()
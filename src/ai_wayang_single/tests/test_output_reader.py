@@ -0,0 +1,52 @@
+from ai_wayang_single.utils.output_reader import OutputFileReader, OutputReaderCache, plan_output_files
+import pytest
+
+
+def write_file(path, count):
+    path.write_text("".join(f"row {i}\n" for i in range(count)))
+    return str(path)
+
+
+def test_reader_pages_and_counts_lines(tmp_path):
+    reader = OutputFileReader(write_file(tmp_path / "output.txt", 5000), block_size=256)
+
+    assert reader.line_count == 5000
+    assert reader.lines(4095, 2) == ["row 4095", "row 4096"]
+    assert reader.tail(1) == ["row 4999"]
+
+    sample = reader.sample(5, seed=1)
+    assert len(sample) == 5 and sample == sorted(sample, key=lambda line: int(line.split()[1]))
+    reader.close()
+
+
+def test_lines_found_across_block_boundaries(tmp_path):
+    # Lines are 6 to 8 bytes, so many lines start right at or after a block boundary
+    reader = OutputFileReader(write_file(tmp_path / "output.txt", 300), block_size=7)
+
+    assert [reader.lines(i, 1)[0] for i in range(300)] == [f"row {i}" for i in range(300)]
+    reader.close()
+
+
+def test_cache_rebuilds_reader_when_file_changes(tmp_path):
+    path = tmp_path / "output.txt"
+    cache = OutputReaderCache()
+
+    first = cache.get(write_file(path, 3))
+    assert cache.get(str(path)) is first
+
+    write_file(path, 10)
+    assert cache.get(str(path)).line_count == 10
+
+    # The replaced reader is closed, reads of a request still holding it fail cleanly
+    with pytest.raises(ValueError):
+        first.lines(0, 1)
+    assert cache.get(str(path)).sample(-1) == []
+
+
+def test_output_files_found_in_plan():
+    plan = {"operators": [
+        {"operatorName": "map", "data": {}},
+        {"operatorName": "textFileOutput", "data": {"filename": "file:///tmp/my%20out/output_1.txt"}},
+    ]}
+
+    assert plan_output_files(plan) == ["/tmp/my out/output_1.txt"]
@@ -0,0 +1,76 @@
+import json
+from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.utils.plan_cache import PlanCache
+
+plan = WayangPlan(
+    operations=[
+        {"cat": "input", "id": 1, "output": [2], "operatorName": "jdbcRemoteInput", "table": "person_test", "columnNames": ["navn"]},
+        {"cat": "unary", "id": 2, "input": [1], "operatorName": "map", "udf": "(r: org.apache.wayang.basic.data.Record) => r.getField(0).toString"},
+    ],
+    thoughts="Select names",
+)
+
+
+def make_cache(tmp_path, max_entries=10):
+    schema_folder = tmp_path / "schemas"
+    schema_folder.mkdir()
+    (schema_folder / "person_test.json").write_text(json.dumps({"person_test": {}}))
+    return PlanCache(cache_path=str(tmp_path / "cache.db"), schema_folder=schema_folder, max_entries=max_entries)
+
+
+def test_cache_hit_after_put(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("Names of  all persons", "gpt-5-nano", None, "system prompt")
+
+    assert cache.get(key) is None
+    cache.put(key, "Names of all persons", plan)
+
+    # Case and whitespace are normalized
+    assert cache.get(cache.make_key("names of all persons", "gpt-5-nano", None, "system prompt")) == plan
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_quoted_values_keep_their_case(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("Persons where navn = 'ALICE'", "m", None, "p")
+
+    assert key != cache.make_key("Persons where navn = 'alice'", "m", None, "p")
+    assert key != cache.make_key('Persons where navn = "ALICE"', "m", None, "p")
+    assert key == cache.make_key("persons  where navn = 'ALICE' ", "m", None, "p")
+    assert cache.make_key("Persons who aren't named 'ALICE'", "m", None, "p") != cache.make_key("Persons who aren't named 'alice'", "m", None, "p")
+
+
+def test_key_depends_on_model_and_prompt(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("q", "gpt-5-nano", None, "system prompt")
+
+    assert key != cache.make_key("q", "gpt-5", None, "system prompt")
+    assert key != cache.make_key("q", "gpt-5-nano", "high", "system prompt")
+    assert key != cache.make_key("q", "gpt-5-nano", None, "other system prompt")
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    keys = [cache.make_key(f"q{i}", "m", None, "p") for i in range(3)]
+
+    cache.put(keys[0], "q0", plan)
+    cache.put(keys[1], "q1", plan)
+    cache.get(keys[0])
+    cache.put(keys[2], "q2", plan)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_schema_change_invalidates_cache(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.make_key("q", "m", None, "p")
+    cache.put(key, "q", plan)
+
+    (tmp_path / "schemas" / "adresse_test.json").write_text("{}")
+
+    assert cache.get(key) is not None # Schema files aren't walked on every lookup
+    assert cache.refresh_schemas() and not cache.refresh_schemas()
+    assert cache.get(key) is None
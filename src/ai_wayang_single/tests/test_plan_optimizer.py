@@ -0,0 +1,182 @@
+from ai_wayang_single.wayang.plan_optimizer import RECORD_UDF, TABLE_QUERY, PlanOptimizer
+import json
+import re
+
+
+PERSONS = [
+    {"id": 1, "navn": "Mette", "alder": 41, "bynavn": "Odense", "email": "m@x.dk"},
+    {"id": 2, "navn": "Anders", "alder": 29, "bynavn": "Aarhus", "email": "a@x.dk"},
+    {"id": 3, "navn": "Sofie", "alder": 35, "bynavn": "Aalborg", "email": "s@x.dk"},
+    {"id": 4, "navn": "Lars", "alder": 52, "bynavn": "Aarhus", "email": "l@x.dk"},
+]
+
+
+def operator(op_id, cat, name, inputs, outputs, **data):
+    return {"id": op_id, "cat": cat, "operatorName": name, "input": inputs, "output": outputs, "data": data}
+
+
+def schema_folder(tmp_path, **types):
+    """Schema folder with the person table and the given column types"""
+    (tmp_path / "tables").mkdir()
+    columns = {column: {"type": column_type} for column, column_type in types.items()}
+    (tmp_path / "tables" / "person.json").write_text(json.dumps({"person": {"columns": columns}}))
+    return tmp_path
+
+
+def jdbc_plan(*filters):
+    """jdbcRemoteInput on persons, the given filters in a row, a map and an output"""
+    operators = [operator(1, "input", "jdbcRemoteInput", [], [2], table="(SELECT navn, alder, bynavn FROM person) as X", columnNames=["navn", "alder", "bynavn"])]
+    for op_id, udf in enumerate(filters, start=2):
+        operators.append(operator(op_id, "unary", "filter", [op_id - 1], [op_id + 1], udf=udf))
+    last = len(operators) + 1
+    operators.append(operator(last, "unary", "map", [last - 1], [last + 1], udf="(r: org.apache.wayang.basic.data.Record) => r.getField(0).toString"))
+    operators.append(operator(last + 1, "output", "textFileOutput", [last], [], filename="file:///out.txt"))
+    return {"context": {"platforms": ["java"], "configuration": {}}, "operators": operators}
+
+
+def test_filters_are_pushed_into_sql_and_removed():
+    plan = jdbc_plan(
+        "(r: org.apache.wayang.basic.data.Record) => r.getField(1).asInstanceOf[Int] > 30",
+        "(r: org.apache.wayang.basic.data.Record) => (r.getField(2).asInstanceOf[String] == \"O'Hare\") && 50 >= r.getField(1).asInstanceOf[Int]",
+    )
+
+    optimized, rewrites = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=False).optimize(plan)
+    source, mapper = optimized["operators"][0], optimized["operators"][1]
+
+    assert source["data"]["table"] == "(SELECT navn, alder, bynavn FROM person WHERE alder > 30 AND bynavn = 'O''Hare' AND (alder <= 50 OR alder IS NULL)) as X"
+    assert [op["operatorName"] for op in optimized["operators"]] == ["jdbcRemoteInput", "map", "textFileOutput"]
+    assert source["output"] == [4] and mapper["input"] == [1]
+    assert len(rewrites) == 2 and len(plan["operators"]) == 5 # Original plan is untouched
+
+
+def test_nulls_and_strings_keep_scala_semantics(tmp_path):
+    plan = jdbc_plan(
+        "(r: org.apache.wayang.basic.data.Record) => r.getField(1).asInstanceOf[Int] < 18 && r.getField(0).toString >= \"M\" && r.getField(2).asInstanceOf[String].startsWith(\"50%\")"
+    )
+
+    schemas = schema_folder(tmp_path, navn="character varying", alder="integer", bynavn="text")
+    optimized, _ = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=False, schema_folder=schemas).optimize(plan)
+
+    assert optimized["operators"][0]["data"]["table"] == (
+        "(SELECT navn, alder, bynavn FROM person WHERE (alder < 18 OR alder IS NULL)"
+        " AND CAST(navn AS TEXT) COLLATE \"C\" >= 'M' AND bynavn LIKE '50\\%%' ESCAPE '\\') as X"
+    )
+
+
+def test_to_string_is_pushed_only_for_known_column_types(tmp_path):
+    schemas = schema_folder(tmp_path, navn="character varying", alder="double precision", bynavn="character")
+    plan = jdbc_plan(
+        "(r: org.apache.wayang.basic.data.Record) => r.getField(0).toString == \"Mette\" && r.getField(1).toString == \"41\" && r.getField(2).asInstanceOf[String] == \"Aarhus\""
+    )
+
+    optimized, _ = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=False, schema_folder=schemas).optimize(plan)
+    unknown, _ = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=False).optimize(plan)
+
+    assert optimized["operators"][0]["data"]["table"] == "(SELECT navn, alder, bynavn FROM person WHERE CAST(navn AS TEXT) = 'Mette') as X"
+    assert optimized["operators"][1] == plan["operators"][1] # Filter kept for the other conditions
+    assert unknown["operators"][0]["data"]["table"] == "(SELECT navn, alder, bynavn FROM person WHERE bynavn = 'Aarhus') as X"
+
+
+def test_untranslatable_conditions_keep_the_filter():
+    partial = jdbc_plan("(r: org.apache.wayang.basic.data.Record) => r.getField(1).asInstanceOf[Int] != 0 && r.getField(0).toString.length > 3")
+    either = jdbc_plan("(r: org.apache.wayang.basic.data.Record) => r.getField(1).asInstanceOf[Int] > 1 || r.getField(1).asInstanceOf[Int] < 0")
+
+    optimizer = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=False)
+    kept, kept_rewrites = optimizer.optimize(partial)
+    unchanged, unchanged_rewrites = optimizer.optimize(either)
+
+    assert kept["operators"][0]["data"]["table"] == "(SELECT navn, alder, bynavn FROM person WHERE alder <> 0) as X"
+    assert kept["operators"][1] == partial["operators"][1] and len(kept_rewrites) == 1
+    assert unchanged == either and unchanged_rewrites == []
+    assert optimizer.stats() == {"predicate_pushdown": 1}
+
+
+def python_udf(udf):
+    """Runs the few Scala record UDFs used here as Python, records being tuples"""
+    match = RECORD_UDF.match(udf)
+    body = re.sub(r"\.asInstanceOf\[\w+\]", "", match["body"]).replace(".toString", "").replace("&&", " and ")
+    body = re.sub(r"\.getField\((\d+)\)", r"[\1]", body)
+    return eval(f"lambda {match['var']}: {body}")
+
+
+def run_plan(plan, tables):
+    """Stand-in for Wayang on a plan without SQL WHERE and with ids in topological order"""
+    rows, result = {}, None
+    for op in sorted(plan["operators"], key=lambda op: op["id"]):
+        data, name = op["data"], op["operatorName"]
+        source = rows[op["input"][0]] if op["input"] else None
+        if name == "jdbcRemoteInput":
+            table = TABLE_QUERY.match(data["table"])["table"]
+            rows[op["id"]] = [tuple(row[column] for column in data["columnNames"]) for row in tables[table]]
+        elif name == "filter":
+            rows[op["id"]] = [row for row in source if python_udf(data["udf"])(row)]
+        elif name == "sort":
+            rows[op["id"]] = sorted(source, key=python_udf(data["keyUdf"]))
+        elif name == "map":
+            rows[op["id"]] = [python_udf(data["udf"])(row) for row in source]
+        elif name == "textFileOutput":
+            result = source
+    return result
+
+
+def person_plan(*readers):
+    """jdbcRemoteInput selecting all person columns, then the given operators in a row and an output"""
+    columns = list(PERSONS[0])
+    operators = [operator(1, "input", "jdbcRemoteInput", [], [2], table=f"(SELECT {', '.join(columns)} FROM person) as X", columnNames=columns)]
+    for op_id, (name, key, udf) in enumerate(readers, start=2):
+        operators.append(operator(op_id, "unary", name, [op_id - 1], [op_id + 1], **{key: udf}))
+    last = len(operators) + 1
+    operators.append(operator(last, "output", "textFileOutput", [last - 1], [], filename="file:///out.txt"))
+    return {"operators": operators}
+
+
+def test_unused_columns_are_pruned_with_the_same_result():
+    plan = person_plan(
+        ("filter", "udf", "(r: org.apache.wayang.basic.data.Record) => r.getField(2).asInstanceOf[Int] > 30"),
+        ("sort", "keyUdf", "(r: org.apache.wayang.basic.data.Record) => r.getField(3).toString"),
+        ("map", "udf", "(r: org.apache.wayang.basic.data.Record) => (r.getField(1).asInstanceOf[String], r.getField(3).toString)"),
+    )
+
+    optimized, rewrites = PlanOptimizer(use_predicate_pushdown=False, use_projection_pruning=True).optimize(plan)
+    source = optimized["operators"][0]
+
+    assert source["data"]["columnNames"] == ["navn", "alder", "bynavn"]
+    assert source["data"]["table"] == "(SELECT navn, alder, bynavn FROM person) as X"
+    assert optimized["operators"][3]["data"]["udf"].endswith("(r.getField(0).asInstanceOf[String], r.getField(2).toString)")
+    assert rewrites == ["Operation id 1: Removed unused columns ['id', 'email']"]
+    assert run_plan(optimized, {"person": PERSONS}) == run_plan(plan, {"person": PERSONS}) == [("Sofie", "Aalborg"), ("Lars", "Aarhus"), ("Mette", "Odense")]
+
+
+def test_whole_records_are_not_pruned():
+    optimizer = PlanOptimizer(use_predicate_pushdown=False, use_projection_pruning=True)
+    written = person_plan(("filter", "udf", "(r: org.apache.wayang.basic.data.Record) => r.getField(2).asInstanceOf[Int] > 30"))
+    returned = person_plan(("map", "udf", "(r: org.apache.wayang.basic.data.Record) => { r.setField(0, 0); r }"))
+
+    # Without an output folder the output is dropped and Wayang returns the records of the last operator
+    final = person_plan(("sort", "keyUdf", "(r: org.apache.wayang.basic.data.Record) => r.getField(2)"))
+    final["operators"] = final["operators"][:-1]
+    final["operators"][-1]["output"] = []
+
+    assert optimizer.optimize(written) == (written, [])
+    assert optimizer.optimize(returned) == (returned, [])
+    assert optimizer.optimize(final) == (final, [])
+
+
+def test_columns_of_pushed_filters_are_pruned():
+    plan = person_plan(
+        ("filter", "udf", "(r: org.apache.wayang.basic.data.Record) => r.getField(2).asInstanceOf[Int] >= 35"),
+        ("map", "udf", "(r: org.apache.wayang.basic.data.Record) => r.getField(1).toString"),
+    )
+
+    optimized, _ = PlanOptimizer(use_predicate_pushdown=True, use_projection_pruning=True).optimize(plan)
+
+    assert optimized["operators"][0]["data"]["table"] == "(SELECT navn FROM person WHERE alder >= 35) as X"
+    assert optimized["operators"][1]["data"]["udf"] == "(r: org.apache.wayang.basic.data.Record) => r.getField(0).toString"
+
+
+def test_off_by_default_and_only_sql_errors_blame_a_rewrite():
+    optimizer = PlanOptimizer()
+
+    assert not optimizer.use_predicate_pushdown and not optimizer.use_projection_pruning
+    assert optimizer.may_have_failed("org.postgresql.util.PSQLException: ERROR: operator does not exist: text > integer")
+    assert not optimizer.may_have_failed("java.lang.ClassCastException: java.lang.String cannot be cast to java.lang.Integer")
@@ -0,0 +1,65 @@
+from ai_wayang_single.llm.models import WayangOperation, WayangPlan
+from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_repairer import PlanRepairer
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+
+
+def operation(op_id, cat, name, inputs, outputs, **fields):
+    return WayangOperation(id=op_id, cat=cat, operatorName=name, input=inputs, output=outputs, **fields)
+
+
+def test_ids_are_renumbered_in_topological_order():
+    plan = WayangPlan(operations=[
+        operation(3, "unary", "map", [7], [5], udf="(s: String) => s"),
+        operation(7, "input", "textFileInput", [], [3], inputFileName="people"),
+        operation(5, "output", "textFileOutput", [3], []),
+    ])
+
+    repaired, fixes = PlanRepairer().repair(plan)
+
+    assert [(op.id, op.operatorName, op.input, op.output) for op in repaired.operations] == [
+        (1, "textFileInput", [], [2]),
+        (2, "map", [1], [3]),
+        (3, "textFileOutput", [2], []),
+    ]
+    assert fixes and plan.operations[0].id == 3 # Original plan is untouched
+
+
+def test_outputs_are_rebuilt_from_inputs():
+    plan = WayangPlan(operations=[
+        operation(1, "input", "textFileInput", [], [], inputFileName="file:///data/people.txt"),
+        operation(2, "unary", "filter", [1], [4], udf="(s: String) => true"),
+        operation(3, "output", "textFileOutput", [2], []),
+    ])
+
+    repaired, fixes = PlanRepairer().repair(plan)
+
+    assert [op.output for op in repaired.operations] == [[2], [3], []]
+    assert repaired.operations[0].inputFileName == "people"
+    assert "Operation id 2: Output ids set to [3]" in fixes
+
+
+def test_repaired_plan_validates(tmp_path):
+    config = {
+        "input_config": {"input_folder": str(tmp_path)},
+        "output_config": {"output_folder": str(tmp_path), "partition_by_run": "False"},
+    }
+    plan = WayangPlan(operations=[
+        operation(1, "unary", "textFileInput", [], [2], inputFileName="people"),
+        operation(2, "unary", "map", [], [3], udf="(s: String) => s.toUpperCase"),
+        operation(3, "output", "textFileOutput", [2], []),
+    ])
+    mapper, validator, repairer = PlanMapper(config), PlanValidator(), PlanRepairer()
+
+    assert not validator.validate_plan(mapper.plan_to_json(plan))[0]
+
+    repaired, fixes = repairer.repair(plan)
+    valid, errors = validator.validate_plan(mapper.plan_to_json(repaired))
+    repairer.record(valid)
+
+    assert valid, errors
+    assert repairer.stats() == {"attempts": 1, "repaired": 1, "llm_calls_saved": 1}
+
+    # Without the Debugger a repair saves no call
+    repairer.record(valid, saves_call=False)
+    assert repairer.stats() == {"attempts": 2, "repaired": 2, "llm_calls_saved": 1}
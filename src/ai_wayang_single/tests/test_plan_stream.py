@@ -0,0 +1,82 @@
+from ai_wayang_single.llm.agent_builder import Builder
+from ai_wayang_single.llm.plan_stream import OperationStreamParser
+from ai_wayang_single.server.pipeline import QueryPipeline
+from ai_wayang_single.wayang.plan_mapper import PlanMapper
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+from types import SimpleNamespace
+import asyncio
+import json
+
+
+PLAN = json.dumps({
+    "operations": [
+        {"cat": "input", "id": 1, "input": [], "output": [2], "operatorName": "jdbcRemoteInput", "table": "person", "columnNames": ["name"]},
+        {"cat": "unary", "id": 2, "input": [1], "output": [3], "operatorName": "map", "udf": "(r: Record) => { \"}\" + r.getString(0) }"},
+        {"cat": "unary", "id": 3, "input": [1], "output": [], "operatorName": "teleport"},
+    ],
+    "thoughts": "Done",
+})
+
+
+def chunks(text, size=7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def test_parser_returns_operations_as_they_complete():
+    parser = OperationStreamParser()
+    completed_at = []
+
+    for n, chunk in enumerate(chunks(PLAN)):
+        for operation in parser.feed(chunk):
+            completed_at.append((n, operation.id))
+
+    # Operations arrive one by one, braces in UDF strings are ignored
+    assert [op_id for _, op_id in completed_at] == [1, 2, 3]
+    assert completed_at[0][0] < completed_at[1][0] < completed_at[2][0]
+    assert parser.operations[1].udf.startswith("(r: Record) => {")
+    assert parser.done
+
+
+class FakeStream:
+    def __init__(self, deltas):
+        self.deltas = deltas
+        self.sent = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+    async def __aiter__(self):
+        for delta in self.deltas:
+            self.sent += 1
+            yield SimpleNamespace(type="response.output_text.delta", delta=delta)
+
+
+def test_stream_aborted_at_first_invalid_operator():
+    stream = FakeStream(chunks(PLAN))
+    client = SimpleNamespace(responses=SimpleNamespace(stream=lambda **params: stream))
+    builder = Builder(system_prompt="You build plans", client=client)
+
+    check = lambda operation: ["Unknown operatorName"] if operation.operatorName == "teleport" else []
+    response = asyncio.run(builder.stream_plan("Names of all people", check))
+
+    assert response["aborted"] and response["raw"] is None
+    assert [op.id for op in response["wayang_plan"].operations] == [1, 2, 3]
+    assert stream.sent < len(stream.deltas)
+
+
+def test_stream_check_skips_output_without_output_folder():
+    config = {"input_config": {"jdbc_uri": "jdbc:postgresql://db/test", "jdbc_username": "u", "jdbc_password": "p"}, "output_config": {"output_folder": None}}
+    pipeline = QueryPipeline(PlanMapper(config), PlanValidator(), wayang_executor=None)
+    plan = json.dumps({"operations": [
+        {"cat": "input", "id": 1, "input": [], "output": [2], "operatorName": "jdbcRemoteInput", "table": "person", "columnNames": ["name"]},
+        {"cat": "unary", "id": 2, "input": [1], "output": [3], "operatorName": "map", "udf": "(r: Record) => r.getField(0).toString"},
+        {"cat": "output", "id": 3, "input": [2], "output": [], "operatorName": "textFileOutput"},
+    ]})
+
+    parser, check = OperationStreamParser(), pipeline._operator_checker()
+    errors = [error for chunk in chunks(plan) for operation in parser.feed(chunk) for error in check(operation)]
+
+    assert [op.id for op in parser.operations] == [1, 2, 3] and errors == []
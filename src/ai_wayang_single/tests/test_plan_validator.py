@@ -0,0 +1,76 @@
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+import time
+
+
+def operator(op_id, cat, name, inputs, outputs, **data):
+    return {"id": op_id, "cat": cat, "operatorName": name, "input": inputs, "output": outputs, "data": data}
+
+
+def chain(length):
+    """Input, length - 2 maps and an output, all linked both ways"""
+    operators = [operator(1, "input", "textFileInput", [], [2], filename="file:///in.txt")]
+    for op_id in range(2, length):
+        operators.append(operator(op_id, "unary", "map", [op_id - 1], [op_id + 1], udf="(s: String) => s"))
+    operators.append(operator(length, "output", "textFileOutput", [length - 1], [], filename="file:///out.txt"))
+    return {"operators": operators}
+
+
+def test_valid_plan_passes():
+    assert PlanValidator().validate_plan(chain(5)) == (True, [])
+
+
+def test_graph_errors_are_reported_per_operator():
+    plan = chain(5)
+    operators = plan["operators"]
+    operators[1]["output"] = [4] # Disagrees with 3's input
+    operators[2]["data"]["udf"] = None
+    operators.append(operator(6, "unary", "sort", [9], [], keyUdf="(s: String) => s"))
+    operators.append(operator(6, "unary", "map", [5], [], udf="(s: String) => s"))
+
+    valid, errors = PlanValidator().validate_plan(plan)
+
+    assert not valid
+    assert "Operation id 2: Output ids must include 3, which has 2 as input" in errors
+    assert "Operation id 4: Input ids must include 2, which has 4 as output" in errors
+    assert "Operation id 3: map is missing udf" in errors
+    assert "Operation id 6: Input id 9 doesn't exist" in errors
+    assert "Operation id 6: Duplicate operation id" in errors
+    assert "Operation id 6: Not reachable from an input operator" in errors
+    assert "Operation id 6: Doesn't lead to an output operator" in errors
+
+
+def test_cycle_is_found():
+    plan = chain(4)
+    # Ids out of order are reported on their own, the cycle by the graph check
+    plan["operators"][1]["input"] = [1, 3]
+    plan["operators"][1]["cat"] = "binary"
+    plan["operators"][1]["operatorName"] = "join"
+    plan["operators"][1]["data"] = {"thisKeyUdf": "k", "thatKeyUdf": "k"}
+    plan["operators"][2]["output"] = [2, 4]
+
+    _, errors = PlanValidator().validate_plan(plan)
+
+    assert "Plan: Cycle between operation ids [2, 3]" in errors
+
+
+def test_plan_without_output_operator_needs_one_final_operator():
+    plan = chain(4)
+    plan["operators"].pop()
+    plan["operators"][-1]["output"] = []
+    assert PlanValidator().validate_plan(plan) == (True, [])
+
+    plan["operators"].append(operator(4, "unary", "map", [1], [], udf="(s: String) => s"))
+    plan["operators"][0]["output"] = [2, 4]
+    _, errors = PlanValidator().validate_plan(plan)
+    assert errors == ["Plan: Missing output operator, operation ids [3, 4] are all final but only one result can be returned"]
+
+
+def test_validation_is_linear():
+    validator = PlanValidator()
+
+    start = time.perf_counter()
+    assert validator.validate_plan(chain(20_000))[0]
+    elapsed = time.perf_counter() - start
+
+    # Quadratic checks would take minutes at this size
+    assert elapsed < 2
@@ -0,0 +1,45 @@
+from ai_wayang_single.llm.prompt_loader import PromptLoader, PromptTemplate
+
+
+def test_template_fills_placeholders_once():
+    template = PromptTemplate("Data: {data}\nOperators: {operators}")
+
+    # Inserted values are not filled again, unknown placeholders are kept
+    filled = template.render(data="uses {operators}", examples="unused")
+
+    assert filled == "Data: uses {operators}\nOperators: {operators}"
+
+
+def test_system_prompt_is_cached_across_loaders():
+    first = PromptLoader().load_builder_system_prompt()
+    second = PromptLoader().load_builder_system_prompt()
+
+    assert first is second
+    assert "{data}" not in first and "{examples}" not in first
+
+
+def test_file_reloaded_when_changed(tmp_path):
+    prompt_file = tmp_path / "prompt.txt"
+    prompt_file.write_text("Hello {name}")
+
+    loader = PromptLoader()
+    loader.reload_interval = 0
+
+    assert loader._read_template(tmp_path, "prompt.txt").render(name="Wayang") == "Hello Wayang"
+
+    prompt_file.write_text("Goodbye {name}")
+    prompt_file.touch()
+
+    assert loader._read_template(tmp_path, "prompt.txt").render(name="Wayang") == "Goodbye Wayang"
+
+
+def test_cache_layout_shares_prefix_across_queries():
+    loader = PromptLoader()
+    loader.layout = "cache"
+
+    first = loader.load_builder_messages("Find all people older than 30")
+    second = loader.load_builder_messages("Count orders per customer")
+
+    # Static instructions come first and are identical for every query
+    assert first[0]["content"] is second[0]["content"]
+    assert "{operators}" not in first[0]["content"]
@@ -0,0 +1,52 @@
+import json
+from ai_wayang_single.llm.retrieval import BM25Index, FewShotIndex, SchemaRetriever, tokenize
+
+person = {"person_test": {"input_type": "jdbc_input", "columns": {"navn": {"type": "text", "examples": ["Maria"]}, "alder": {"type": "integer", "examples": ["27"]}}}}
+adresse = {"adresse_test": {"input_type": "jdbc_input", "columns": {"person_id": {"type": "integer", "examples": ["3"]}, "by": {"type": "text", "examples": ["Aarhus"]}}}}
+names = {"names": {"input_type": "textfile_input", "examples_lines_from_file": ["Maria", "Christian"]}}
+
+
+def test_tokenize_splits_names():
+    assert tokenize("person_id createdAt") == ["person_id", "person", "id", "createdat", "created", "at"]
+
+
+def test_bm25_ranks_matching_documents_first():
+    index = BM25Index(["person names and ages", "person addresses", "word counts"])
+
+    ranked = index.search("person names", k=3)
+
+    # Only matching documents are returned, best first
+    assert [i for i, _ in ranked] == [0, 1]
+
+
+def test_schema_retriever_selects_relevant_schemas():
+    retriever = SchemaRetriever([person, adresse], [names])
+
+    selected = retriever.select("cities in adresse_test for each person_id", k=1)
+
+    assert selected["tables"] == [json.dumps(adresse, separators=(",", ":"))]
+    assert selected["text_files"] == []
+
+
+def make_example(query, plan_size=100):
+    return f"** User query: **\n{query}\n\n** Wayang Plan: **\n" + "x" * plan_size
+
+
+def test_few_shot_index_selects_similar_examples_within_budget():
+    examples = [
+        make_example("Count words in the text file names"),
+        make_example("Names of persons with at least two adresses", plan_size=4000),
+        make_example("Names of persons living at the same postal code"),
+    ]
+    index = FewShotIndex(examples)
+
+    # The best match is too large for the budget, so the next best is used
+    selected = index.select("names of persons with two adresses", k=1, token_budget=500)
+
+    assert selected == [examples[2]]
+
+
+def test_few_shot_index_falls_back_to_smallest_example():
+    examples = [make_example("Count words", plan_size=400), make_example("Join tables", plan_size=40)]
+
+    assert FewShotIndex(examples).select("something unrelated", k=2, token_budget=500) == [examples[1]]
@@ -0,0 +1,86 @@
+from ai_wayang_single.llm.models import WayangPlan
+from ai_wayang_single.utils.semantic_cache import HashingEmbedder, SemanticPlanIndex
+
+plan = WayangPlan(
+    operations=[{"cat": "input", "id": 1, "operatorName": "jdbcRemoteInput", "table": "person_test", "columnNames": ["navn", "alder"]}],
+    thoughts="Names of persons",
+)
+
+
+def make_index(max_entries=100):
+    return SemanticPlanIndex(HashingEmbedder(dim=512), max_entries=max_entries)
+
+
+def test_rephrased_query_is_most_similar():
+    index = make_index()
+    index.add("names of people older than 30", plan)
+    index.add("count the words in my_textfile", plan.model_copy(update={"thoughts": "Word count"}))
+
+    score, query, found = index.search("Names of all people that are older than 30", threshold=0.5)
+
+    assert query == "names of people older than 30"
+    assert found.thoughts == "Names of persons"
+
+
+def test_search_respects_threshold():
+    index = make_index()
+    index.add("names of people older than 30", plan)
+
+    assert index.search("count the words in my_textfile", threshold=0.5) is None
+
+
+def test_same_literals():
+    index = make_index()
+
+    assert index.same_literals("people older than 30", "persons above 30")
+    assert not index.same_literals("people older than 30", "people older than 40")
+
+
+def test_index_recycles_oldest_rows_when_full():
+    index = make_index(max_entries=2)
+
+    for query in ["first query", "second query", "third query"]:
+        index.add(query, plan)
+
+    assert len(index) == 2
+    assert "first query" not in index.queries
+    assert index.search("third query")[1] == "third query"
+
+
+def test_negated_query_is_similar_but_not_the_same():
+    index = make_index()
+    index.add("names of people older than 30", plan)
+
+    score, query, _ = index.search("names of people not older than 30")
+
+    assert score >= 0.9 # Above the default reuse threshold
+    assert not index.same_constraints("names of people not older than 30", query)
+    assert not index.same_constraints("names of people who aren't older than 30", query)
+    assert not index.same_constraints("names of people younger than 30", query)
+    assert index.same_constraints("Names of people older than 30 ", query)
+
+
+def test_query_for_other_columns_is_similar_but_not_the_same():
+    index = make_index()
+    index.add("names of people older than 30 from person_test", plan)
+
+    score, query, _ = index.search("ages of people older than 30 from person_test")
+
+    assert score >= 0.9 # Above the default reuse threshold
+    assert index.same_constraints("ages of people older than 30 from person_test", query)
+    assert not index.same_content("ages of people older than 30 from person_test", query)
+    assert not index.same_content("names of people older than 30 from person", query)
+    assert index.same_content("Show the names of all people older than 30 from person_test", query)
+
+
+def test_removed_query_is_not_found():
+    index = make_index()
+    for query in ["first query", "second query", "third query"]:
+        index.add(query, plan)
+
+    assert index.remove("FIRST query") and not index.remove("first query")
+    assert len(index) == 2 and index.search("first query")[1] != "first query"
+    assert index.search("third query")[1] == "third query"
+
+    index.clear()
+    assert len(index) == 0 and index.search("third query") is None
@@ -0,0 +1,34 @@
+from ai_wayang_single.server.session import Session, SessionRegistry
+
+
+def make_session(session_id):
+    return Session(session_id, builder=None, debugger=None)
+
+
+def test_registry_returns_same_session_per_client():
+    registry = SessionRegistry(make_session, ttl=60, max_sessions=10)
+
+    first = registry.get("client-a")
+    first.result = "a's result"
+
+    assert registry.get("client-a") is first
+    assert registry.get("client-b").result == "Nothing to output"
+
+
+def test_registry_evicts_idle_sessions():
+    registry = SessionRegistry(make_session, ttl=60, max_sessions=10)
+
+    registry.get("client-a").last_active -= 120
+    registry.get("client-b")
+
+    assert "client-a" not in registry.sessions
+    assert len(registry) == 1
+
+
+def test_registry_bounded_by_max_sessions():
+    registry = SessionRegistry(make_session, ttl=60, max_sessions=2)
+
+    for client in ["a", "b", "c"]:
+        registry.get(client)
+
+    assert list(registry.sessions) == ["b", "c"]
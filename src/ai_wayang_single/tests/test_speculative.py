@@ -0,0 +1,62 @@
+from ai_wayang_single.server.speculative import SpeculativeBuilder, parse_variants
+import asyncio
+
+
+class FakeBuilder:
+    """Returns the model name as plan after a delay per model"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.cancelled = []
+
+    async def generate_plan(self, prompt, example=None, model=None, reasoning=None, temperature=None):
+        try:
+            await asyncio.sleep(self.delays[model])
+        except asyncio.CancelledError:
+            self.cancelled.append(model)
+            raise
+        return {"raw": None, "wayang_plan": model}
+
+
+class FakeMapper:
+    def plan_to_json(self, plan):
+        return plan
+
+
+class FakeValidator:
+    def validate_plan(self, plan, compile_udfs=True):
+        return plan != "bad", []
+
+
+def test_parse_variants_repeats_mix():
+    variants = parse_variants("gpt-5-nano:low, gpt-4.1-mini::0.3", 3)
+
+    assert [v["name"] for v in variants] == ["gpt-5-nano:low", "gpt-4.1-mini::0.3", "gpt-5-nano:low"]
+    assert variants[1]["reasoning"] == "" and variants[1]["temperature"] == 0.3 # No reasoning, not the Builder's effort
+    assert parse_variants(":low,", 1)[0]["reasoning"] == "low"
+    assert parse_variants("::0.3", 1)[0]["reasoning"] is None # Builder's own model and effort
+
+
+def test_first_valid_plan_wins_and_rest_is_cancelled():
+    speculative = SpeculativeBuilder(FakeMapper(), FakeValidator(), variants="bad,good,slow", n=3)
+    builder = FakeBuilder({"bad": 0.0, "good": 0.01, "slow": 1.0})
+
+    async def run():
+        result = await speculative.generate_plan(builder, "query")
+        return result, list(builder.cancelled)
+
+    result, cancelled = asyncio.run(run())
+
+    assert result["wayang_plan"] == "good" and result["valid"]
+    assert len(result["responses"]) == 2
+    assert cancelled == ["slow"] # Stopped before the winner is returned
+    assert speculative.stats() == {"runs": 1, "wins": {"good": 1}}
+
+
+def test_falls_back_to_first_plan_if_none_validates():
+    speculative = SpeculativeBuilder(FakeMapper(), FakeValidator(), variants="bad", n=2)
+
+    result = asyncio.run(speculative.generate_plan(FakeBuilder({"bad": 0.0}), "query"))
+
+    assert result["wayang_plan"] == "bad" and not result["valid"]
+    assert speculative.stats()["wins"] == {}
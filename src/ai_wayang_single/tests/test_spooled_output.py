@@ -0,0 +1,39 @@
+from ai_wayang_single.utils.spooled_output import SpooledOutput
+
+
+def write_lines(count, chunk_size=37, **kwargs):
+    output = SpooledOutput(**kwargs)
+    data = "".join(f"row {i}\n" for i in range(count)).encode("utf-8")
+
+    for i in range(0, len(data), chunk_size):
+        output.write(data[i:i + chunk_size])
+
+    return output
+
+
+def test_pages_match_lines_across_index_checkpoints():
+    output = write_lines(1000, stride=16)
+
+    assert output.line_count == 1000
+    assert output.lines(0, 2) == ["row 0", "row 1"]
+    assert output.lines(511, 3) == ["row 511", "row 512", "row 513"]
+    assert output.tail(2) == ["row 998", "row 999"]
+    assert output.lines(1000, 5) == []
+
+
+def test_large_output_spills_to_disk_and_is_cut_in_preview():
+    output = write_lines(20000, max_memory=4096)
+
+    assert not output.in_memory
+    assert output.head(1) == ["row 0"]
+
+    preview = output.preview(100)
+    assert preview.startswith("row 0\n") and "20000 lines" in preview
+
+
+def test_last_line_without_newline_is_counted():
+    output = SpooledOutput()
+    output.write(b"a\nb")
+
+    assert output.line_count == 2 and output.tail(1) == ["b"]
+    assert output.preview() == "a\nb"
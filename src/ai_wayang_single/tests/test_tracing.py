@@ -0,0 +1,45 @@
+from ai_wayang_single.utils.tracing import JsonlSpanExporter, MemorySpanExporter, Tracer, to_chrome_trace
+import asyncio
+import json
+import pytest
+
+
+def test_concurrent_queries_get_separate_traces():
+    exporter = MemorySpanExporter()
+    tracer = Tracer([exporter])
+
+    async def query(name):
+        with tracer.span("query_wayang", query=name):
+            with tracer.span("wayang.execute_plan") as span:
+                await asyncio.sleep(0.01)
+                span.set(status_code=200)
+
+    async def run():
+        await asyncio.gather(query("a"), query("b"))
+
+    asyncio.run(run())
+
+    roots = {span.trace_id: span for span in exporter.spans if span.name == "query_wayang"}
+    children = [span for span in exporter.spans if span.name == "wayang.execute_plan"]
+
+    assert len(roots) == 2
+    for child in children:
+        assert child.parent_id == roots[child.trace_id].span_id
+        assert child.duration >= 0.01
+        assert child.attributes["status_code"] == 200
+
+
+def test_failed_span_is_exported_as_error(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    tracer = Tracer([JsonlSpanExporter(str(path))])
+
+    with pytest.raises(ValueError):
+        with tracer.span("plan_mapper.plan_to_json", version=2):
+            raise ValueError("unknown operator")
+
+    span = json.loads(path.read_text().splitlines()[0])
+    assert span["status"] == "error"
+    assert span["attributes"] == {"version": 2, "error": "unknown operator"}
+
+    event = to_chrome_trace([span])["traceEvents"][0]
+    assert event["ph"] == "X" and event["name"] == "plan_mapper.plan_to_json"
@@ -0,0 +1,47 @@
+from ai_wayang_single.wayang.plan_validator import PlanValidator
+from ai_wayang_single.wayang.udf_compiler import UdfCompiler
+import sys
+
+
+# Stands in for fsc: reports an error for every source file with "BROKEN" in it, like scalac does
+FAKE_COMPILER = """
+import sys
+failed = False
+for path in sys.argv[1:]:
+    if path.endswith(".scala") and "BROKEN" in open(path).read():
+        print(f"{path}:3: error: not found: value BROKEN")
+        failed = True
+sys.exit(1 if failed else 0)
+"""
+
+
+def plan(map_udf):
+    return {"operators": [
+        {"id": 1, "cat": "input", "operatorName": "textFileInput", "input": [], "output": [2], "data": {"filename": "file:///in.txt"}},
+        {"id": 2, "cat": "unary", "operatorName": "map", "input": [1], "output": [3], "data": {"udf": map_udf}},
+        {"id": 3, "cat": "unary", "operatorName": "sort", "input": [2], "output": [], "data": {"keyUdf": "(s: String) => s"}},
+    ]}
+
+
+def test_compile_errors_reach_validator_and_are_cached(tmp_path):
+    script = tmp_path / "fake_fsc.py"
+    script.write_text(FAKE_COMPILER)
+    compiler = UdfCompiler(compiler=[sys.executable, str(script)], classpath="")
+    validator = PlanValidator(compiler)
+
+    valid, errors = validator.validate_plan(plan("(s: String) => BROKEN"))
+
+    assert not valid
+    assert errors == ["Operation id 2: udf doesn't compile - not found: value BROKEN"]
+
+    # Known UDFs aren't compiled again, only the new one
+    assert validator.validate_plan(plan("(s: String) => s.length"))[0]
+    assert validator.validate_plan(plan("(s: String) => BROKEN"))[1] == errors
+    assert compiler.stats() == {"cached": 3, "hits": 3, "misses": 3, "compiles": 2}
+
+
+def test_missing_compiler_skips_check():
+    compiler = UdfCompiler(compiler=["/nonexistent/fsc"])
+
+    assert not compiler.available()
+    assert compiler.check_plan(plan("(s: String) => BROKEN")) == []
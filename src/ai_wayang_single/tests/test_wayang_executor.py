@@ -0,0 +1,202 @@
+from ai_wayang_single.wayang.backend_pool import BackendPool
+from ai_wayang_single.wayang.wayang_executor import WayangExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import httpx
+import pytest
+import socket
+import threading
+import time
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Fails the first requests with the failure status, then echoes the plan"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        server.ports.add(self.client_address[1])
+        server.requests += 1
+
+        status = server.failure_status if server.requests <= server.failures else 200
+        time.sleep(server.delay)
+        self.send_response(status)
+        if status == 503:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.send_response(405)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def start_stub(failures=0, delay=0.0, failure_status=503):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.failures = failures
+    server.failure_status = failure_status
+    server.delay = delay
+    server.requests = 0
+    server.ports = set()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def url(server):
+    return f"http://127.0.0.1:{server.server_port}/"
+
+
+def run_plans(executor, count, concurrent=False):
+    async def run():
+        executor.health_interval = 0
+        try:
+            if concurrent:
+                return await asyncio.gather(*(executor.execute_plan({"operators": []}) for _ in range(count)))
+            return [await executor.execute_plan({"operators": []}) for _ in range(count)]
+        finally:
+            await executor.close()
+
+    return asyncio.run(run())
+
+
+def test_unavailable_with_retry_after_is_retried():
+    server = start_stub(failures=2)
+    executor = WayangExecutor(url=f"http://127.0.0.1:{server.server_port}/")
+    executor.retry_backoff = 0.01
+
+    status, output = run_plans(executor, 1)[0]
+
+    assert status == 200 and output.text() == '{"operators":[]}'
+    assert server.requests == 3
+    server.shutdown()
+
+
+def test_proxy_timeouts_are_not_retried():
+    server = start_stub(failures=1, failure_status=504)
+    executor = WayangExecutor(url=url(server))
+    executor.retry_backoff = 0.01
+
+    status, _ = run_plans(executor, 1)[0]
+
+    # The plan may have run behind the proxy, running it again could write its output twice
+    assert status == 504 and server.requests == 1
+    server.shutdown()
+
+
+def test_connections_are_reused():
+    server = start_stub()
+    executor = WayangExecutor(url=f"http://127.0.0.1:{server.server_port}/")
+
+    results = run_plans(executor, 5)
+
+    assert [status for status, _ in results] == [200] * 5
+    assert len(server.ports) == 1
+    server.shutdown()
+
+
+def test_plans_spread_over_backends():
+    servers = [start_stub(delay=0.05) for _ in range(3)]
+    executor = WayangExecutor(urls=[url(server) for server in servers])
+
+    results = run_plans(executor, 9, concurrent=True)
+
+    assert [status for status, _ in results] == [200] * 9
+    assert [server.requests for server in servers] == [3, 3, 3]
+    for server in servers:
+        server.shutdown()
+
+
+def test_failing_backend_is_ejected():
+    bad, good = start_stub(failures=10 ** 6), start_stub()
+    executor = WayangExecutor(urls=[url(bad), url(good)])
+    executor.retry_backoff = 0.01
+
+    results = run_plans(executor, 6)
+
+    # Failed requests are retried on the healthy server until the bad one is ejected
+    assert [status for status, _ in results] == [200] * 6
+    assert bad.requests == executor.pool.failure_threshold
+    assert [stats["state"] for stats in executor.stats()] == ["open", "closed"]
+    bad.shutdown()
+    good.shutdown()
+
+
+def test_read_timeouts_dont_eject_backend():
+    slow = start_stub(delay=0.3)
+    executor = WayangExecutor(url=url(slow))
+    executor.client.timeout = httpx.Timeout(1.0, read=0.05)
+
+    async def run():
+        executor.health_interval = 0
+        for _ in range(executor.pool.failure_threshold + 1):
+            with pytest.raises(Exception):
+                await executor.execute_plan({"operators": []})
+        await executor.close()
+
+    asyncio.run(run())
+
+    # A long plan is not a failing server
+    assert executor.stats()[0]["state"] == "closed"
+    slow.shutdown()
+
+
+def test_cancelled_request_releases_backend():
+    slow = start_stub(delay=0.3)
+    executor = WayangExecutor(url=url(slow))
+
+    async def run():
+        executor.health_interval = 0
+        task = asyncio.create_task(executor.execute_plan({"operators": []}))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await executor.close()
+
+    asyncio.run(run())
+
+    # The client left, the server is neither busy nor failing
+    assert executor.stats()[0]["outstanding"] == 0
+    assert executor.stats()[0]["state"] == "closed"
+    slow.shutdown()
+
+
+def test_health_probes_eject_unreachable_backend():
+    good = start_stub()
+
+    # Port that nothing listens on
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        dead = f"http://127.0.0.1:{sock.getsockname()[1]}/"
+
+    executor = WayangExecutor(urls=[url(good), dead])
+
+    async def probe():
+        for _ in range(executor.pool.failure_threshold):
+            await executor.check_health()
+        await executor.close()
+
+    asyncio.run(probe())
+
+    assert [stats["state"] for stats in executor.stats()] == ["closed", "open"]
+    good.shutdown()
+
+
+def test_weighted_round_robin_follows_weights():
+    pool = BackendPool(["a", "b"], weights=[3, 1], strategy="weighted_round_robin")
+
+    picks = []
+    for _ in range(8):
+        backend = pool.acquire()
+        picks.append(backend.url)
+        pool.release(backend, 0.0, success=True)
+
+    # Smooth: the light backend is not starved until the end of a cycle
+    assert picks == ["a", "a", "b", "a"] * 2
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Dict, List
+import argparse
+import glob
+import json
+import os
+
+
+def read_logs(folder_path: str, log_name: str | None = None, session_id: str | None = None) -> Dict[str, List[dict]]:
+    """
+    Rebuild the JSON log of each query from the JSON Lines log files
+
+    Args:
+        folder_path (str): The log folder
+        log_name (str | None): Only read this log
+        session_id (str | None): Only read logs of this session
+
+    Returns:
+        Dict[str, List[dict]]: Entries per log name, in the order they were logged
+
+    """
+
+    logs = OrderedDict()
+
+    # Log files sort by creation time
+    for path in sorted(glob.glob(os.path.join(folder_path, "log_*.jsonl"))):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Last line may be cut if the process was killed
+                    continue
+
+                if log_name and entry.get("log_name") != log_name:
+                    continue
+                if session_id and entry.get("session_id") != session_id:
+                    continue
+
+                logs.setdefault(entry.get("log_name"), []).append(entry)
+
+    for entries in logs.values():
+        entries.sort(key=lambda entry: entry.get("id", 0))
+
+    return logs
+
+
+def export_logs(folder_path: str, output_folder: str, session_id: str | None = None) -> List[str]:
+    """
+    Write each query's log as a JSON file, as the logger used to
+
+    Args:
+        folder_path (str): The log folder
+        output_folder (str): Folder for the JSON files
+        session_id (str | None): Only export logs of this session
+
+    Returns:
+        List[str]: Paths of the written files
+
+    """
+
+    os.makedirs(output_folder, exist_ok=True)
+    paths = []
+
+    for log_name, entries in read_logs(folder_path, session_id=session_id).items():
+        logs = [{"id": e.get("id"), "title": e.get("title"), "timestamp": e.get("timestamp"), "log": e.get("log")} for e in entries]
+
+        path = os.path.join(output_folder, f"{log_name}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(logs, f, indent=4)
+
+        paths.append(path)
+
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export JSON Lines logs to a JSON file per query")
+    parser.add_argument("log_folder")
+    parser.add_argument("output_folder")
+    parser.add_argument("--session", default=None)
+    args = parser.parse_args()
+
+    for path in export_logs(args.log_folder, args.output_folder, args.session):
+        print(path)
@@ -1,23 +1,261 @@
 from ai_wayang_single.config.settings import LOG_CONFIG
 from datetime import datetime
-import os
+import atexit
+import itertools
 import json
+import os
+import queue
+import threading
+import time
+
+class LogWriter:
+    """
+    Appends log entries as JSON Lines from a background thread.
+    Callers only put a line on a queue, the thread writes batches, syncs to disk
+    now and then and rotates the file by size and age
+
+    """
+
+    def __init__(
+        self,
+        folder_path: str,
+        max_bytes: int | None = None,
+        rotate_seconds: float | None = None,
+        fsync_interval: float | None = None,
+    ):
+        self.folder_path = folder_path
+        self.max_bytes = max_bytes if max_bytes is not None else LOG_CONFIG.get("max_bytes")
+        self.rotate_seconds = rotate_seconds if rotate_seconds is not None else LOG_CONFIG.get("rotate_seconds")
+        self.fsync_interval = fsync_interval if fsync_interval is not None else LOG_CONFIG.get("fsync_interval")
+        self.queue = queue.Queue()
+        self.file = None
+        self.filepath = None
+        self.opened_at = 0.0
+        self.last_sync = 0.0
+        self.files = 0 # Log files opened by this writer, part of the filename
+        self.closed = False
+
+        os.makedirs(self.folder_path, exist_ok=True)
+
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def write(self, entry: dict) -> None:
+        """
+        Queue an entry to be written
+
+        Args:
+            entry (dict): The log entry
+
+        """
+
+        if self.closed:
+            return
+
+        # Serialize now, the message may change after the call
+        self.queue.put(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Block until all queued entries are written and synced to disk
+
+        Args:
+            timeout (float): Maximum seconds to wait
+
+        Returns:
+            bool: True if the entries were written, False if the writer is stopped or didn't finish in time
+
+        """
+
+        # Nothing would ever set the event
+        if self.closed or not self.thread.is_alive():
+            return False
+
+        done = threading.Event()
+        self.queue.put(done)
+
+        return done.wait(timeout)
+
+    def close(self) -> None:
+        """
+        Write the queued entries and stop the writer thread
+
+        """
+
+        if self.closed:
+            return
+
+        self.closed = True
+        self.queue.put(None)
+        self.thread.join()
+
+    def _run(self) -> None:
+        """
+        Helper function for the writer thread. Writes everything queued at once, then waits for more
+
+        """
+
+        while True:
+            item = self.queue.get()
+            batch = []
+            waiters = []
+            stop = False
+
+            # Drain the queue into one batch
+            while True:
+                if item is None:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    batch.append(item)
+
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+
+            try:
+                if batch:
+                    self._write_batch(batch)
+
+                if waiters or stop or time.monotonic() - self.last_sync >= self.fsync_interval:
+                    self._sync()
+
+            except Exception as e:
+                # Keep the thread alive, a dead writer would block every flush
+                print(f"[ERROR] Couldn't write log: {e}")
+
+            for waiter in waiters:
+                waiter.set()
+
+            if stop:
+                if self.file:
+                    self.file.close()
+                return
+
+    def _write_batch(self, lines: list) -> None:
+        """
+        Helper function to append lines to the current log file, rotating it first if needed
+
+        Args:
+            lines (list): JSON lines
+
+        """
+
+        if self._should_rotate():
+            self._rotate()
+
+        self.file.write("".join(lines))
+        self.file.flush()
+
+    def _should_rotate(self) -> bool:
+        """
+        Helper function to check if a new log file is needed
+
+        Returns:
+            bool: True if there is no file or it is too big or too old
+
+        """
+
+        if self.file is None:
+            return True
+
+        too_big = self.max_bytes > 0 and self.file.tell() >= self.max_bytes
+        too_old = self.rotate_seconds > 0 and time.monotonic() - self.opened_at >= self.rotate_seconds
+
+        return too_big or too_old
+
+    def _rotate(self) -> None:
+        """
+        Helper function to close the current log file and open a new one
+
+        """
+
+        if self.file:
+            self._sync()
+            self.file.close()
+            self.file = None # Retry opening on the next batch if opening fails
+
+        # Timestamp, process and file number keep names unique and sortable
+        self.files += 1
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        filename = f"log_{timestamp}_{os.getpid()}_{self.files:04d}.jsonl"
+
+        self.filepath = os.path.join(self.folder_path, filename)
+        self.file = open(self.filepath, "a", encoding="utf-8")
+        self.opened_at = time.monotonic()
+
+    def _sync(self) -> None:
+        """
+        Helper function to sync the log file to disk
+
+        """
+
+        if self.file:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+        self.last_sync = time.monotonic()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_log_writer(folder_path: str) -> LogWriter:
+    """
+    Get the shared writer for a log folder, started on first use
+
+    Args:
+        folder_path (str): The log folder
+
+    Returns:
+        LogWriter: Writer for the folder
+
+    """
+
+    with _writers_lock:
+        writer = _writers.get(folder_path)
+
+        if writer is None or writer.closed:
+            writer = LogWriter(folder_path)
+            _writers[folder_path] = writer
+
+        return writer
+
+
+@atexit.register
+def close_log_writers() -> None:
+    """
+    Write all queued entries before the process exits
+
+    """
+
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+
 
 class Logger:
     """
     For logging, inspecting and debugging plans.
-    Mostly to keep track and monitor on Agents progress
+    Mostly to keep track and monitor on Agents progress.
+    Entries are appended as JSON Lines by a shared background writer, use log_reader to get the JSON log per query
 
     """
 
-    def __init__(self):
+    def __init__(self, session_id: str | None = None):
         self.folder_path = LOG_CONFIG.get("log_folder")
-        self.logfile = self._create_logfile() or None
+        self.session_id = session_id
+        self.log_name = self._create_log_name() # Groups the entries of this log
+        self.writer = get_log_writer(self.folder_path) if self.folder_path else None
+        self.ids = itertools.count(1)
 
 
     def add_message(self, title: str, msg):
         """
-        Append a new log or message to the logfile
+        Append a new log or message to the log
 
         Args:
             title (str): The title of the message to be logged
@@ -26,68 +264,46 @@ class Logger:
         """
 
         # Return if no folder path
-        if not self.folder_path:
+        if not self.writer:
             return None
-        
+
         # Make timestamp
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-        # Get log
-        with open(self.logfile, "r", encoding="utf-8") as f:
-            logs = json.load(f)
+        # Create new log
+        new_log = {
+            "log_name": self.log_name,
+            "session_id": self.session_id,
+            "id": next(self.ids),
+            "title": title,
+            "timestamp": timestamp,
+            "log": msg
+        }
 
-        # Write to log
-        with open(self.logfile, "w", encoding="utf-8") as f:
-            # Size for ID
-            size = len(logs)
+        # Queue the log, written in the background
+        self.writer.write(new_log)
 
-            # Create new log
-            new_log = {
-                "id": size + 1,
-                "title": title,
-                "timestamp": timestamp,
-                "log": msg
-            }
 
-            # Add new log
-            logs.append(new_log)
-
-            # (Over)write the log
-            json.dump(logs, f, indent=4)
-            
-
-    def _create_logfile(self) -> str:
+    def flush(self) -> None:
         """
-        Helper function to create a new log file in JSON
-
-        Returns:
-            (str): Filepath of created log file
+        Wait until all logged messages are on disk
 
         """
 
-        # Check if folder exists
-        if not self.folder_path:
-            return None
-        
-        # Check or create log folder if doesn't exist
-        os.makedirs(self.folder_path, exist_ok=True)
-
-        # Create path for log file
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"log_{timestamp}.json"
-        filepath = os.path.join(self.folder_path, filename)
-
-        # Create file
-        with open(filepath, "w", encoding="utf-8", ) as f:
-            json.dump([], f, indent=4)
-            
-        return filepath
-    
-            
-
+        if self.writer:
+            self.writer.flush()
 
 
+    def _create_log_name(self) -> str:
+        """
+        Helper function to create a unique name for this log
 
+        Returns:
+            (str): Name of the log, as the old JSON log files were named
 
+        """
 
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        suffix = os.urandom(3).hex()
 
+        return f"log_{timestamp}_{self.session_id}_{suffix}" if self.session_id else f"log_{timestamp}_{suffix}"
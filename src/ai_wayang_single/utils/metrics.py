@@ -0,0 +1,269 @@
+from ai_wayang_single.config.settings import METRICS_CONFIG
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+import functools
+import threading
+
+
+# Tools report failures of the pipeline as text instead of raising
+TOOL_FAILURES = ("An error occured", "Couldn't execute wayang plan")
+
+
+class _CounterChild:
+    """
+    Value of a counter for one set of label values
+
+    """
+
+    __slots__ = ("value", "lock")
+
+    def __init__(self, lock: threading.Lock):
+        self.value = 0.0
+        self.lock = lock
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self.lock:
+            self.value += amount
+
+
+class _HistogramChild:
+    """
+    Bucket counts of a histogram for one set of label values
+
+    """
+
+    __slots__ = ("bounds", "counts", "sum", "lock")
+
+    def __init__(self, bounds: Tuple[float, ...], lock: threading.Lock):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # Last bucket is +Inf
+        self.sum = 0.0
+        self.lock = lock
+
+    def observe(self, value: float) -> None:
+        with self.lock:
+            self.counts[bisect_left(self.bounds, value)] += 1
+            self.sum += value
+
+
+class Metric:
+    """
+    A counter or histogram with labels. Children are created once per set of label values,
+    after that an update is a dict lookup and an addition under the metric's lock.
+    Updates come from the event loop and from worker threads (asyncio.to_thread), the scrape thread only reads
+
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] | None = None):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self.buckets = tuple(sorted(buckets)) if buckets else None
+        self.type = "histogram" if buckets else "counter"
+        self.children: Dict[Tuple[str, ...], Any] = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values) -> Any:
+        """
+        Get the child for a set of label values
+
+        Args:
+            *values: One value per label name
+
+        Returns:
+            _CounterChild | _HistogramChild: The child to update
+
+        """
+
+        key = tuple(str(value) for value in values)
+        child = self.children.get(key)
+
+        if child is None:
+            child = _HistogramChild(self.buckets, self.lock) if self.buckets else _CounterChild(self.lock)
+            child = self.children.setdefault(key, child)
+
+        return child
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def expose(self) -> List[str]:
+        """
+        Get the metric in the Prometheus text format
+
+        Returns:
+            List[str]: Lines of the metric
+
+        """
+
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+        for key, child in list(self.children.items()):
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+
+            if self.type == "counter":
+                lines.append(f"{self.name}{_format_labels(labels)} {child.value}")
+                continue
+
+            # Buckets are stored per bucket and made cumulative when scraped
+            counts = list(child.counts)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                bucket_labels = labels + [f'le="{le}"']
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {child.sum}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+
+        return lines
+
+
+class Metrics:
+    """
+    Registry of the server's metrics
+
+    """
+
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+    def __init__(self):
+        self.tool_calls = Metric("wayang_mcp_tool_calls_total", "MCP tool calls", ("tool", "result"))
+        self.queries = Metric("wayang_queries_total", "Finished queries by final status code", ("status_code",))
+        self.debug_iterations = Metric("wayang_debug_iterations", "Debugger iterations per query", buckets=(0, 1, 2, 3, 4, 5, 7, 10))
+        self.llm_calls = Metric("wayang_llm_request_seconds", "LLM call latency", ("agent", "model"), self.LATENCY_BUCKETS)
+        self.llm_tokens = Metric("wayang_llm_tokens_total", "LLM tokens by kind (input, cached, output)", ("agent", "model", "kind"))
+        self.wayang_requests = Metric("wayang_execution_seconds", "Wayang request latency per attempt", ("backend", "status_code"), self.LATENCY_BUCKETS)
+        self.wayang_retries = Metric("wayang_execution_retries_total", "Retried Wayang requests", ("backend",))
+        self.cache_lookups = Metric("wayang_cache_lookups_total", "Plan cache lookups", ("cache", "result"))
+        self.plan_rewrites = Metric("wayang_plan_rewrites_total", "Rewrites of validated plans by the optimizer", ("rule",))
+        self.plan_repairs = Metric("wayang_plan_repairs_total", "Plans repaired by rules", ("result",))
+
+    def all(self) -> List[Metric]:
+        return [metric for metric in vars(self).values() if isinstance(metric, Metric)]
+
+    def expose(self) -> str:
+        """
+        Get all metrics in the Prometheus text format
+
+        Returns:
+            str: The metrics page
+
+        """
+
+        return "\n".join(line for metric in self.all() for line in metric.expose()) + "\n"
+
+    def record_llm(self, agent: str, response: Any, seconds: float) -> None:
+        """
+        Record latency and token usage of an LLM call
+
+        Args:
+            agent (str): Name of the agent, e.g. "builder" or "debugger"
+            response (Any): Response from the OpenAI Responses API, None if aborted
+            seconds (float): Duration of the call
+
+        """
+
+        model = str(getattr(response, "model", None))
+        self.llm_calls.labels(agent, model).observe(seconds)
+
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+
+        details = getattr(usage, "input_tokens_details", None)
+        self.llm_tokens.labels(agent, model, "input").inc(getattr(usage, "input_tokens", 0) or 0)
+        self.llm_tokens.labels(agent, model, "cached").inc(getattr(details, "cached_tokens", 0) or 0)
+        self.llm_tokens.labels(agent, model, "output").inc(getattr(usage, "output_tokens", 0) or 0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: List[str]) -> str:
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+# Shared registry
+metrics = Metrics()
+
+
+def count_tool_calls(func):
+    """
+    Decorator that counts calls and failures of an MCP tool. A failure is an exception or a failure message from the pipeline
+
+    Args:
+        func: The async tool function
+
+    Returns:
+        The wrapped tool function with the same signature
+
+    """
+
+    ok = metrics.tool_calls.labels(func.__name__, "ok")
+    error = metrics.tool_calls.labels(func.__name__, "error")
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException:
+            error.inc()
+            raise
+
+        if isinstance(result, str) and result.startswith(TOOL_FAILURES):
+            error.inc()
+        else:
+            ok.inc()
+        return result
+
+    return wrapper
+
+
+def start_metrics_server(port: int | None = None, host: str | None = None) -> ThreadingHTTPServer | None:
+    """
+    Serve the metrics on /metrics from a background thread
+
+    Args:
+        port (int | None): Port, defaults to settings. 0 disables the endpoint
+        host (str | None): Interface to bind, defaults to settings
+
+    Returns:
+        ThreadingHTTPServer | None: The server, or None if disabled
+
+    """
+
+    port = port if port is not None else METRICS_CONFIG.get("port")
+    host = host or METRICS_CONFIG.get("host")
+
+    if not port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = metrics.expose().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Don't print every scrape
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"[INFO] Metrics served on http://{host}:{server.server_address[1]}/metrics")
+
+    return server
@@ -0,0 +1,256 @@
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Dict, List
+import mmap
+import os
+import random
+import threading
+import urllib.parse
+
+
+def plan_output_files(plan: Dict) -> List[str]:
+    """
+    Find the local files written by the textFileOutput operators of an executable plan
+
+    Args:
+        plan (Dict): Executable JSON Wayang plan
+
+    Returns:
+        List[str]: Local paths of the output files
+
+    """
+
+    paths = []
+
+    for operator in plan.get("operators", []):
+        if operator.get("operatorName") != "textFileOutput":
+            continue
+
+        filename = operator.get("data", {}).get("filename")
+        if not filename:
+            continue
+
+        # Filenames are file:/// URIs with URL encoded characters
+        path = urllib.parse.unquote(filename)
+        if path.startswith("file://"):
+            path = path[len("file://"):]
+
+        paths.append(path)
+
+    return paths
+
+
+class OutputFileReader:
+    """
+    Reads pages, counts and samples of lines from an output file in constant memory.
+    The file is memory-mapped and a sparse index of newline counts per block is built once with a single streaming pass
+
+    """
+
+    def __init__(self, path: str, block_size: int = 1 << 16):
+        self.path = path
+        self.block_size = block_size # Bytes per indexed block
+        self.size = os.path.getsize(path)
+        self.block_newlines = array("Q", [0]) # Newlines before the start of each block
+        self.line_count = 0
+        self.closed = False
+        self.lock = threading.Lock() # Reads and close never overlap, a replaced reader may still be read by another request
+
+        # Empty files can't be mapped
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+
+        self._build_index()
+
+    def lines(self, offset: int = 0, limit: int = 100) -> List[str]:
+        """
+        Read a page of lines
+
+        Args:
+            offset (int): First line, starting at 0
+            limit (int): Maximum number of lines
+
+        Returns:
+            List[str]: The lines without line breaks
+
+        Raises:
+            ValueError: If the reader was closed because the file changed or the reader was evicted
+
+        """
+
+        offset = max(offset, 0)
+        if limit <= 0 or offset >= self.line_count:
+            return []
+
+        with self.lock:
+            if self.closed:
+                raise ValueError("The output file has changed since it was opened, read it again")
+
+            pos = self._line_start(offset)
+            lines = []
+
+            for _ in range(min(limit, self.line_count - offset)):
+                end = self.mm.find(b"\n", pos)
+                if end == -1:
+                    end = self.size
+                lines.append(self.mm[pos:end].rstrip(b"\r").decode("utf-8", errors="replace"))
+                pos = end + 1
+
+        return lines
+
+    def head(self, n: int = 100) -> List[str]:
+        """
+        Read the first n lines
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        return self.lines(0, n)
+
+    def tail(self, n: int = 100) -> List[str]:
+        """
+        Read the last n lines
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        return self.lines(max(self.line_count - n, 0), n)
+
+    def sample(self, n: int = 10, seed: int | None = None) -> List[str]:
+        """
+        Read a uniform random sample of lines, in file order
+
+        Args:
+            n (int): Number of lines
+            seed (int | None): Seed for a reproducible sample
+
+        Returns:
+            List[str]: The sampled lines
+
+        """
+
+        n = min(max(n, 0), self.line_count)
+        picks = sorted(random.Random(seed).sample(range(self.line_count), n))
+
+        return [self.lines(i, 1)[0] for i in picks]
+
+    def close(self) -> None:
+        """
+        Unmap and close the file, once no read is running
+
+        """
+
+        with self.lock:
+            self.closed = True
+            if self.mm is not None:
+                self.mm.close()
+            self.file.close()
+
+    def _line_start(self, line: int) -> int:
+        """
+        Helper function to find the byte offset of a line, from the start of the block holding the newline before it
+
+        Args:
+            line (int): Line number
+
+        Returns:
+            int: Byte offset
+
+        """
+
+        if line == 0:
+            return 0
+
+        # Block holding the newline that ends the previous line
+        block = bisect_right(self.block_newlines, line - 1) - 1
+        pos = block * self.block_size
+
+        for _ in range(line - self.block_newlines[block]):
+            pos = self.mm.find(b"\n", pos) + 1
+
+        return pos
+
+    def _build_index(self) -> None:
+        """
+        Helper function to count lines and the newlines before each block. Only counts natively, one block in memory at a time
+
+        """
+
+        newlines = 0
+
+        for start in range(0, self.size, self.block_size):
+            newlines += self.mm[start:start + self.block_size].count(b"\n")
+            self.block_newlines.append(newlines)
+
+        # Count a last line without a trailing newline
+        last_byte = self.mm[self.size - 1:self.size] if self.size else b"\n"
+        self.line_count = newlines + (1 if last_byte != b"\n" else 0)
+
+
+class OutputReaderCache:
+    """
+    Keeps readers for recently used output files, so the index is built once per file version
+
+    """
+
+    def __init__(self, max_readers: int = 16):
+        self.max_readers = max_readers
+        self.readers = OrderedDict() # Path to (version, reader)
+        self.lock = threading.Lock()
+
+    def get(self, path: str) -> OutputFileReader:
+        """
+        Get a reader for a file, rebuilt if the file has changed
+
+        Args:
+            path (str): Path to the output file
+
+        Returns:
+            OutputFileReader: Reader for the file
+
+        """
+
+        stat = os.stat(path)
+        version = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            cached = self.readers.get(path)
+
+            if cached and cached[0] == version:
+                self.readers.move_to_end(path)
+                return cached[1]
+
+        # Build the index without the lock, so other files can be read meanwhile
+        reader = OutputFileReader(path)
+
+        with self.lock:
+            cached = self.readers.get(path)
+
+            # Another request built the same version first
+            if cached and cached[0] == version:
+                reader.close()
+                self.readers.move_to_end(path)
+                return cached[1]
+
+            if cached:
+                cached[1].close()
+
+            self.readers[path] = (version, reader)
+
+            # Close least recently used readers
+            while len(self.readers) > self.max_readers:
+                _, (_, old) = self.readers.popitem(last=False)
+                old.close()
+
+        return reader
@@ -0,0 +1,155 @@
+from ai_wayang_single.config.settings import OUTPUT_CONFIG
+import os
+import threading
+import time
+
+
+class OutputRetention:
+    """
+    Deletes old output files from the output folder, by age and by total size.
+    Only files named output_* and empty run_* folders are touched
+
+    """
+
+    def __init__(
+        self,
+        folder: str | None = None,
+        max_age: float | None = None,
+        max_bytes: int | None = None,
+        interval: float | None = None,
+        grace: float = 60.0,
+    ):
+        self.folder = folder or OUTPUT_CONFIG.get("output_folder")
+        self.max_age = max_age if max_age is not None else OUTPUT_CONFIG.get("retention_max_age")
+        self.max_bytes = max_bytes if max_bytes is not None else OUTPUT_CONFIG.get("retention_max_bytes")
+        self.interval = interval if interval is not None else OUTPUT_CONFIG.get("retention_interval")
+        self.grace = grace # Files newer than this may still be written or read, never delete them
+        self.last_cleanup = 0.0
+        self.lock = threading.Lock()
+
+    def enabled(self) -> bool:
+        """
+        Checks if there is a folder and a limit
+
+        Returns:
+            bool: True if cleanup is enabled
+
+        """
+
+        return bool(self.folder) and (self.max_age > 0 or self.max_bytes > 0)
+
+    def maybe_cleanup(self) -> int:
+        """
+        Run a cleanup if enabled and the interval has passed since the last one
+
+        Returns:
+            int: Number of deleted files
+
+        """
+
+        if not self.enabled() or time.monotonic() - self.last_cleanup < self.interval:
+            return 0
+
+        return self.cleanup()
+
+    def cleanup(self) -> int:
+        """
+        Delete output files older than the max age, then the oldest files until the total size is below the limit
+
+        Returns:
+            int: Number of deleted files
+
+        """
+
+        # Only one cleanup at a time
+        if not self.lock.acquire(blocking=False):
+            return 0
+
+        try:
+            self.last_cleanup = time.monotonic()
+
+            if not self.folder or not os.path.isdir(self.folder):
+                return 0
+
+            now = time.time()
+            files = self._output_files()
+            total = sum(size for _, size, _ in files)
+            deleted = 0
+
+            # Oldest first
+            for path, size, mtime in sorted(files, key=lambda file: file[2]):
+                age = now - mtime
+
+                if age < self.grace:
+                    break
+
+                too_old = self.max_age > 0 and age > self.max_age
+                too_big = self.max_bytes > 0 and total > self.max_bytes
+
+                if not (too_old or too_big):
+                    continue
+
+                try:
+                    os.remove(path)
+                    total -= size
+                    deleted += 1
+                except OSError:
+                    continue
+
+            self._remove_empty_run_folders()
+
+            if deleted:
+                print(f"[INFO] Deleted {deleted} old output files")
+
+            return deleted
+
+        finally:
+            self.lock.release()
+
+    def _output_files(self) -> list:
+        """
+        Helper function to list output files in the folder and in run folders
+
+        Returns:
+            list: Path, size and modification time of each output file
+
+        """
+
+        files = []
+
+        for folder in [self.folder] + self._run_folders():
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.is_file() and entry.name.startswith("output_"):
+                        stat = entry.stat()
+                        files.append((entry.path, stat.st_size, stat.st_mtime))
+
+        return files
+
+    def _run_folders(self) -> list:
+        """
+        Helper function to list run folders
+
+        Returns:
+            list: Paths of run_* folders
+
+        """
+
+        with os.scandir(self.folder) as entries:
+            return [entry.path for entry in entries if entry.is_dir() and entry.name.startswith("run_")]
+
+    def _remove_empty_run_folders(self) -> None:
+        """
+        Helper function to remove run folders left empty, except new ones a running plan may still write to
+
+        """
+
+        now = time.time()
+
+        for folder in self._run_folders():
+            try:
+                if now - os.stat(folder).st_mtime < self.grace:
+                    continue
+                os.rmdir(folder)
+            except OSError:
+                pass
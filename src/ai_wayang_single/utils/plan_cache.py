@@ -0,0 +1,283 @@
+from ai_wayang_single.config.settings import CACHE_CONFIG
+from ai_wayang_single.llm.models import WayangPlan
+from pathlib import Path
+from typing import List, Tuple
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+
+class PlanCache:
+    """
+    Persistent, content-addressed cache of successfully executed Wayang plans.
+    A hit lets the pipeline skip the Builder Agent and go straight to mapping and execution
+
+    """
+
+    def __init__(
+        self,
+        cache_path: str | None = None,
+        schema_folder: str | Path | None = None,
+        max_entries: int | None = None,
+    ):
+        self.cache_path = cache_path or CACHE_CONFIG.get("cache_path")
+        self.schema_folder = schema_folder
+        self.max_entries = max_entries or CACHE_CONFIG.get("max_entries")
+
+        # Hit and miss counters since startup
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Create folder for the database if needed
+        folder = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(folder, exist_ok=True)
+
+        # One connection shared by the process, guarded by a lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS plans (
+                key TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                model TEXT,
+                reasoning TEXT,
+                schema_hash TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0
+            )
+            """
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_plans_last_used ON plans (last_used)")
+        self.conn.commit()
+
+        # Drop plans built against schemas that no longer exist. Fingerprinted once, and again when schemas are reloaded
+        self.schema_hash = None
+        self._check_schemas()
+
+    def make_key(self, query: str, model: str | None, reasoning: str | None, system_prompt: str) -> str:
+        """
+        Creates the cache key for a query
+
+        Args:
+            query (str): The natural language query
+            model (str | None): Builder model
+            reasoning (str | None): Builder reasoning effort
+            system_prompt (str): The assembled Builder system prompt (schemas, operators, examples)
+
+        Returns:
+            str: Hex digest used as cache key
+
+        """
+
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()
+        material = json.dumps([self.normalize_query(query), model, reasoning, prompt_hash])
+
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> WayangPlan | None:
+        """
+        Look up a cached plan
+
+        Args:
+            key (str): Cache key from make_key
+
+        Returns:
+            WayangPlan | None: The cached plan or None on a miss
+
+        """
+
+        with self.lock:
+            row = self.conn.execute("SELECT plan FROM plans WHERE key = ?", (key,)).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            # Mark as recently used
+            self.conn.execute(
+                "UPDATE plans SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+            )
+            self.conn.commit()
+            self.hits += 1
+
+        return WayangPlan.model_validate_json(row[0])
+
+    def put(self, key: str, query: str, plan: WayangPlan, model: str | None = None, reasoning: str | None = None) -> None:
+        """
+        Store a successfully executed plan
+
+        Args:
+            key (str): Cache key from make_key
+            query (str): The natural language query
+            plan (WayangPlan): The final, successful plan
+            model (str | None): Builder model
+            reasoning (str | None): Builder reasoning effort
+
+        """
+
+        now = time.time()
+
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO plans (key, query, model, reasoning, schema_hash, plan, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, query, model, reasoning, self.schema_hash, plan.model_dump_json(), now, now),
+            )
+            self._evict()
+            self.conn.commit()
+
+    def invalidate(self, key: str) -> None:
+        """
+        Remove a plan from the cache, e.g. if a cached plan no longer executes
+
+        Args:
+            key (str): Cache key from make_key
+
+        """
+
+        with self.lock:
+            self.conn.execute("DELETE FROM plans WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def items(self) -> List[Tuple[str, str]]:
+        """
+        Get all cached queries and plans, most recently used last
+
+        Returns:
+            List[Tuple[str, str]]: Pairs of query and plan as JSON
+
+        """
+
+        with self.lock:
+            return self.conn.execute("SELECT query, plan FROM plans ORDER BY last_used ASC").fetchall()
+
+    def stats(self) -> dict:
+        """
+        Get cache statistics
+
+        Returns:
+            dict: Entries, hits, misses, hit rate and evictions
+
+        """
+
+        with self.lock:
+            entries = self.conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+
+        lookups = self.hits + self.misses
+
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def normalize_query(self, query: str) -> str:
+        """
+        Normalizes query text so trivial differences in case and whitespace share a key.
+        Quoted literals are kept as they are, 'ALICE' and 'alice' are different values
+
+        Args:
+            query (str): The natural language query
+
+        Returns:
+            str: Normalized query
+
+        """
+
+        # Odd parts are the quoted literals, an apostrophe inside a word like "aren't" opens no literal
+        parts = re.split(r"(\"[^\"]*\"|(?<!\w)'[^']*')", query)
+        normalized = "".join(part if i % 2 else re.sub(r"\s+", " ", part.casefold()) for i, part in enumerate(parts))
+
+        return normalized.strip()
+
+    def _evict(self) -> None:
+        """
+        Helper function to evict the least recently used plans when the cache is full. Caller holds the lock
+
+        """
+
+        count = self.conn.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+        overflow = count - self.max_entries
+
+        if overflow > 0:
+            self.conn.execute(
+                "DELETE FROM plans WHERE key IN (SELECT key FROM plans ORDER BY last_used ASC LIMIT ?)",
+                (overflow,),
+            )
+            self.evictions += overflow
+
+    def refresh_schemas(self) -> bool:
+        """
+        Fingerprint the schema files again, e.g. after they are reloaded, and drop plans built against older schemas.
+        Walks the schema folder, run it in a thread from async code
+
+        Returns:
+            bool: True if the schemas have changed
+
+        """
+
+        return self._check_schemas()
+
+    def _check_schemas(self) -> bool:
+        """
+        Helper function that drops cached plans if the schema files have changed since they were cached
+
+        Returns:
+            bool: True if the schemas have changed
+
+        """
+
+        schema_hash = self._schema_fingerprint()
+
+        # Nothing to do if schemas are unchanged
+        if schema_hash == self.schema_hash:
+            return False
+
+        with self.lock:
+            deleted = self.conn.execute("DELETE FROM plans WHERE schema_hash != ?", (schema_hash,)).rowcount
+            self.conn.commit()
+            self.schema_hash = schema_hash
+
+        if deleted:
+            print(f"[INFO] Schemas changed, invalidated {deleted} cached plans")
+
+        return True
+
+    def _schema_fingerprint(self) -> str:
+        """
+        Helper function to fingerprint schema files by name, size and modification time
+
+        Returns:
+            str: Hex digest of the schema folder state
+
+        """
+
+        digest = hashlib.sha256()
+
+        if not self.schema_folder or not os.path.exists(self.schema_folder):
+            return digest.hexdigest()
+
+        # Go over each schema file in a stable order
+        for root, dirs, files in os.walk(self.schema_folder):
+            dirs.sort()
+            for file in sorted(files):
+                if not file.endswith(".json"):
+                    continue
+                path = os.path.join(root, file)
+                stat = os.stat(path)
+                digest.update(f"{os.path.relpath(path, self.schema_folder)}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+
+        return digest.hexdigest()
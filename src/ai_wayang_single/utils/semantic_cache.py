@@ -0,0 +1,338 @@
+from ai_wayang_single.config.settings import SEMANTIC_CACHE_CONFIG
+from ai_wayang_single.llm.models import WayangPlan
+from typing import Iterable, List, Tuple
+import numpy as np
+import re
+import zlib
+
+
+# Words that negate or compare. Queries that differ in them ask for different rows, however similar they are
+CONSTRAINT_WORDS = {
+    "not", "no", "never", "without", "except", "excluding", "non", "nor", "neither",
+    "less", "more", "fewer", "greater", "higher", "lower", "bigger", "smaller", "larger", "longer", "shorter",
+    "older", "younger", "newer", "earlier", "later", "above", "below", "under", "over", "before", "after",
+    "least", "most", "min", "max", "minimum", "maximum", "highest", "lowest", "top", "bottom", "first", "last",
+    "asc", "ascending", "desc", "descending", "equal", "equals", "exactly", "between", "only",
+}
+
+# Words that don't change what a query asks for. All other words name columns, tables or values and must match for reuse
+STOP_WORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "from", "by", "with", "and", "or", "as", "is", "are", "was",
+    "were", "be", "been", "that", "which", "who", "whose", "where", "than", "their", "its", "there", "this", "these",
+    "those", "all", "every", "each", "any", "me", "us", "i", "we", "you", "please", "can", "could", "would", "show",
+    "list", "give", "get", "find", "return", "display", "select", "fetch", "what", "table", "tables", "data",
+}
+
+
+class HashingEmbedder:
+    """
+    Local, CPU-only text embedder based on the hashing trick.
+    Words, word bigrams and character trigrams are hashed into a fixed size, L2 normalized vector
+
+    """
+
+    def __init__(self, dim: int | None = None):
+        self.dim = dim or SEMANTIC_CACHE_CONFIG.get("dim")
+
+    def embed(self, text: str) -> np.ndarray:
+        """
+        Embed a single text
+
+        Args:
+            text (str): Text to embed
+
+        Returns:
+            np.ndarray: L2 normalized vector of size dim
+
+        """
+
+        vector = np.zeros(self.dim, dtype=np.float32)
+
+        # Hash every feature into a bucket with a sign to reduce collision bias
+        for feature in self._features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+
+        # Normalize so dot product is cosine similarity
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+
+        return vector
+
+    def embed_many(self, texts: Iterable[str]) -> np.ndarray:
+        """
+        Embed several texts
+
+        Args:
+            texts (Iterable[str]): Texts to embed
+
+        Returns:
+            np.ndarray: Matrix with one row per text
+
+        """
+
+        return np.stack([self.embed(text) for text in texts])
+
+    def _features(self, text: str) -> List[str]:
+        """
+        Helper function to extract word, bigram and character trigram features
+
+        Args:
+            text (str): Text to split in features
+
+        Returns:
+            List: Features in text
+
+        """
+
+        words = re.findall(r"[a-z0-9_]+|[<>=!]+", text.casefold())
+
+        features = [f"w:{w}" for w in words]
+        features += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+
+        for word in words:
+            padded = f"#{word}#"
+            features += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+
+        return features
+
+
+class SemanticPlanIndex:
+    """
+    Brute-force vector index over queries of previously successful plans.
+    Finds the plan with the most similar query, so rephrased queries can reuse or learn from earlier plans
+
+    """
+
+    def __init__(self, embedder: HashingEmbedder | None = None, max_entries: int | None = None):
+        self.embedder = embedder or HashingEmbedder()
+        self.max_entries = max_entries or SEMANTIC_CACHE_CONFIG.get("max_entries")
+
+        # Preallocated rows, grown by doubling up to max_entries
+        self.vectors = np.zeros((min(1024, self.max_entries), self.embedder.dim), dtype=np.float32)
+        self.queries = []
+        self.plans = []
+        self.positions = {} # Normalized query to row
+        self.next_row = 0 # Next row to overwrite when index is full
+
+    def add(self, query: str, plan: WayangPlan | str) -> None:
+        """
+        Add a successful plan to the index
+
+        Args:
+            query (str): The natural language query
+            plan (WayangPlan | str): The plan or the plan as JSON
+
+        """
+
+        self.add_many([(query, plan)])
+
+    def add_many(self, items: Iterable[Tuple[str, WayangPlan | str]]) -> None:
+        """
+        Add several plans to the index at once
+
+        Args:
+            items (Iterable[Tuple[str, WayangPlan | str]]): Pairs of query and plan
+
+        """
+
+        for query, plan in items:
+            # Store plans as JSON to keep the index small
+            if isinstance(plan, WayangPlan):
+                plan = plan.model_dump_json()
+
+            key = " ".join(query.casefold().split())
+            vector = self.embedder.embed(query)
+
+            # Replace the plan if the query is already indexed
+            row = self.positions.get(key)
+
+            if row is None:
+                row = self._new_row()
+                if row < len(self.queries):
+                    # Overwrite oldest entry when full
+                    self.positions.pop(" ".join(self.queries[row].casefold().split()), None)
+                    self.queries[row] = query
+                    self.plans[row] = plan
+                else:
+                    self.queries.append(query)
+                    self.plans.append(plan)
+                self.positions[key] = row
+            else:
+                self.plans[row] = plan
+
+            self.vectors[row] = vector
+
+    def search(self, query: str, threshold: float = 0.0) -> Tuple[float, str, WayangPlan] | None:
+        """
+        Find the most similar indexed query
+
+        Args:
+            query (str): The natural language query
+            threshold (float): Minimum cosine similarity for a match
+
+        Returns:
+            Tuple[float, str, WayangPlan] | None: Similarity, matched query and its plan, or None if no match
+
+        """
+
+        if not self.queries:
+            return None
+
+        # Cosine similarity against all rows in one matrix-vector product
+        scores = self.vectors[:len(self.queries)] @ self.embedder.embed(query)
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+
+        if score < threshold:
+            return None
+
+        return score, self.queries[best], WayangPlan.model_validate_json(self.plans[best])
+
+    def remove(self, query: str) -> bool:
+        """
+        Remove an indexed query and its plan, e.g. when its plan failed for a similar query
+
+        Args:
+            query (str): The indexed natural language query
+
+        Returns:
+            bool: True if the query was indexed
+
+        """
+
+        row = self.positions.pop(" ".join(query.casefold().split()), None)
+        if row is None:
+            return False
+
+        # Move the last row into the free row
+        last = len(self.queries) - 1
+        if row != last:
+            self.queries[row] = self.queries[last]
+            self.plans[row] = self.plans[last]
+            self.vectors[row] = self.vectors[last]
+            self.positions[" ".join(self.queries[row].casefold().split())] = row
+
+        self.queries.pop()
+        self.plans.pop()
+        self.vectors[last] = 0
+
+        return True
+
+    def clear(self) -> None:
+        """
+        Remove all queries, e.g. when the schemas have changed
+
+        """
+
+        self.vectors[:] = 0
+        self.queries = []
+        self.plans = []
+        self.positions = {}
+        self.next_row = 0
+
+    def same_constraints(self, query: str, other: str) -> bool:
+        """
+        Checks that two queries use the same literals, negations and comparisons.
+        Queries like "older than 30" and "not older than 30" are similar but must not share a plan
+
+        Args:
+            query (str): A natural language query
+            other (str): Another natural language query
+
+        Returns:
+            bool: True if both queries have the same constraints
+
+        """
+
+        return self.same_literals(query, other) and self._constraints(query) == self._constraints(other)
+
+    def same_content(self, query: str, other: str) -> bool:
+        """
+        Checks that two queries use the same content words, i.e. the same columns, tables and values.
+        Queries like "names of people older than 30" and "ages of people older than 30" are similar but must not share a plan
+
+        Args:
+            query (str): A natural language query
+            other (str): Another natural language query
+
+        Returns:
+            bool: True if both queries contain the same content words
+
+        """
+
+        return self._content_words(query) == self._content_words(other)
+
+    def same_literals(self, query: str, other: str) -> bool:
+        """
+        Checks that two queries use the same numbers and quoted values.
+        Queries like "older than 30" and "older than 40" are similar but must not share a plan
+
+        Args:
+            query (str): A natural language query
+            other (str): Another natural language query
+
+        Returns:
+            bool: True if both queries contain the same literals
+
+        """
+
+        pattern = r"\d+(?:\.\d+)?|\"[^\"]*\"|'[^']*'"
+
+        return sorted(re.findall(pattern, query)) == sorted(re.findall(pattern, other))
+
+    def _constraints(self, query: str) -> List[str]:
+        """
+        Helper function to get the negation and comparison words and operators of a query
+
+        Returns:
+            List[str]: Sorted constraint words, "n't" counted as not
+
+        """
+
+        words = re.findall(r"[a-z0-9_']+|[<>=!]+", query.casefold())
+        words = ["not" if word.endswith("n't") else word for word in words]
+
+        return sorted(word for word in words if word in CONSTRAINT_WORDS or not word[0].isalnum())
+
+    def _content_words(self, query: str) -> set:
+        """
+        Helper function to get the words of a query that are neither stopwords, constraints nor numbers
+
+        Returns:
+            set: Content words
+
+        """
+
+        words = re.findall(r"[a-z0-9_']+", query.casefold())
+
+        return {word for word in words if word not in STOP_WORDS and word not in CONSTRAINT_WORDS and not word.endswith("n't") and not word[0].isdigit()}
+
+    def _new_row(self) -> int:
+        """
+        Helper function to get a free row, growing the matrix or recycling the oldest row
+
+        Returns:
+            int: Row index
+
+        """
+
+        size = len(self.queries)
+
+        # Recycle rows in insertion order when full
+        if size >= self.max_entries:
+            row = self.next_row
+            self.next_row = (self.next_row + 1) % self.max_entries
+            return row
+
+        # Grow matrix if needed
+        if size >= len(self.vectors):
+            grown = np.zeros((min(len(self.vectors) * 2, self.max_entries), self.embedder.dim), dtype=np.float32)
+            grown[:size] = self.vectors[:size]
+            self.vectors = grown
+
+        return size
+
+    def __len__(self) -> int:
+        return len(self.queries)
@@ -0,0 +1,180 @@
+from ai_wayang_single.config.settings import RESULT_CONFIG
+from typing import List
+import tempfile
+
+
+class SpooledOutput:
+    """
+    Output from Wayang, written in chunks as it is received.
+    Kept in memory up to a size threshold, then spilled to a temporary file, so large outputs never live in memory as one string.
+    A sparse line index allows paging by line without reading the whole output
+
+    """
+
+    def __init__(self, max_memory: int | None = None, stride: int = 1024):
+        self.file = tempfile.SpooledTemporaryFile(max_size=max_memory or RESULT_CONFIG.get("spool_max_memory"), mode="w+b")
+        self.stride = stride # Lines between indexed offsets
+        self.checkpoints = [0] # Byte offset of line 0, stride, 2 * stride, ...
+        self.size = 0
+        self.newlines = 0
+        self.last_byte = b""
+
+    def write(self, data: bytes) -> None:
+        """
+        Append a chunk of output
+
+        Args:
+            data (bytes): Next chunk
+
+        """
+
+        if not data:
+            return
+
+        self.file.seek(0, 2)
+        self.file.write(data)
+
+        # Index the start of every stride'th line, only looking for newlines when a checkpoint is crossed
+        count = data.count(b"\n")
+        next_checkpoint = len(self.checkpoints) * self.stride
+
+        if self.newlines + count >= next_checkpoint:
+            pos = -1
+            for line in range(self.newlines + 1, self.newlines + count + 1):
+                pos = data.find(b"\n", pos + 1)
+                if line % self.stride == 0:
+                    self.checkpoints.append(self.size + pos + 1)
+
+        self.newlines += count
+        self.size += len(data)
+        self.last_byte = data[-1:]
+
+    @property
+    def line_count(self) -> int:
+        """
+        Number of lines, including a last line without a trailing newline
+
+        """
+
+        return self.newlines + (1 if self.size and self.last_byte != b"\n" else 0)
+
+    @property
+    def in_memory(self) -> bool:
+        """
+        True if the output has not been spilled to disk
+
+        """
+
+        return not self.file._rolled
+
+    def lines(self, offset: int = 0, limit: int = 100) -> List[str]:
+        """
+        Read a page of lines
+
+        Args:
+            offset (int): First line, starting at 0
+            limit (int): Maximum number of lines
+
+        Returns:
+            List[str]: The lines without line breaks
+
+        """
+
+        offset = max(offset, 0)
+        if limit <= 0 or offset >= self.line_count:
+            return []
+
+        # Jump to the nearest indexed line before offset
+        checkpoint = min(offset // self.stride, len(self.checkpoints) - 1)
+        self.file.seek(self.checkpoints[checkpoint])
+
+        for _ in range(offset - checkpoint * self.stride):
+            self.file.readline()
+
+        lines = []
+        for _ in range(limit):
+            line = self.file.readline()
+            if not line:
+                break
+            lines.append(line.rstrip(b"\r\n").decode("utf-8", errors="replace"))
+
+        return lines
+
+    def head(self, n: int = 100) -> List[str]:
+        """
+        Read the first n lines
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        return self.lines(0, n)
+
+    def tail(self, n: int = 100) -> List[str]:
+        """
+        Read the last n lines
+
+        Args:
+            n (int): Number of lines
+
+        Returns:
+            List[str]: The lines
+
+        """
+
+        return self.lines(max(self.line_count - n, 0), n)
+
+    def text(self, max_chars: int | None = None) -> str:
+        """
+        Read the output as text
+
+        Args:
+            max_chars (int | None): Read at most this many bytes, None reads everything
+
+        Returns:
+            str: The output text
+
+        """
+
+        self.file.seek(0)
+        data = self.file.read() if max_chars is None else self.file.read(max_chars)
+
+        return data.decode("utf-8", errors="replace")
+
+    def preview(self, max_chars: int | None = None) -> str:
+        """
+        Get the output to return to the client. Large outputs are cut and point to the paging tools
+
+        Args:
+            max_chars (int | None): Maximum characters, defaults to settings
+
+        Returns:
+            str: The whole output or the start of it with a note
+
+        """
+
+        max_chars = max_chars or RESULT_CONFIG.get("inline_max_chars")
+
+        if self.size <= max_chars:
+            return self.text()
+
+        return (
+            self.text(max_chars)
+            + f"\n... Output truncated, showing {max_chars} of {self.size} bytes in {self.line_count} lines."
+            + " Use get_result_lines to read the rest"
+        )
+
+    def close(self) -> None:
+        """
+        Close and delete the spooled data
+
+        """
+
+        self.file.close()
+
+    def __str__(self) -> str:
+        return self.preview()
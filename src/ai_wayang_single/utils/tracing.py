@@ -0,0 +1,263 @@
+from ai_wayang_single.config.settings import TRACE_CONFIG
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+
+
+class Span:
+    """
+    A timed stage of a query, e.g. building, mapping or executing a plan.
+    Spans started while another span is current become its children
+
+    """
+
+    def __init__(self, name: str, parent: "Span | None" = None, attributes: Dict | None = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attributes) -> None:
+        """
+        Add attributes to the span, e.g. token usage or plan version
+
+        """
+
+        self.attributes.update(attributes)
+
+    def end(self) -> None:
+        """
+        Stop the span's clock
+
+        """
+
+        if self.duration is None:
+            self.duration = time.perf_counter() - self.start
+
+    def to_dict(self) -> Dict:
+        """
+        Get the span as a dict for export
+
+        Returns:
+            Dict: Ids, name, start time, duration in milliseconds, status and attributes
+
+        """
+
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round((self.duration or 0.0) * 1000, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSpanExporter:
+    """
+    Appends finished spans to a JSON Lines file
+
+    """
+
+    def __init__(self, path: str):
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        self.path = path
+        self.file = open(path, "a", encoding="utf-8")
+        self.lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self) -> None:
+        with self.lock:
+            self.file.close()
+
+
+class MemorySpanExporter:
+    """
+    Keeps finished spans in a list, for tests and inspection
+
+    """
+
+    def __init__(self):
+        self.spans: List[Span] = []
+
+    def export(self, span: Span) -> None:
+        self.spans.append(span)
+
+
+class Tracer:
+    """
+    Records spans around pipeline stages and hands finished spans to exporters.
+    The current span is kept in a context variable, so concurrent queries get separate traces
+
+    """
+
+    def __init__(self, exporters: List | None = None, use_otel: bool = False):
+        self.exporters = list(exporters or [])
+        self.current: ContextVar[Span | None] = ContextVar("current_span", default=None)
+        self.otel_tracer = self._load_otel() if use_otel else None
+
+    def add_exporter(self, exporter) -> None:
+        self.exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Span]:
+        """
+        Time a block as a span, child of the current span if any
+
+        Args:
+            name (str): Name of the span, e.g. "wayang.execute_plan"
+            **attributes: Attributes to start with
+
+        Yields:
+            Span: The span, to add attributes while it runs
+
+        """
+
+        span = Span(name, self.current.get(), attributes)
+        token = self.current.set(span)
+
+        # Mirror the span in OpenTelemetry, which tracks its own parent
+        otel_context = self.otel_tracer.start_as_current_span(name) if self.otel_tracer else None
+        otel_span = otel_context.__enter__() if otel_context else None
+
+        try:
+            yield span
+
+        except BaseException as e:
+            span.status = "error"
+            span.set(error=str(e))
+            raise
+
+        finally:
+            span.end()
+            self.current.reset(token)
+
+            if otel_context:
+                for key, value in span.attributes.items():
+                    otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+                otel_context.__exit__(None, None, None)
+
+            self._export(span)
+
+    def _export(self, span: Span) -> None:
+        """
+        Helper function to pass a finished span to the exporters. Export errors never fail a query
+
+        Args:
+            span (Span): The finished span
+
+        """
+
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception as e:
+                print(f"[ERROR] Couldn't export span {span.name}: {e}")
+
+    def _load_otel(self):
+        """
+        Helper function to get an OpenTelemetry tracer if the package is installed
+
+        Returns:
+            Tracer | None: OpenTelemetry tracer, or None if not installed
+
+        """
+
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            print("[INFO] opentelemetry-api is not installed, spans are not sent to OpenTelemetry")
+            return None
+
+        return trace.get_tracer("ai_wayang_single")
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer() -> Tracer:
+    """
+    Get the shared tracer, configured from settings on first use
+
+    Returns:
+        Tracer: The tracer
+
+    """
+
+    global _tracer
+
+    with _tracer_lock:
+        if _tracer is None:
+            trace_file = TRACE_CONFIG.get("trace_file")
+            exporters = [JsonlSpanExporter(trace_file)] if trace_file else []
+            _tracer = Tracer(exporters, use_otel=TRACE_CONFIG.get("use_otel") == "True")
+
+        return _tracer
+
+
+def to_chrome_trace(spans: List[Dict]) -> Dict:
+    """
+    Convert exported spans to the Chrome trace event format, which chrome://tracing, Perfetto and speedscope show as flame graphs
+
+    Args:
+        spans (List[Dict]): Spans as exported to JSON Lines
+
+    Returns:
+        Dict: Trace events, one row per trace
+
+    """
+
+    rows = {}
+    events = []
+
+    for span in spans:
+        row = rows.setdefault(span["trace_id"], len(rows) + 1)
+        events.append({
+            "name": span["name"],
+            "ph": "X",
+            "ts": span["start_time"] * 1e6,
+            "dur": span["duration_ms"] * 1e3,
+            "pid": 1,
+            "tid": row,
+            "args": span.get("attributes", {}),
+        })
+
+    return {"traceEvents": events}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a JSON Lines span file to a Chrome trace for flame graphs")
+    parser.add_argument("trace_file")
+    parser.add_argument("output_file")
+    args = parser.parse_args()
+
+    with open(args.trace_file, "r", encoding="utf-8") as f:
+        spans = [json.loads(line) for line in f if line.strip()]
+
+    with open(args.output_file, "w", encoding="utf-8") as f:
+        json.dump(to_chrome_trace(spans), f)
+
+    print(f"Wrote {len(spans)} spans to {args.output_file}")
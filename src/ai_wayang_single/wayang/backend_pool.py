@@ -0,0 +1,248 @@
+from collections import deque
+from typing import Dict, List
+import time
+
+
+class Backend:
+    """
+    A single Wayang server with its circuit breaker and metrics
+
+    """
+
+    def __init__(self, url: str, weight: int = 1):
+        self.url = url
+        self.weight = max(int(weight), 1)
+
+        # Load
+        self.outstanding = 0
+        self.current_weight = 0 # For smooth weighted round-robin
+
+        # Circuit breaker
+        self.state = "closed" # "closed", "open" or "half_open"
+        self.failures = 0 # Consecutive failures
+        self.opened_at = 0.0
+
+        # Metrics
+        self.requests = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=1000) # Recent latencies in seconds
+
+    def stats(self) -> Dict:
+        """
+        Get metrics for the backend
+
+        Returns:
+            Dict: State, load, request and error counts and latency percentiles
+
+        """
+
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float | None:
+            return latencies[min(int(p * len(latencies)), len(latencies) - 1)] if latencies else None
+
+        return {
+            "url": self.url,
+            "weight": self.weight,
+            "state": self.state,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+        }
+
+
+class BackendPool:
+    """
+    Pool of Wayang servers. Dispatches plans by least outstanding requests or smooth weighted round-robin,
+    and ejects failing servers with a circuit breaker until they recover
+
+    """
+
+    def __init__(
+        self,
+        urls: List[str],
+        weights: List[int] | None = None,
+        strategy: str = "least_outstanding",
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+    ):
+        weights = weights or []
+        self.backends = [Backend(url, weights[i] if i < len(weights) else 1) for i, url in enumerate(urls)]
+        self.strategy = strategy
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.next_index = 0 # Tie breaker for least outstanding
+
+    def acquire(self, exclude: set | None = None) -> Backend | None:
+        """
+        Pick a backend for a request and mark it as busy. Release it with release()
+
+        Args:
+            exclude (set | None): Urls to avoid, e.g. backends already tried for this request
+
+        Returns:
+            Backend | None: The backend, or None if no backend is available
+
+        """
+
+        candidates = [b for b in self.backends if self._available(b)]
+
+        # Try excluded backends again rather than failing, if they are the only ones left
+        if exclude:
+            candidates = [b for b in candidates if b.url not in exclude] or candidates
+
+        if not candidates:
+            return None
+
+        if self.strategy == "weighted_round_robin":
+            backend = self._weighted_round_robin(candidates)
+        else:
+            backend = self._least_outstanding(candidates)
+
+        # Only one trial request while half open
+        if backend.state == "open":
+            backend.state = "half_open"
+
+        backend.outstanding += 1
+        backend.requests += 1
+
+        return backend
+
+    def release(self, backend: Backend, latency: float, success: bool | None) -> None:
+        """
+        Record the outcome of a request
+
+        Args:
+            backend (Backend): Backend from acquire()
+            latency (float): Seconds the request took
+            success (bool | None): False if the backend failed, not if the plan failed.
+                None if the outcome says nothing about the backend's health, e.g. a long plan that timed out
+
+        """
+
+        backend.outstanding -= 1
+        backend.latencies.append(latency)
+
+        if success is None:
+            # The backend took the request, end a trial so it isn't left half open
+            if backend.state == "half_open":
+                self.record_success(backend)
+        elif success:
+            self.record_success(backend)
+        else:
+            backend.errors += 1
+            self.record_failure(backend)
+
+    def record_success(self, backend: Backend) -> None:
+        """
+        Close the backend's circuit after a successful request or health probe
+
+        Args:
+            backend (Backend): The backend
+
+        """
+
+        if backend.state != "closed":
+            print(f"[INFO] Wayang backend {backend.url} recovered")
+
+        backend.state = "closed"
+        backend.failures = 0
+
+    def record_failure(self, backend: Backend) -> None:
+        """
+        Count a failure and open the backend's circuit if it keeps failing
+
+        Args:
+            backend (Backend): The backend
+
+        """
+
+        backend.failures += 1
+
+        # A failed trial or too many failures in a row opens the circuit
+        if backend.state == "half_open" or backend.failures >= self.failure_threshold:
+            if backend.state != "open":
+                print(f"[INFO] Wayang backend {backend.url} ejected after {backend.failures} failures")
+            backend.state = "open"
+            backend.opened_at = time.monotonic()
+
+    def stats(self) -> List[Dict]:
+        """
+        Get metrics for all backends
+
+        Returns:
+            List[Dict]: Metrics per backend
+
+        """
+
+        return [backend.stats() for backend in self.backends]
+
+    def _available(self, backend: Backend) -> bool:
+        """
+        Helper function to check if a backend may take a request
+
+        Args:
+            backend (Backend): The backend
+
+        Returns:
+            bool: True if closed, or open long enough for a trial request
+
+        """
+
+        if backend.state == "closed":
+            return True
+
+        if backend.state == "open":
+            return time.monotonic() - backend.opened_at >= self.reset_timeout
+
+        # Half open, wait for the trial request
+        return False
+
+    def _least_outstanding(self, candidates: List[Backend]) -> Backend:
+        """
+        Helper function to pick the backend with fewest outstanding requests relative to its weight.
+        Ties rotate so idle backends share the load
+
+        Args:
+            candidates (List[Backend]): Available backends
+
+        Returns:
+            Backend: The chosen backend
+
+        """
+
+        self.next_index += 1
+        count = len(candidates)
+
+        return min(
+            (candidates[(self.next_index + i) % count] for i in range(count)),
+            key=lambda b: b.outstanding / b.weight,
+        )
+
+    def _weighted_round_robin(self, candidates: List[Backend]) -> Backend:
+        """
+        Helper function for smooth weighted round-robin, which spreads picks of heavy backends evenly
+
+        Args:
+            candidates (List[Backend]): Available backends
+
+        Returns:
+            Backend: The chosen backend
+
+        """
+
+        total = 0
+        best = None
+
+        for backend in candidates:
+            backend.current_weight += backend.weight
+            total += backend.weight
+            if best is None or backend.current_weight > best.current_weight:
+                best = backend
+
+        best.current_weight -= total
+
+        return best
@@ -1,6 +1,8 @@
 from datetime import datetime
 import os
+import re
 import urllib.parse
+import uuid
 
 class OperatorMapper:
     """
@@ -14,8 +16,7 @@ class OperatorMapper:
     def jdbc_input(self, config):
         
         # Get only relevant queries
-        columns = ", ".join(self.op.columnNames)
-        table_query = f"(SELECT {columns} FROM {self.op.table}) as X"
+        table_query = self.table_query(self.op.columnNames, self.op.table)
 
         return {
             "id": self.op.id,
@@ -158,23 +159,32 @@ class OperatorMapper:
 
     ### Output operators
     
-    def textfile_output(self, config):
+    def textfile_output(self, config, run_id=None):
 
         # Get folder output
         folder = config["output_folder"]
 
         # Validate if folder path exists
-        if not os.path.isdir(folder):
+        if not folder or not os.path.isdir(folder):
             print("[Warning] Folder path don't exists. Skipping output operation")
             return None
-        
+
+        # Safe run id for file and folder names
+        run = re.sub(r"[^A-Za-z0-9_-]", "_", run_id) if run_id else None
+
+        # Own folder per run if enabled
+        if run and config.get("partition_by_run") == "True":
+            folder = os.path.join(folder, f"run_{run}")
+            os.makedirs(folder, exist_ok=True)
+
         # Ensure correct folder format
         folder = self._ensure_path_format(folder)
 
-        # Create .txt filename with current timestamp        
+        # Create .txt filename with current timestamp, run id and a random part so concurrent plans never share a file
         now = datetime.now()
         timestamp = now.strftime("%Y%m%d_%H%M%S")
-        filename = f"output_{timestamp}.txt"
+        unique = uuid.uuid4().hex[:12]
+        filename = f"output_{timestamp}_{run}_{unique}.txt" if run else f"output_{timestamp}_{unique}.txt"
 
         # Create path for output file
         path = folder + filename
@@ -188,6 +198,24 @@ class OperatorMapper:
             "data": {"filename": path}
         }
 
+    @staticmethod
+    def table_query(columns, table, where=None):
+        """
+        Builds the subquery a jdbcRemoteInput reads from
+
+        Args:
+            columns (list): Column names to select
+            table (str): Table name
+            where (str | None): SQL condition rows must meet, e.g. pushed down from filters
+
+        Returns:
+            str: Subquery as the table of the input operator
+
+        """
+
+        where_clause = f" WHERE {where}" if where else ""
+        return f"(SELECT {', '.join(columns)} FROM {table}{where_clause}) as X"
+
     def _ensure_path_format(self, path):
         """
         Helper function to ensure filepath is correctly formatted for Wayang (e.g. file:///)
@@ -14,35 +14,37 @@ class PlanMapper:
     def __init__(self, config):
         self.config = config
 
+        # Maps operator name to a function of the operator and the run id
         self.operator_map = {
 
             # Input operators
-            "jdbcRemoteInput": lambda op: OperatorMapper(op).jdbc_input(self.config["input_config"]),
-            "textFileInput": lambda op: OperatorMapper(op).textfile_input(self.config["input_config"]),
+            "jdbcRemoteInput": lambda op, run_id: OperatorMapper(op).jdbc_input(self.config["input_config"]),
+            "textFileInput": lambda op, run_id: OperatorMapper(op).textfile_input(self.config["input_config"]),
 
             # Unary operators
-            "map": lambda op: OperatorMapper(op).map(),
-            "flatMap": lambda op: OperatorMapper(op).flatmap(),
-            "filter": lambda op: OperatorMapper(op).filter(),
-            "reduce": lambda op: OperatorMapper(op).reduce(),
-            "reduceBy": lambda op: OperatorMapper(op).reduceby(),
-            "groupBy": lambda op: OperatorMapper(op).groupby(),
-            "sort": lambda op: OperatorMapper(op).sort(),
+            "map": lambda op, run_id: OperatorMapper(op).map(),
+            "flatMap": lambda op, run_id: OperatorMapper(op).flatmap(),
+            "filter": lambda op, run_id: OperatorMapper(op).filter(),
+            "reduce": lambda op, run_id: OperatorMapper(op).reduce(),
+            "reduceBy": lambda op, run_id: OperatorMapper(op).reduceby(),
+            "groupBy": lambda op, run_id: OperatorMapper(op).groupby(),
+            "sort": lambda op, run_id: OperatorMapper(op).sort(),
 
             # Binary operators
-            "join": lambda op: OperatorMapper(op).join(),
+            "join": lambda op, run_id: OperatorMapper(op).join(),
 
             # Output operators
-            "textFileOutput": lambda op: OperatorMapper(op).textfile_output(self.config["output_config"])
+            "textFileOutput": lambda op, run_id: OperatorMapper(op).textfile_output(self.config["output_config"], run_id)
         }
         
 
-    def plan_to_json(self, plan: WayangPlan):
+    def plan_to_json(self, plan: WayangPlan, run_id: str | None = None):
         """
         Maps abstract Wayang plan to a executable JSON Wayang plan
 
         Args:
             plan (WayangPlan): Abstract WayangPlan
+            run_id (str | None): Id of the run, used to name output files
         
         Returns:
             json: Executable JSON plan
@@ -60,7 +62,7 @@ class PlanMapper:
         operations = plan.operations
 
         # Map operators
-        mapped_operators = self._map_operators(operations)
+        mapped_operators = self._map_operators(operations, run_id)
 
         # Add operators to JSON plan
         mapped_plan["operators"] = mapped_operators
@@ -69,6 +71,29 @@ class PlanMapper:
         return mapped_plan
     
 
+    def operator_to_json(self, operation: WayangOperation, run_id: str | None = None):
+        """
+        Maps a single abstract operator to its executable form, e.g. while a plan is being streamed
+
+        Args:
+            operation (WayangOperation): Abstract operator
+            run_id (str | None): Id of the run, used to name output files
+
+        Returns:
+            dict | None: Executable operator or None if it is skipped
+
+        Raises:
+            ValueError: If the operator is not supported
+
+        """
+
+        # Only operators supported in the architecture
+        if operation.operatorName not in self.operator_map:
+            raise ValueError(f"Unknown operatorName {operation.operatorName}")
+
+        return self.operator_map[operation.operatorName](operation, run_id)
+
+
     def plan_from_json(self, plan: str) -> WayangPlan:
         """
         Converts a JSON Wayang plan to a more simple, abstract WayangPlan easier for modification.
@@ -137,12 +162,13 @@ class PlanMapper:
         }
 
 
-    def _map_operators(self, operations: List[WayangOperation]) -> List:
+    def _map_operators(self, operations: List[WayangOperation], run_id: str | None = None) -> List:
         """
         Maps operators from abstract form to executable form
 
         Args:
             operations (List[WayangOperation]): List of operations to be mapped
+            run_id (str | None): Id of the run, used to name output files
         
         Returns:
             List: List of operations mapped
@@ -151,6 +177,7 @@ class PlanMapper:
 
         # Intialize mapped operations list
         mapped_operations = []
+        skipped_ids = set() # Operators deliberately left out, e.g. output without an output folder
         
         # Iterate over each operation
         for op in operations:
@@ -164,14 +191,21 @@ class PlanMapper:
                     continue
                 
                 # Map oeprator
-                operation = self.operator_map[name](op)
+                operation = self.operator_map[name](op, run_id)
 
                 # Add mapped operator
                 if operation:
                     mapped_operations.append(operation)
+                else:
+                    skipped_ids.add(op.id)
             
             except Exception as e:
                 print(f"[ERROR] Couldn't add operator {op}: {e}")
+
+        # Drop references to left out operators, so the result is returned by the operator before them
+        if skipped_ids:
+            for operation in mapped_operations:
+                operation["output"] = [output_id for output_id in operation["output"] if output_id not in skipped_ids]
         
         # Returned list of mapped operators
         return mapped_operations
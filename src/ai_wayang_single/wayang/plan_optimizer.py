@@ -0,0 +1,504 @@
+from ai_wayang_single.config.settings import OPTIMIZER_CONFIG
+from ai_wayang_single.utils.metrics import metrics
+from ai_wayang_single.wayang.operator_mapper import OperatorMapper
+from pathlib import Path
+from typing import Dict, List, Tuple
+import copy
+import json
+import operator
+import os
+import re
+import threading
+
+
+# Subquery of a jdbcRemoteInput, as built by OperatorMapper.table_query
+TABLE_QUERY = re.compile(r"^\(SELECT (?P<columns>.+?) FROM (?P<table>\S+?)(?: WHERE (?P<where>.+))?\) as X$", re.S)
+
+# Record UDF, e.g. (r: org.apache.wayang.basic.data.Record) => r.getField(1).asInstanceOf[Int] > 30
+RECORD_UDF = re.compile(r"^\s*\(\s*(?P<var>\w+)\s*:\s*(?:org\.apache\.wayang\.basic\.data\.)?Record\s*\)\s*=>\s*(?P<body>.+?)\s*$", re.S)
+
+# Literals without escapes, so their value is the text between the quotes
+LITERAL = r'(?:(?P<number>-?\d+(?:\.\d+)?)[LlDdFf]?|"(?P<string>[^"\\]*)")'
+
+NUMERIC_TYPES = {"Int", "Long", "Double", "Float"}
+
+# Postgres types whose text cast is what toString gives on the JVM. Not e.g. double precision (1 vs 1.0),
+# timestamp (no .0 suffix) or character (padding)
+TEXT_SAFE_TYPES = {"smallint", "integer", "bigint", "text", "character varying", "date", "boolean"}
+
+SQL_OPERATORS = {"==": "=", "!=": "<>", ">": ">", ">=": ">=", "<": "<", "<=": "<="}
+FLIPPED = {"==": "==", "!=": "!=", ">": "<", ">=": "<=", "<": ">", "<=": ">="}
+COMPARE = {"==": operator.eq, "!=": operator.ne, ">": operator.gt, ">=": operator.ge, "<": operator.lt, "<=": operator.le}
+
+# Wayang errors a rewrite can cause: SQL errors from a pushed condition, field indexes from pruning
+REWRITE_ERROR = re.compile(r"SQL|JDBC|PSQLException|IndexOutOfBounds", re.I)
+
+# UDF of operators that can read records of a jdbcRemoteInput when pruning, filter and sort pass the records on as they are
+RECORD_UDFS = {"filter": "udf", "sort": "keyUdf", "map": "udf", "flatMap": "udf"}
+RECORD_PRESERVING = {"filter", "sort"}
+
+
+class PlanOptimizer:
+    """
+    Rewrites validated, executable Wayang plans so they do less work with the same result.
+    Only plain rewrites are made, anything the optimizer doesn't understand is left as it is
+
+    """
+
+    def __init__(
+        self,
+        use_predicate_pushdown: bool | None = None,
+        use_projection_pruning: bool | None = None,
+        schema_folder: str | Path | None = None,
+    ):
+        self.use_predicate_pushdown = use_predicate_pushdown if use_predicate_pushdown is not None else OPTIMIZER_CONFIG.get("use_predicate_pushdown") == "True"
+        self.use_projection_pruning = use_projection_pruning if use_projection_pruning is not None else OPTIMIZER_CONFIG.get("use_projection_pruning") == "True"
+        self.schema_folder = schema_folder
+        self.column_types = {} # Column types per table, toString conditions are only pushed down for known types
+        self.rewrites = {} # Rewrites made per rule
+        self.lock = threading.Lock()
+
+        self.load_column_types()
+
+    def load_column_types(self) -> None:
+        """
+        Read the column types of the table schemas, again whenever the schemas are reloaded
+
+        """
+
+        column_types = {}
+        table_folder = os.path.join(self.schema_folder, "tables") if self.schema_folder else None
+
+        if table_folder and os.path.isdir(table_folder):
+            for file in sorted(os.listdir(table_folder)):
+                if not file.endswith(".json"):
+                    continue
+
+                try:
+                    with open(os.path.join(table_folder, file), encoding="utf-8") as f:
+                        schema = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"[ERROR] Couldn't read schema {file}: {e}")
+                    continue
+
+                for table, table_schema in schema.items():
+                    columns = table_schema.get("columns", {}) if isinstance(table_schema, dict) else {}
+                    column_types[table] = {column: str(info.get("type", "")).lower() for column, info in columns.items() if isinstance(info, dict)}
+
+        self.column_types = column_types
+
+    def optimize(self, plan: Dict) -> Tuple[Dict, List[str]]:
+        """
+        Optimize a copy of an executable plan
+
+        Args:
+            plan (Dict): Validated JSON Wayang plan
+
+        Returns:
+            Tuple[Dict, List[str]]: The optimized plan and a description of each rewrite, empty if nothing changed
+
+        """
+
+        plan = copy.deepcopy(plan)
+        rewrites = []
+
+        if self.use_predicate_pushdown:
+            rewrites.extend(self._count("predicate_pushdown", self._push_down_predicates(plan)))
+
+        # After pushdown, so columns only used by pushed filters are pruned as well
+        if self.use_projection_pruning:
+            rewrites.extend(self._count("projection_pruning", self._prune_projections(plan)))
+
+        return plan, rewrites
+
+    def may_have_failed(self, error: str) -> bool:
+        """
+        Checks if a failure of an optimized plan can come from a rewrite, so the plan is worth running again as validated
+
+        Args:
+            error (str): Output of Wayang for the failed plan
+
+        Returns:
+            bool: True if the error is one a rewrite can cause
+
+        """
+
+        return bool(REWRITE_ERROR.search(error or ""))
+
+    def stats(self) -> Dict:
+        """
+        Get rewrite counters
+
+        Returns:
+            Dict: Rewrites made per rule
+
+        """
+
+        with self.lock:
+            return dict(self.rewrites)
+
+    def _count(self, rule: str, rewrites: List[str]) -> List[str]:
+        """
+        Helper function to count the rewrites of a rule
+
+        """
+
+        if rewrites:
+            with self.lock:
+                self.rewrites[rule] = self.rewrites.get(rule, 0) + len(rewrites)
+            metrics.plan_rewrites.labels(rule).inc(len(rewrites))
+
+        return rewrites
+
+    ### Predicate pushdown
+
+    def _push_down_predicates(self, plan: Dict) -> List[str]:
+        """
+        Helper function to move conditions of filters that read a jdbcRemoteInput alone into its SQL WHERE.
+        A filter is removed if all its conditions are moved. Otherwise it is kept as it is, since it then
+        only sees rows that already meet the moved conditions
+
+        """
+
+        operators = plan.get("operators", [])
+        by_id = {op["id"]: op for op in operators}
+        rewrites = []
+
+        for source in operators:
+            if source.get("operatorName") != "jdbcRemoteInput":
+                continue
+
+            # Push down filters one at a time, each one directly after the input
+            while len(source["output"]) == 1:
+                target = by_id.get(source["output"][0])
+                if target is None or target.get("operatorName") != "filter" or target["input"] != [source["id"]]:
+                    break
+
+                query = TABLE_QUERY.match(source["data"].get("table", ""))
+                if query is None:
+                    break
+
+                types = self.column_types.get(query["table"], {})
+                conditions, complete = self._sql_conditions(target["data"].get("udf"), source["data"].get("columnNames", []), types)
+                if not conditions:
+                    break
+
+                where = " AND ".join(([query["where"]] if query["where"] else []) + conditions)
+                source["data"]["table"] = OperatorMapper.table_query(query["columns"].split(", "), query["table"], where)
+
+                if not complete:
+                    rewrites.append(f"Operation id {target['id']}: Pushed {' AND '.join(conditions)} into operation id {source['id']}, filter kept")
+                    break
+
+                # Read the filter's output straight from the input
+                source["output"] = list(target["output"])
+                for op in operators:
+                    op["input"] = [source["id"] if input_id == target["id"] else input_id for input_id in op["input"]]
+
+                operators.remove(target)
+                del by_id[target["id"]]
+                rewrites.append(f"Operation id {target['id']}: Filter pushed into operation id {source['id']} as {' AND '.join(conditions)}")
+
+        return rewrites
+
+    def _sql_conditions(self, udf: str | None, columns: List[str], types: Dict[str, str]) -> Tuple[List[str], bool]:
+        """
+        Helper function to translate the conditions of a filter UDF joined by && to SQL
+
+        Args:
+            udf (str | None): Filter UDF on records
+            columns (List[str]): Column names of the records
+            types (Dict[str, str]): Postgres type per column name, if known
+
+        Returns:
+            Tuple[List[str], bool]: SQL conditions that could be translated, and True if that is all of them
+
+        """
+
+        match = RECORD_UDF.match(udf or "")
+        if match is None:
+            return [], False
+
+        conjuncts = _split_conjuncts(match["body"])
+        if conjuncts is None:
+            return [], False
+
+        conditions = [self._sql_condition(conjunct, match["var"], columns, types) for conjunct in conjuncts]
+
+        return [condition for condition in conditions if condition], all(conditions)
+
+    def _sql_condition(self, conjunct: str, var: str, columns: List[str], types: Dict[str, str]) -> str | None:
+        """
+        Helper function to translate a single comparison of a record field with a literal to SQL.
+        Null fields behave as in Scala: a number cast reads null as 0, != holds for null strings,
+        and other comparisons on null strings fail in Wayang, so leaving those rows out is safe.
+        toString comparisons are done on the column cast to text, only for column types where that matches the JVM.
+        String casts of character columns aren't pushed down, Postgres ignores their padding
+
+        Returns:
+            str | None: SQL condition or None if it can't be translated
+
+        """
+
+        field = rf"{re.escape(var)}\.getField\((?P<index>\d+)\)\s*(?:\.asInstanceOf\[(?P<cast>\w+)\]|\.(?P<text>toString)(?:\(\))?)"
+        comparison = rf"\s*(?P<op>==|!=|>=|<=|>|<)\s*"
+
+        match = re.fullmatch(rf"{field}{comparison}{LITERAL}", conjunct) or re.fullmatch(rf"{LITERAL}{comparison}{field}", conjunct)
+        starts_with = re.fullmatch(rf'{field}\.startsWith\(\s*"(?P<prefix>[^"\\]*)"\s*\)', conjunct)
+
+        found = match or starts_with
+        if found is None or found["cast"] not in NUMERIC_TYPES | {"String", None}:
+            return None
+
+        index = int(found["index"])
+        if index >= len(columns):
+            return None
+
+        column = columns[index]
+        column_type = types.get(column)
+
+        if found["text"]:
+            if column_type not in TEXT_SAFE_TYPES:
+                return None
+            column = f"CAST({column} AS TEXT)"
+
+        if found["cast"] == "String" and column_type == "character":
+            return None
+
+        # Prefix of a string
+        if starts_with:
+            if starts_with["cast"] in NUMERIC_TYPES:
+                return None
+
+            prefix = re.sub(r"([\\%_])", r"\\\1", starts_with["prefix"])
+            return f"{column} LIKE {_sql_string(prefix + '%')} ESCAPE '\\'"
+
+        op = match["op"] if match.start("op") > match.start("index") else FLIPPED[match["op"]]
+
+        # Numbers
+        if match["cast"] in NUMERIC_TYPES:
+            if match["number"] is None:
+                return None
+
+            condition = f"{column} {SQL_OPERATORS[op]} {match['number']}"
+            return f"({condition} OR {column} IS NULL)" if COMPARE[op](0, float(match["number"])) else condition
+
+        # Strings, compared by character codes as on the JVM
+        if match["string"] is None:
+            return None
+
+        value = _sql_string(match["string"])
+
+        if op == "==":
+            return f"{column} = {value}"
+        if op == "!=":
+            return f"{column} IS DISTINCT FROM {value}"
+
+        return f'{column} COLLATE "C" {SQL_OPERATORS[op]} {value}'
+
+
+    ### Projection pruning
+
+    def _prune_projections(self, plan: Dict) -> List[str]:
+        """
+        Helper function to select only the columns of a jdbcRemoteInput that its readers use, and renumber their getField calls.
+        A source is left as it is if any reader could see a whole record, e.g. an output, a join, a final filter or sort
+        or a UDF that returns the record
+
+        """
+
+        operators = plan.get("operators", [])
+        by_id = {op["id"]: op for op in operators}
+        rewrites = []
+
+        for source in operators:
+            if source.get("operatorName") != "jdbcRemoteInput":
+                continue
+
+            query = TABLE_QUERY.match(source["data"].get("table", ""))
+            columns = source["data"].get("columnNames", [])
+            if query is None or query["columns"].split(", ") != columns:
+                continue
+
+            readers = self._record_readers(source, by_id)
+            if not readers:
+                continue
+
+            fields = [_used_fields(reader["data"].get(RECORD_UDFS[reader["operatorName"]])) for reader in readers]
+            if any(reader_fields is None for reader_fields in fields):
+                continue
+
+            used = set().union(*fields)
+            if any(index >= len(columns) for index in used):
+                continue
+
+            kept = sorted(used) or [0] # Records can't be empty
+            if len(kept) == len(columns):
+                continue
+
+            # Renumber fields in the readers
+            new_index = {old_index: new_index for new_index, old_index in enumerate(kept)}
+            for reader in readers:
+                key = RECORD_UDFS[reader["operatorName"]]
+                reader["data"][key] = _renumber_fields(reader["data"][key], new_index)
+
+            source["data"]["columnNames"] = [columns[index] for index in kept]
+            source["data"]["table"] = OperatorMapper.table_query(source["data"]["columnNames"], query["table"], query["where"])
+
+            removed = [column for index, column in enumerate(columns) if index not in new_index]
+            rewrites.append(f"Operation id {source['id']}: Removed unused columns {removed}")
+
+        return rewrites
+
+    def _record_readers(self, source: Dict, by_id: Dict) -> List[Dict] | None:
+        """
+        Helper function to find the operators that read records of an input, through filters and sorts
+
+        Returns:
+            List[Dict] | None: The readers or None if an operator that isn't understood reads the records
+
+        """
+
+        readers = []
+        queue = [source]
+
+        while queue:
+            current = queue.pop()
+
+            for output_id in current["output"]:
+                reader = by_id.get(output_id)
+                if reader is None or reader.get("operatorName") not in RECORD_UDFS or reader["input"] != [current["id"]]:
+                    return None
+
+                readers.append(reader)
+                if reader["operatorName"] in RECORD_PRESERVING:
+                    # Wayang returns the whole records of a final operator
+                    if not reader["output"]:
+                        return None
+                    queue.append(reader)
+
+        return readers
+
+
+def _used_fields(udf: str | None) -> set | None:
+    """
+    Helper function to find the record fields a UDF reads
+
+    Returns:
+        set | None: Field indexes or None if the record is used in any other way than getField with a number
+
+    """
+
+    match = RECORD_UDF.match(udf or "")
+    if match is None:
+        return None
+
+    var, body = re.escape(match["var"]), match["body"]
+    fields = set()
+
+    for use in re.finditer(rf"(?<![\w.]){var}(?!\w)", body):
+        field = re.match(rf"{var}\s*\.getField\(\s*(\d+)\s*\)", body[use.start():])
+        if field is None:
+            return None
+        fields.add(int(field[1]))
+
+    return fields
+
+
+def _renumber_fields(udf: str, new_index: Dict[int, int]) -> str:
+    """
+    Helper function to point the getField calls of a UDF at the pruned columns
+
+    """
+
+    match = RECORD_UDF.match(udf)
+    var = re.escape(match["var"])
+    body = re.sub(
+        rf"(?<![\w.])({var}\s*\.getField\(\s*)(\d+)(\s*\))",
+        lambda field: f"{field[1]}{new_index[int(field[2])]}{field[3]}",
+        match["body"],
+    )
+
+    return udf[:match.start("body")] + body + udf[match.end("body"):]
+
+
+def _sql_string(value: str) -> str:
+    """
+    Helper function to quote a SQL string literal
+
+    """
+
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _split_conjuncts(body: str) -> List[str] | None:
+    """
+    Helper function to split a Scala condition on top level &&, also inside parentheses around it
+
+    Returns:
+        List[str] | None: Conditions that must all hold or None if the condition has a top level ||
+
+    """
+
+    body = _strip_parens(body.strip())
+    parts, start, depth, in_string, i = [], 0, 0, False, 0
+
+    while i < len(body):
+        char = body[i]
+
+        if in_string:
+            if char == "\\":
+                i += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth -= 1
+        elif depth == 0 and body.startswith("||", i):
+            return None
+        elif depth == 0 and body.startswith("&&", i):
+            parts.append(body[start:i])
+            start = i + 2
+            i += 1
+
+        i += 1
+
+    parts.append(body[start:])
+
+    if len(parts) == 1:
+        return [body]
+
+    conjuncts = []
+    for part in parts:
+        conjuncts.extend(_split_conjuncts(part) or [part.strip()])
+
+    return conjuncts
+
+
+def _strip_parens(text: str) -> str:
+    """
+    Helper function to remove parentheses around a whole condition
+
+    """
+
+    while text.startswith("(") and text.endswith(")"):
+        depth, in_string = 0, False
+
+        for i, char in enumerate(text):
+            if in_string:
+                in_string = char != '"' or text[i - 1] == "\\"
+            elif char == '"':
+                in_string = True
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+                if depth == 0 and i < len(text) - 1:
+                    return text
+
+        text = text[1:-1].strip()
+
+    return text
@@ -0,0 +1,237 @@
+from ai_wayang_single.llm.models import WayangOperation, WayangPlan
+from typing import Dict, List, Tuple
+import heapq
+import os
+import threading
+
+
+class PlanRepairer:
+    """
+    Fixes mechanical mistakes in a raw plan with fixed rules, so the Debugger Agent is only needed for the rest.
+    Input lists are taken as the truth: operators are renumbered in topological order and output lists are rebuilt from them
+
+    """
+
+    # Category of each operator
+    CATEGORIES = {
+        "jdbcRemoteInput": "input",
+        "textFileInput": "input",
+        "map": "unary",
+        "flatMap": "unary",
+        "filter": "unary",
+        "reduce": "unary",
+        "reduceBy": "unary",
+        "groupBy": "unary",
+        "sort": "unary",
+        "join": "binary",
+        "textFileOutput": "output",
+    }
+
+    def __init__(self):
+        self.attempts = 0 # Plans with repairs
+        self.repaired = 0 # Plans that validated after repair
+        self.calls_saved = 0 # Repaired plans that would otherwise have gone to the Debugger
+        self.lock = threading.Lock()
+
+    def repair(self, plan: WayangPlan) -> Tuple[WayangPlan, List[str]]:
+        """
+        Repair a copy of a raw plan
+
+        Args:
+            plan (WayangPlan): Raw plan from the Builder or Debugger
+
+        Returns:
+            Tuple[WayangPlan, List[str]]: The repaired plan and a description of each fix, empty if nothing was fixed
+
+        """
+
+        plan = plan.model_copy(deep=True)
+        operations = plan.operations
+        fixes = []
+
+        fixes.extend(self._fix_categories(operations))
+        fixes.extend(self._strip_paths(operations))
+
+        # Edges can't be told apart with duplicate ids, leave the graph to the Debugger
+        if len({op.id for op in operations}) != len(operations):
+            return plan, fixes
+
+        fixes.extend(self._fill_inputs(operations))
+        fixes.extend(self._renumber(plan))
+        fixes.extend(self._rebuild_outputs(plan.operations))
+
+        return plan, fixes
+
+    def record(self, valid: bool, saves_call: bool = True) -> None:
+        """
+        Count a repaired plan
+
+        Args:
+            valid (bool): True if the plan validated after repair
+            saves_call (bool): True if the Debugger would have been called for the plan without repair
+
+        """
+
+        with self.lock:
+            self.attempts += 1
+            self.repaired += int(valid)
+            self.calls_saved += int(valid and saves_call)
+
+    def stats(self) -> Dict:
+        """
+        Get repair counters
+
+        Returns:
+            Dict: Plans with repairs, plans fully repaired and Debugger calls saved
+
+        """
+
+        with self.lock:
+            return {"attempts": self.attempts, "repaired": self.repaired, "llm_calls_saved": self.calls_saved}
+
+    def _fix_categories(self, operations: List[WayangOperation]) -> List[str]:
+        """
+        Helper function to set the category given by the operator name. Input operators don't read other operators
+
+        """
+
+        fixes = []
+
+        for op in operations:
+            category = self.CATEGORIES.get(op.operatorName)
+
+            if category and op.cat != category:
+                fixes.append(f"Operation id {op.id}: Category set to {category} for {op.operatorName}")
+                op.cat = category
+
+            if op.cat == "input" and op.input:
+                fixes.append(f"Operation id {op.id}: Input ids removed from input operator")
+                op.input = []
+
+        return fixes
+
+    def _strip_paths(self, operations: List[WayangOperation]) -> List[str]:
+        """
+        Helper function to reduce text file inputs to the bare file name, the mapper adds the folder and extension
+
+        """
+
+        fixes = []
+
+        for op in operations:
+            if op.operatorName != "textFileInput" or not op.inputFileName:
+                continue
+
+            name = op.inputFileName.strip()
+            if name.startswith("file://"):
+                name = name[len("file://"):]
+            name = os.path.basename(name.rstrip("/"))
+            if name.endswith(".txt"):
+                name = name[:-len(".txt")]
+
+            if name and name != op.inputFileName:
+                fixes.append(f"Operation id {op.id}: Input file {op.inputFileName} reduced to {name}")
+                op.inputFileName = name
+
+        return fixes
+
+    def _fill_inputs(self, operations: List[WayangOperation]) -> List[str]:
+        """
+        Helper function to take missing input ids from the output ids of other operators
+
+        """
+
+        fixes = []
+        readers = {}
+
+        for op in operations:
+            for output_id in op.output:
+                readers.setdefault(output_id, []).append(op.id)
+
+        for op in operations:
+            if op.cat != "input" and not op.input and readers.get(op.id):
+                op.input = list(readers[op.id])
+                fixes.append(f"Operation id {op.id}: Input ids set to {op.input} from output ids")
+
+        return fixes
+
+    def _renumber(self, plan: WayangPlan) -> List[str]:
+        """
+        Helper function to renumber operators 1..n in topological order, keeping the original order where possible.
+        Dangling input ids are dropped. Plans with cycles are left as they are
+
+        """
+
+        operations = plan.operations
+        position = {op.id: i for i, op in enumerate(operations)}
+        fixes = []
+
+        # Drop input ids that refer to no operator
+        for op in operations:
+            dangling = [input_id for input_id in op.input if input_id not in position]
+            if dangling:
+                fixes.append(f"Operation id {op.id}: Removed input ids {dangling} that don't exist")
+                op.input = [input_id for input_id in op.input if input_id in position]
+
+        # Kahn's algorithm, lowest original position first
+        successors = {op.id: [] for op in operations}
+        in_degree = {op.id: len(set(op.input)) for op in operations}
+        for op in operations:
+            for input_id in set(op.input):
+                successors[input_id].append(op.id)
+
+        heap = [(position[op_id], op_id) for op_id, degree in in_degree.items() if degree == 0]
+        heapq.heapify(heap)
+        order = []
+
+        while heap:
+            _, op_id = heapq.heappop(heap)
+            order.append(op_id)
+
+            for next_id in successors[op_id]:
+                in_degree[next_id] -= 1
+                if in_degree[next_id] == 0:
+                    heapq.heappush(heap, (position[next_id], next_id))
+
+        if len(order) < len(operations):
+            return fixes
+
+        new_ids = {old_id: new_id for new_id, old_id in enumerate(order, start=1)}
+
+        if all(old_id == new_id for old_id, new_id in new_ids.items()) and order == [op.id for op in operations]:
+            return fixes
+
+        by_id = {op.id: op for op in operations}
+        for op in operations:
+            op.input = [new_ids[input_id] for input_id in op.input]
+            op.output = [new_ids[output_id] for output_id in op.output if output_id in new_ids]
+            op.id = new_ids[op.id]
+
+        plan.operations = [by_id[old_id] for old_id in order]
+        changed = {old_id: new_id for old_id, new_id in new_ids.items() if old_id != new_id}
+        fixes.append(f"Plan: Operators renumbered in topological order {changed}")
+
+        return fixes
+
+    def _rebuild_outputs(self, operations: List[WayangOperation]) -> List[str]:
+        """
+        Helper function to set every operator's output ids to the operators that have it as input
+
+        """
+
+        outputs = {op.id: [] for op in operations}
+
+        for op in operations:
+            for input_id in op.input:
+                if input_id in outputs and op.id not in outputs[input_id]:
+                    outputs[input_id].append(op.id)
+
+        fixes = []
+
+        for op in operations:
+            output = sorted(outputs[op.id])
+            if op.output != output:
+                fixes.append(f"Operation id {op.id}: Output ids set to {output}")
+                op.output = output
+
+        return fixes
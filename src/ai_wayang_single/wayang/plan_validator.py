@@ -1,74 +1,348 @@
+from ai_wayang_single.wayang.udf_compiler import UdfCompiler
+from collections import deque
+from typing import Dict, List, Set
+
+
 class PlanValidator:
     """
-    Validates Wayang plans
+    Validates Wayang plans.
+    Checks each operator on its own, then builds the plan's graph once and checks it as a whole in O(V+E)
     """
 
-    def validate_plan(self, plan):
+    # Fields each operator needs, as alternatives for the executable (data) and the abstract form
+    REQUIRED_FIELDS = {
+        "jdbcRemoteInput": [("table",), ("columnNames",)],
+        "textFileInput": [("filename", "inputFileName")],
+        "map": [("udf",)],
+        "flatMap": [("udf",)],
+        "filter": [("udf",)],
+        "reduce": [("udf",)],
+        "reduceBy": [("keyUdf",), ("udf",)],
+        "groupBy": [("keyUdf",)],
+        "sort": [("keyUdf",)],
+        "join": [("thisKeyUdf",), ("thatKeyUdf",)],
+        "textFileOutput": [("filename",)],
+    }
+
+    def __init__(self, udf_compiler: UdfCompiler | None = None):
+        self.udf_compiler = udf_compiler # Compiles UDFs locally if set
+
+
+    def validate_plan(self, plan, compile_udfs: bool = True):
         """
         Validates a JSON Wayang Plan to verify it is executable in Wayang server
 
+        Args:
+            plan (dict): Executable JSON Wayang plan
+            compile_udfs (bool): Also compile the UDFs if a compiler is set. Compiling blocks, run it in a thread
+
         """
         
         # List for errors found
         errors = []
+
+        # Operators by id
+        nodes = {}
         
         # Go over each operation
-        for i, operation in enumerate(plan.get("operators", [])):
+        for operation in plan.get("operators", []):
             try:
                 # Get parameters
                 op_id = int(operation.get("id", -1))
-                op_input = operation.get("input", [])
-                op_output = operation.get("output", [])
-                op_cat = operation.get("cat", None)
-
-                # Check that op_id is larger than zero
-                if op_id > 0:
-                    dummy = None
-                else:
-                    errors.append(f"Operation id {op_id}: ID must be larger than zero and a number")
-
-                # Check input ids are lower than id
-                for input_id in op_input:
-                    if input_id >= op_id:
-                        errors.append(f"Operation id {op_id}: Input id {input_id} ≥ operation id")
-
-                # Check output ids are higher than id
-                for output_id in op_output:
-                    if output_id <= op_id:
-                        errors.append(f"Operation id {op_id}: Output id {output_id} ≤ operation id")
-                
-                if op_cat == "unary":
-
-                    # Check that operator have a single input
-                    if len(op_output) < 1 and i != len(plan["operators"]) - 1:
-                        if i != len(plan["operators"]) - 2:
-                            errors.append(f"Operation id {op_id}: Missing output operator")
-
-                    # Check if input operator is longer than one
-                    if len(op_input) != 1:
-                        errors.append(f"Operation id {op_id}: Unary operators can only have one input id")
-
-                    # Check if there is more than one output operator
-                    if len(op_output) > 1:
-                        errors.append(f"Operation id {op_id}: Unary operators can only have up to one output id")
-                                  
-                if op_cat == "binary":
-
-                    # Must have an output id if it is not the last operation
-                    if len(op_output) < 1 and i != len(plan["operators"]) - 1:
-                        if i != len(plan["operators"]) - 2:
-                            errors.append(f"Operation id {op_id}: Missing output operator") 
-                    
-                    # Check that operators have two inputs
-                    if len(op_input) != 2:
-                        errors.append(f"Operation id {op_id}: Binary operators must have two input ids")
+
+                # Check ids, arity and fields of the operator
+                errors.extend(self.validate_operator(operation))
 
             except Exception as e:
-                errors.append(f"Operation id {op_id}: Unexpected error - {e}")
+                errors.append(f"Operation id {operation.get('id')}: Unexpected error - {e}")
+                continue
+
+            # Ids must be unique to build the graph
+            if op_id in nodes:
+                errors.append(f"Operation id {op_id}: Duplicate operation id")
+                continue
+
+            nodes[op_id] = operation
+
+        # Check the plan as a graph
+        errors.extend(self._validate_graph(nodes))
+
+        # Compile UDFs of otherwise valid plans
+        if not errors and compile_udfs and self.udf_compiler is not None:
+            errors.extend(self.udf_compiler.check_plan(plan))
 
         # If any errors, return false and the erros
         if errors:
             return False, errors
         # Else return true and an empty error list
         else:
-            return True, []
\ No newline at end of file
+            return True, []
+
+
+    def validate_operator(self, operation, seen_ids=None):
+        """
+        Validates a single JSON operator on its own, without the rest of the plan.
+        Used by validate_plan and while a plan is streamed, where every error found is fatal
+
+        Args:
+            operation (dict): Executable JSON operator
+            seen_ids (set | None): Ids of the operators before it. If given, ids must be unique and inputs must refer to them
+
+        Returns:
+            List[str]: Errors found, empty if valid
+
+        """
+
+        errors = []
+
+        # Get parameters
+        op_id = int(operation.get("id", -1))
+        op_input = operation.get("input", [])
+        op_output = operation.get("output", [])
+        op_cat = operation.get("cat", None)
+
+        # Check that op_id is larger than zero
+        if op_id <= 0:
+            errors.append(f"Operation id {op_id}: ID must be larger than zero and a number")
+
+        # Check input ids are lower than id
+        for input_id in op_input:
+            if input_id >= op_id:
+                errors.append(f"Operation id {op_id}: Input id {input_id} ≥ operation id")
+
+        # Check output ids are higher than id
+        for output_id in op_output:
+            if output_id <= op_id:
+                errors.append(f"Operation id {op_id}: Output id {output_id} ≤ operation id")
+
+        if op_cat == "input":
+
+            # Check that input operators don't read from other operators
+            if op_input:
+                errors.append(f"Operation id {op_id}: Input operators can't have input ids")
+
+        if op_cat == "unary":
+
+            # Check if input operator is longer than one
+            if len(op_input) != 1:
+                errors.append(f"Operation id {op_id}: Unary operators can only have one input id")
+
+            # Check if there is more than one output operator
+            if len(op_output) > 1:
+                errors.append(f"Operation id {op_id}: Unary operators can only have up to one output id")
+
+        if op_cat == "binary":
+
+            # Check that operators have two inputs
+            if len(op_input) != 2:
+                errors.append(f"Operation id {op_id}: Binary operators must have two input ids")
+
+        if op_cat == "output":
+
+            # Check that output operators read one operator and are last
+            if len(op_input) != 1:
+                errors.append(f"Operation id {op_id}: Output operators must have one input id")
+            if op_output:
+                errors.append(f"Operation id {op_id}: Output operators can't have output ids")
+
+        # Check fields the operator needs
+        errors.extend(self._validate_fields(op_id, operation))
+
+        # Check against operators seen so far
+        if seen_ids is not None:
+            if op_id in seen_ids:
+                errors.append(f"Operation id {op_id}: Duplicate operation id")
+
+            for input_id in op_input:
+                if input_id < op_id and input_id not in seen_ids:
+                    errors.append(f"Operation id {op_id}: Input id {input_id} doesn't exist")
+
+        return errors
+
+
+    def _validate_fields(self, op_id: int, operation: Dict) -> List[str]:
+        """
+        Helper function to check that an operator has the fields its operator name needs
+
+        Args:
+            op_id (int): Id of the operator
+            operation (Dict): Executable or abstract operator
+
+        Returns:
+            List[str]: Errors found
+
+        """
+
+        name = operation.get("operatorName")
+        required = self.REQUIRED_FIELDS.get(name)
+
+        if required is None:
+            return [f"Operation id {op_id}: Unknown operator {name}"]
+
+        # Executable operators keep fields in data, abstract ones at the top
+        data = operation.get("data") or operation
+
+        return [
+            f"Operation id {op_id}: {name} is missing {' or '.join(fields)}"
+            for fields in required
+            if not any(data.get(field) for field in fields)
+        ]
+
+
+    def _validate_graph(self, nodes: Dict[int, Dict]) -> List[str]:
+        """
+        Helper function to check the plan as a graph. Every operator and edge is visited a constant number of times
+
+        Args:
+            nodes (Dict[int, Dict]): Operators by id
+
+        Returns:
+            List[str]: Errors found
+
+        """
+
+        errors = []
+
+        inputs = {op_id: self._ids(operation.get("input", [])) for op_id, operation in nodes.items()}
+        outputs = {op_id: self._ids(operation.get("output", [])) for op_id, operation in nodes.items()}
+
+        # Edges from the ids each side declares, both sides must agree
+        successors = {op_id: set() for op_id in nodes}
+        predecessors = {op_id: set() for op_id in nodes}
+
+        for op_id in nodes:
+            for input_id in inputs[op_id]:
+                if input_id not in nodes:
+                    errors.append(f"Operation id {op_id}: Input id {input_id} doesn't exist")
+                    continue
+
+                if op_id not in outputs[input_id]:
+                    errors.append(f"Operation id {input_id}: Output ids must include {op_id}, which has {input_id} as input")
+
+                successors[input_id].add(op_id)
+                predecessors[op_id].add(input_id)
+
+            for output_id in outputs[op_id]:
+                if output_id not in nodes:
+                    errors.append(f"Operation id {op_id}: Output id {output_id} doesn't exist")
+                    continue
+
+                if op_id not in inputs[output_id]:
+                    errors.append(f"Operation id {output_id}: Input ids must include {op_id}, which has {output_id} as output")
+
+                successors[op_id].add(output_id)
+                predecessors[output_id].add(op_id)
+
+        # Cycles, with Kahn's algorithm
+        in_degree = {op_id: len(predecessors[op_id]) for op_id in nodes}
+        queue = deque(op_id for op_id, degree in in_degree.items() if degree == 0)
+        sorted_count = 0
+
+        while queue:
+            op_id = queue.popleft()
+            sorted_count += 1
+
+            for next_id in successors[op_id]:
+                in_degree[next_id] -= 1
+                if in_degree[next_id] == 0:
+                    queue.append(next_id)
+
+        if sorted_count < len(nodes):
+            errors.append(f"Plan: Cycle between operation ids {self._cycle_ids(in_degree, successors, predecessors)}")
+
+        # Reachability from input operators and to output operators
+        sources = [op_id for op_id, operation in nodes.items() if operation.get("cat") == "input"]
+        sinks = [op_id for op_id, operation in nodes.items() if operation.get("cat") == "output"]
+
+        if nodes and not sources:
+            errors.append("Plan: Missing input operator")
+
+        # Without output operators Wayang returns the result of the one final operator
+        final = sorted(op_id for op_id in nodes if not successors[op_id])
+        if nodes and not sinks and len(final) > 1:
+            errors.append(f"Plan: Missing output operator, operation ids {final} are all final but only one result can be returned")
+
+        from_source = self._reachable(sources, successors)
+        to_sink = self._reachable(sinks, predecessors)
+
+        for op_id in sorted(nodes):
+            if sources and op_id not in from_source:
+                errors.append(f"Operation id {op_id}: Not reachable from an input operator")
+            if sinks and op_id not in to_sink:
+                errors.append(f"Operation id {op_id}: Doesn't lead to an output operator")
+
+        return errors
+
+
+    def _cycle_ids(self, in_degree: Dict[int, int], successors: Dict[int, Set[int]], predecessors: Dict[int, Set[int]]) -> List[int]:
+        """
+        Helper function to find the operators on cycles, from the operators Kahn's algorithm couldn't sort.
+        Those also include operators after a cycle, which are peeled off from the end the same way
+
+        Args:
+            in_degree (Dict[int, int]): In-degrees left after Kahn's algorithm
+            successors (Dict[int, Set[int]]): Next operators per id
+            predecessors (Dict[int, Set[int]]): Previous operators per id
+
+        Returns:
+            List[int]: Sorted ids of operators on cycles
+
+        """
+
+        remaining = {op_id for op_id, degree in in_degree.items() if degree > 0}
+        out_degree = {op_id: len(successors[op_id] & remaining) for op_id in remaining}
+        queue = deque(op_id for op_id, degree in out_degree.items() if degree == 0)
+
+        while queue:
+            op_id = queue.popleft()
+            remaining.discard(op_id)
+
+            for previous_id in predecessors[op_id]:
+                if previous_id in remaining:
+                    out_degree[previous_id] -= 1
+                    if out_degree[previous_id] == 0:
+                        queue.append(previous_id)
+
+        return sorted(remaining)
+
+
+    def _reachable(self, starts: List[int], edges: Dict[int, Set[int]]) -> Set[int]:
+        """
+        Helper function to find all operators reachable from the start operators
+
+        Args:
+            starts (List[int]): Ids to start from
+            edges (Dict[int, Set[int]]): Neighbours per id
+
+        Returns:
+            Set[int]: Reached ids, including the starts
+
+        """
+
+        seen = set(starts)
+        queue = deque(starts)
+
+        while queue:
+            for next_id in edges[queue.popleft()]:
+                if next_id not in seen:
+                    seen.add(next_id)
+                    queue.append(next_id)
+
+        return seen
+
+
+    def _ids(self, ids) -> Set[int]:
+        """
+        Helper function to read a list of ids, ignoring ids that aren't numbers as validate_operator reports them
+
+        """
+
+        result = set()
+
+        for op_id in ids or []:
+            try:
+                result.add(int(op_id))
+            except (TypeError, ValueError):
+                continue
+
+        return result
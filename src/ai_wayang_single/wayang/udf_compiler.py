@@ -0,0 +1,200 @@
+from ai_wayang_single.config.settings import UDF_CONFIG
+from collections import OrderedDict
+from typing import Dict, List
+import hashlib
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import tempfile
+import threading
+
+
+class UdfCompiler:
+    """
+    Compiles the Scala UDFs of a plan locally against the Wayang Record API, before the plan is sent to Wayang.
+    All new UDFs of a plan are compiled in one call to a long-lived compiler daemon (fsc), one source file per UDF
+    so a syntax error in one UDF can't be blamed on the next. Results are cached by the hash of the UDF text
+
+    """
+
+    # Operator fields holding Scala code
+    UDF_FIELDS = ("udf", "keyUdf", "thisKeyUdf", "thatKeyUdf")
+
+    # Error lines of scalac 2 ("file.scala:3: error: ...") and scala 3 ("-- Error: file.scala:3:5 ...")
+    ERROR_PATTERN = re.compile(r"(?:^|\s)(?P<file>[^\s:]+\.scala):(?P<line>\d+)(?::\d+)?:?\s*(?:error:)?\s*(?P<msg>.*)")
+
+    def __init__(
+        self,
+        compiler: str | List[str] | None = None,
+        classpath: str | None = None,
+        timeout: float | None = None,
+        cache_size: int | None = None,
+    ):
+        compiler = compiler or UDF_CONFIG.get("compiler")
+        self.command = shlex.split(compiler) if isinstance(compiler, str) else list(compiler)
+        self.classpath = classpath if classpath is not None else UDF_CONFIG.get("classpath")
+        self.timeout = timeout or UDF_CONFIG.get("timeout")
+        self.cache_size = cache_size or UDF_CONFIG.get("cache_size")
+        self.cache = OrderedDict() # UDF hash to compile errors, empty if it compiles
+        self.lock = threading.Lock()
+        self.compiles = 0 # Compiler calls since startup
+        self.hits = 0
+        self.misses = 0
+
+    def available(self) -> bool:
+        """
+        Checks if the compiler can be found
+
+        Returns:
+            bool: True if the compiler command exists
+
+        """
+
+        return bool(self.command) and shutil.which(self.command[0]) is not None
+
+    def check_plan(self, plan: Dict) -> List[str]:
+        """
+        Compile the UDFs of a plan, using cached results where possible
+
+        Args:
+            plan (Dict): Executable JSON Wayang plan
+
+        Returns:
+            List[str]: Compile errors per operator, empty if all UDFs compile or the check couldn't run
+
+        """
+
+        # UDFs by operator and field
+        udfs = []
+        for operation in plan.get("operators", []):
+            data = operation.get("data") or {}
+            for field in self.UDF_FIELDS:
+                if isinstance(data.get(field), str) and data[field].strip():
+                    udfs.append((operation.get("id"), field, data[field], self._hash(data[field])))
+
+        # Compile UDFs not seen before in one call
+        with self.lock:
+            unknown = {}
+            for _, _, code, key in udfs:
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                elif key not in unknown:
+                    unknown[key] = code
+                    self.misses += 1
+
+        if unknown:
+            results = self._compile(unknown)
+
+            with self.lock:
+                for key, errors in results.items():
+                    self.cache[key] = errors
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        # Errors in the form the Debugger gets from the validator
+        errors = []
+
+        with self.lock:
+            for op_id, field, _, key in udfs:
+                for error in self.cache.get(key, []):
+                    errors.append(f"Operation id {op_id}: {field} doesn't compile - {error}")
+
+        return errors
+
+    def stats(self) -> Dict:
+        """
+        Get cache and compile counters
+
+        Returns:
+            Dict: Cached UDFs, hits, misses and compiler calls
+
+        """
+
+        with self.lock:
+            return {"cached": len(self.cache), "hits": self.hits, "misses": self.misses, "compiles": self.compiles}
+
+    def shutdown(self) -> None:
+        """
+        Stop the fsc compile daemon if it was used
+
+        """
+
+        if self.available() and os.path.basename(self.command[0]) == "fsc":
+            subprocess.run(self.command + ["-shutdown"], capture_output=True, timeout=self.timeout)
+
+    def _compile(self, udfs: Dict[str, str]) -> Dict[str, List[str]]:
+        """
+        Helper function to compile UDFs, one source file each, in one compiler call
+
+        Args:
+            udfs (Dict[str, str]): UDF code by hash
+
+        Returns:
+            Dict[str, List[str]]: Errors by hash. UDFs are left out if the compiler couldn't run, so they aren't cached
+
+        """
+
+        with tempfile.TemporaryDirectory(prefix="wayang_udfs_") as folder:
+            files = {}
+
+            for key, code in udfs.items():
+                path = os.path.join(folder, f"udf_{key}.scala")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(self._source(key, code))
+                files[os.path.basename(path)] = key
+
+            command = self.command + ["-d", folder]
+            if self.classpath:
+                command += ["-classpath", self.classpath]
+            command += [os.path.join(folder, name) for name in files]
+
+            try:
+                self.compiles += 1
+                process = subprocess.run(command, capture_output=True, text=True, timeout=self.timeout)
+            except (OSError, subprocess.TimeoutExpired) as e:
+                print(f"[ERROR] Couldn't compile UDFs, skipping the check: {e}")
+                return {}
+
+            errors = {key: [] for key in udfs}
+
+            for line in (process.stdout + process.stderr).splitlines():
+                match = self.ERROR_PATTERN.search(line)
+                if not match or "warning" in line.lower():
+                    continue
+
+                key = files.get(os.path.basename(match.group("file")))
+                if key is not None:
+                    errors[key].append(match.group("msg").strip())
+
+            # Failed without errors we can place, e.g. a broken classpath. Don't blame or cache the UDFs
+            if process.returncode != 0 and not any(errors.values()):
+                print(f"[ERROR] UDF compiler failed, skipping the check: {(process.stderr or process.stdout).strip()[:500]}")
+                return {}
+
+            return errors
+
+    def _source(self, key: str, code: str) -> str:
+        """
+        Helper function to wrap a UDF in a Scala object with the Wayang imports
+
+        Args:
+            key (str): Hash of the UDF, part of the object name
+            code (str): The UDF
+
+        Returns:
+            str: Scala source, with the UDF on line 3 so error lines point into it
+
+        """
+
+        return (
+            "import org.apache.wayang.basic.data._\n"
+            f"object Udf_{key} {{\n"
+            f"  val f = {code}\n"
+            "}\n"
+        )
+
+    def _hash(self, code: str) -> str:
+        return hashlib.sha256(code.encode("utf-8")).hexdigest()[:16]
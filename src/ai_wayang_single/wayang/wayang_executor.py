@@ -1,37 +1,247 @@
 from ai_wayang_single.config.settings import WAYANG_CONFIG
-import requests
+from ai_wayang_single.utils.metrics import metrics
+from ai_wayang_single.utils.spooled_output import SpooledOutput
+from ai_wayang_single.wayang.backend_pool import Backend, BackendPool
+from typing import List
+import asyncio
+import httpx
 import json
+import random
+import time
 
 class WayangExecutor:
     """
-    Executes a JSON Wayang Plan in Wayang server (JSON API) and returns output
+    Executes a JSON Wayang Plan in Wayang server (JSON API) and returns output.
+    Uses one pooled, keep-alive HTTP client with separate connect and read timeouts,
+    and spreads plans over one or more Wayang servers
 
     """
 
-    def __init__(self, url: str | None = None):
-        self.url = url or WAYANG_CONFIG.get("server_url")
+    # Server errors that count against a server's health. Only a 503 with Retry-After proves the plan wasn't run and is retried,
+    # a 502 or 504 from a proxy may come after the plan already ran
+    FAILURE_STATUS = {500, 502, 503, 504}
+    RETRY_STATUS = {503}
+    MAX_RETRY_AFTER = 30.0 # Longest Retry-After in seconds that is waited for
 
-    def execute_plan(self, plan: str):
+    def __init__(self, url: str | None = None, urls: List[str] | None = None, weights: List[int] | None = None):
+        # Servers from arguments, else from settings
+        if urls is None:
+            urls = [u.strip() for u in WAYANG_CONFIG.get("server_urls").split(",") if u.strip()]
+            weights = [int(w) for w in WAYANG_CONFIG.get("weights").split(",") if w.strip()]
+        if not urls:
+            urls = [url or WAYANG_CONFIG.get("server_url")]
+
+        self.url = urls[0]
+        self.pool = BackendPool(
+            urls,
+            weights=weights,
+            strategy=WAYANG_CONFIG.get("balancing"),
+            failure_threshold=WAYANG_CONFIG.get("failure_threshold"),
+            reset_timeout=WAYANG_CONFIG.get("reset_timeout"),
+        )
+        self.max_retries = WAYANG_CONFIG.get("max_retries")
+        self.retry_backoff = WAYANG_CONFIG.get("retry_backoff")
+        self.health_interval = WAYANG_CONFIG.get("health_interval")
+        self.health_task = None
+
+        # Separate timeouts, a plan may run for minutes but connecting should be fast
+        connect_timeout = WAYANG_CONFIG.get("connect_timeout")
+        timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=WAYANG_CONFIG.get("read_timeout"),
+            write=connect_timeout,
+            pool=connect_timeout,
+        )
+
+        # Pool of keep-alive connections shared by all sessions
+        limits = httpx.Limits(
+            max_connections=WAYANG_CONFIG.get("max_connections"),
+            max_keepalive_connections=WAYANG_CONFIG.get("max_keepalive_connections"),
+            keepalive_expiry=WAYANG_CONFIG.get("keepalive_expiry"),
+        )
+
+        self.client = httpx.AsyncClient(timeout=timeout, limits=limits)
+
+    async def execute_plan(self, plan: str):
         """
         Execute a JSON Wayang plan and returns output
-        Also returns the error stack if the server supports it
+        Also returns the error stack if the server supports it.
+        The response body is streamed into a SpooledOutput, so large outputs are not held in memory
 
-        Args: 
+        Args:
             plan (str): Wayang JSON plan to be executed
 
         Returns:
-            Output from Wayang
+            Tuple[int, SpooledOutput]: Status code and output from Wayang
 
         """
 
-        try:
-            # Send plan to Wayang server
-            response = requests.post(url=self.url, json=plan)
+        # Probe servers in the background once the event loop runs
+        self._start_health_checks()
+
+        attempt = 0
+        tried = set()
+
+        while True:
+            backend = self.pool.acquire(exclude=tried)
+            if backend is None:
+                raise Exception("No Wayang server available, all servers are failing")
+
+            tried.add(backend.url)
+            start = time.perf_counter()
+
+            success = None # Neutral if cancelled or failed locally, e.g. the client left or the output couldn't be spooled
+            error = None
+
+            try:
+                # Send plan to Wayang server without blocking the event loop
+                status_code, output, retry_after = await self._post(backend.url, plan)
+
+                # Server errors count against the server, plan errors don't
+                success = status_code not in self.FAILURE_STATUS
+
+            # Retry if the connection couldn't be made, the plan was never sent. Waiting for a free local connection isn't the server's fault
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                success = None if isinstance(e, httpx.PoolTimeout) else False
+                error = e
+
+            # Handle other request exceptions, e.g. read timeouts. Not retried as the plan may be running,
+            # and not counted against the server, a healthy server under load may take longer than the timeout
+            except httpx.HTTPError as e:
+                metrics.wayang_requests.labels(backend.url, "error").observe(time.perf_counter() - start)
+                raise Exception(e)
+
+            # Always give the backend back, also a half open backend's trial request
+            finally:
+                latency = time.perf_counter() - start
+                self.pool.release(backend, latency, success=success)
+
+            if error is not None:
+                metrics.wayang_requests.labels(backend.url, "connect_error").observe(latency)
+
+                if attempt >= self.max_retries:
+                    raise Exception(error)
+
+                print(f"[INFO] Couldn't connect to Wayang server {backend.url}, retrying: {error}")
+                metrics.wayang_retries.labels(backend.url).inc()
+                attempt += 1
+                await self._backoff(attempt)
+                continue
+
+            metrics.wayang_requests.labels(backend.url, status_code).observe(latency)
+
+            # Retry only if the server says it didn't take the plan and when to come back
+            retryable = status_code in self.RETRY_STATUS and retry_after is not None and retry_after <= self.MAX_RETRY_AFTER
+            if retryable and attempt < self.max_retries:
+                print(f"[INFO] Wayang server {backend.url} returned {status_code}, retrying")
+                metrics.wayang_retries.labels(backend.url).inc()
+                output.close()
+                attempt += 1
+                await self._backoff(attempt, retry_after)
+                continue
 
             # Return status code and body/output/result from Wayang server
-            return response.status_code, response.text
+            return status_code, output
+
+    async def check_health(self) -> None:
+        """
+        Probe every server once. Any response below 500 means the server is up
+
+        """
+
+        async def probe(backend: Backend) -> None:
+            try:
+                response = await self.client.get(backend.url, timeout=WAYANG_CONFIG.get("connect_timeout"))
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+
+            if healthy:
+                self.pool.record_success(backend)
+            else:
+                self.pool.record_failure(backend)
+
+        await asyncio.gather(*(probe(backend) for backend in self.pool.backends))
+
+    def stats(self) -> List[dict]:
+        """
+        Get load, latency and error metrics per Wayang server
+
+        Returns:
+            List[dict]: Metrics per server
+
+        """
+
+        return self.pool.stats()
+
+    async def close(self) -> None:
+        """
+        Stops health probes and closes the underlying HTTP client and its connections
+
+        """
+
+        if self.health_task:
+            self.health_task.cancel()
+            self.health_task = None
+
+        await self.client.aclose()
+
+    def _start_health_checks(self) -> None:
+        """
+        Helper function to start the background health probes if enabled and not running
+
+        """
+
+        if self.health_interval <= 0 or (self.health_task and not self.health_task.done()):
+            return
+
+        async def loop():
+            while True:
+                await asyncio.sleep(self.health_interval)
+                await self.check_health()
+
+        self.health_task = asyncio.create_task(loop())
+
+    async def _post(self, url: str, plan: str):
+        """
+        Helper function to send a plan and stream the response body into a SpooledOutput
+
+        Args:
+            url (str): Wayang server url
+            plan (str): Wayang JSON plan
+
+        Returns:
+            Tuple[int, SpooledOutput, float | None]: Status code, output and seconds from Retry-After if given
+
+        """
+
+        output = SpooledOutput()
+
+        try:
+            async with self.client.stream("POST", url, json=plan) as response:
+                async for chunk in response.aiter_bytes():
+                    output.write(chunk)
+
+        except BaseException:
+            output.close()
+            raise
+
+        # Only Retry-After in seconds, not as a date
+        try:
+            retry_after = max(float(response.headers["Retry-After"]), 0.0)
+        except (KeyError, ValueError):
+            retry_after = None
+
+        return response.status_code, output, retry_after
+
+    async def _backoff(self, attempt: int, retry_after: float = 0.0) -> None:
+        """
+        Helper function to wait before a retry, exponential backoff with full jitter, at least as long as the server asked
+
+        Args:
+            attempt (int): Retry number, starting at 1
+            retry_after (float): Seconds the server asked to wait
+
+        """
 
-        # Handle request exceptions
-        except requests.exceptions.RequestException as e:
-            raise Exception(e)
-    
\ No newline at end of file
+        await asyncio.sleep(max(retry_after, random.uniform(0, self.retry_backoff * 2 ** (attempt - 1))))